@@ -0,0 +1,49 @@
+# This example shows how to use asyncio to do several things at once.
+# One task honks whenever the module is triggered, another handles the
+# gate out, and a third keeps track of the pitch CV so that it doesn't
+# have to be read when a trigger arrives.
+#
+# This needs CircuitPython 7 or later and two libraries that aren't put on
+# the module at the factory: copy the asyncio folder and adafruit_ticks.mpy
+# from the Adafruit CircuitPython library bundle for your version of
+# CircuitPython (https://circuitpython.org/libraries) into the lib folder.
+
+try:
+    import asyncio
+except ImportError:
+    raise RuntimeError(
+        "This example needs the asyncio and adafruit_ticks libraries in lib,"
+        " see the top of code.py"
+    )
+
+import winterbloom_bhb
+
+bhb = winterbloom_bhb.BigHonkingButton()
+sample = bhb.load_sample("samples/honk.wav")
+pitch = 0
+
+
+async def honk():
+    while True:
+        await bhb.wait_triggered()
+        bhb.gate_out = True
+        bhb.play(sample, pitch_cv=pitch)
+
+
+async def release():
+    while True:
+        await bhb.wait_released()
+        bhb.gate_out = False
+
+
+async def follow_cv():
+    global pitch
+    async for voltage in bhb.cv_stream():
+        pitch = voltage
+
+
+async def main():
+    await asyncio.gather(honk(), release(), follow_cv())
+
+
+asyncio.run(main())
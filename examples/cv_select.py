@@ -30,6 +30,15 @@ while bhb.update():
 
         # sample = bhb.select_from_list_using_cv(samples, bhb.pitch_in, low=0, high=5)
 
+        # For big lists, a selector built ahead of time is quicker and won't
+        # flicker between neighbouring samples. Create it before the loop:
+        #
+        #   kit = bhb.cv_selector(samples, hysteresis=0.05)
+        #
+        # and use it here:
+        #
+        # sample = kit.select(bhb.pitch_in_raw)
+
         bhb.play(sample)
         bhb.gate_out = True
 
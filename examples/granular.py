@@ -0,0 +1,31 @@
+# This plays tiny pieces of a sample, called grains, picking which part of
+# the sample to play with the CV input. Sweep the CV slowly while holding
+# the button to scrub through the honk.
+
+import winterbloom_bhb
+
+bhb = winterbloom_bhb.BigHonkingButton()
+
+honk = bhb.load_sliced("samples/honk_long.wav")
+
+# 32 grains, 60 milliseconds each, spread across the whole sample. They
+# overlap, but they all share the sample's memory so this doesn't use any
+# more RAM than the sample itself.
+grains = honk.grains(count=32, length_ms=60)
+grain = None
+
+while bhb.update():
+    if bhb.triggered:
+        bhb.gate_out = True
+
+    if bhb.button.held or bhb.gate_in.held:
+        selected = bhb.select_from_list_using_cv(grains, bhb.pitch_in)
+        # Keep looping the same grain until the CV picks a different one.
+        if selected is not grain or not bhb.playing:
+            grain = selected
+            bhb.play(grain, loop=True)
+
+    if bhb.released:
+        bhb.gate_out = False
+        grain = None
+        bhb.stop()
@@ -1,8 +1,6 @@
 # This example turns the Big Honking Button into a simple
 # burst generator (that also happens to honk)
 
-import time
-
 import winterbloom_bhb
 
 bhb = winterbloom_bhb.BigHonkingButton()
@@ -11,10 +9,16 @@ burst_intervals = [0.05, 0.05, 0.05, 0.05, 0.1]
 
 while bhb.update():
     if bhb.triggered:
+        # Schedule the whole burst up front instead of sleeping between
+        # honks, that way the loop keeps running and a new trigger can
+        # restart the burst right away.
+        bhb.cancel_scheduled()
+        pitch = bhb.pitch_in
+        delay = 0
         for interval in burst_intervals:
-            bhb.gate_out = True
-            bhb.play(sample, pitch_cv=bhb.pitch_in)
-            time.sleep(interval)
-            bhb.gate_out = False
-            bhb.stop()
-            time.sleep(interval)
+            bhb.gate_out_later(delay, True)
+            bhb.play_later(delay, sample, pitch_cv=pitch)
+            delay += interval
+            bhb.gate_out_later(delay, False)
+            bhb.stop_later(delay)
+            delay += interval
@@ -1,21 +1,24 @@
-# This makes an arbitrary long honk with intro/loop/outro samples from a sliced up honk.wav
+# This makes an arbitrarily long honk from a single sample. honk_long.wav
+# has markers in it that split it into an attack that plays when the button
+# is pressed, a short part that loops for as long as it's held and a
+# release that plays when it's let go. All three share the same memory.
+#
+# Any sample with a loop or two cue points set in a sample editor works
+# the same way.
 
-import time
 import winterbloom_bhb
 
 bhb = winterbloom_bhb.BigHonkingButton()
 
-sample_p1 = bhb.load_sample("samples/honk_p1.wav")
-sample_p2 = bhb.load_sample("samples/honk_p2.wav") # this part should be very small and loop well
-sample_p3 = bhb.load_sample("samples/honk_p3.wav")
+honk = bhb.load_sliced("samples/honk_long.wav")
 
 while bhb.update():
     if bhb.triggered:
-        bhb.gate_out=True # passes the button state to the output
-        bhb.play(sample_p1, pitch_cv=bhb.pitch_in, loop=False)
-        time.sleep(0.08) # the length of sample_p1
-        bhb.play(sample_p2, pitch_cv=bhb.pitch_in, loop=True)
+        bhb.gate_out = True  # passes the button state to the output
+        bhb.play(honk.attack, pitch_cv=bhb.pitch_in)
+        # Starts looping as soon as the attack ends.
+        bhb.play_next(honk.loop, pitch_cv=bhb.pitch_in, loop=True)
 
     if bhb.released:
-        bhb.gate_out=False # passes the button state to the output
-        bhb.play(sample_p3, pitch_cv=bhb.pitch_in, loop=False)
+        bhb.gate_out = False  # passes the button state to the output
+        bhb.play(honk.release, pitch_cv=bhb.pitch_in)
@@ -1,43 +1,29 @@
 # This advanced example is similar to the sine example, except
-# it generates white noise.
+# it generates noise. Every press plays freshly made noise, so
+# it doesn't sound like the same short loop over and over.
 
-import array
-import random
-import audiocore
 import winterbloom_bhb
+from winterbloom_bhb.noise import Noise
 
 bhb = winterbloom_bhb.BigHonkingButton()
 
+# color can be "white", "pink" or "brown", and level sets the
+# volume from 0 to 1. 8-bit noise sounds just as good as 16-bit
+# and takes half the memory, which leaves room for a longer
+# buffer before the noise repeats.
+noise = Noise(bhb, color="white", level=0.8, length=4096, bits=8)
 
-# This generates a raw set of samples that represents one full
-# cycle of a sine wave. If you wanted different waveforms, you
-# could change the formula here to generate that instead.
-def generate_noise(volume=1.0):
-    volume = volume * (2 ** 15 - 1)  # Increase this to increase the volume of the tone.
-    length = 800
-    samples = array.array("H", [0] * length)
-
-    for i in range(length):
-        samples[i] = int(random.random() * volume)
-
-    return samples
-
-noise = generate_noise(0.8)
-sample = audiocore.RawSample(noise)
-
-# Change this to set the noise sample's frequency.
-# This generate works well as pretty low numbers,
-# but you can get some interesting effects at higher
-# values.
-frequency = 2
-sample.sample_rate = frequency * len(noise)
+# Change this to set the noise's sample rate. Low rates give a
+# crunchy, lo-fi noise and high rates a bright hiss. At this
+# rate the buffer lasts about a second.
+noise.sample_rate = 4000
 
 
 while bhb.update():
     if bhb.triggered:
         bhb.gate_out = True
-        bhb.play(sample, loop=True)
+        noise.play()
 
     if bhb.released:
         bhb.gate_out = False
-        bhb.stop()
+        noise.stop()
@@ -2,7 +2,7 @@
 # for the button to output. In this case, it generates a
 # sine wave. You can use this example as a basis for very
 # basic oscillators.
-# See also noise.py
+# See also noise.py, and wavetable.py for a ready-made oscillator.
 
 import array
 import math
@@ -0,0 +1,26 @@
+# This advanced example turns the button into a simple oscillator
+# that follows the pitch CV input (1v/octave). It plays precomputed
+# wavetables, which start instantly and sound clean even at high
+# notes. See also sine.py, which builds its own waveform.
+
+import winterbloom_bhb
+from winterbloom_bhb.oscillator import Oscillator
+
+bhb = winterbloom_bhb.BigHonkingButton(cv_samples=4)
+
+# Try "sine", "triangle", "saw", or "square".
+oscillator = Oscillator(bhb, shape="saw")
+
+while bhb.update():
+    if bhb.triggered:
+        bhb.gate_out = True
+        oscillator.play(bhb.pitch_in)
+
+    elif bhb.gate_out and bhb.cv_changed:
+        # Follow the CV while the note is held. retune() only restarts
+        # the note when its pitch really changed, which keeps clicks down.
+        oscillator.retune(bhb.pitch_in)
+
+    if bhb.released:
+        bhb.gate_out = False
+        oscillator.stop()
@@ -0,0 +1,301 @@
+"""Deploys to every Big Honking Button attached to this computer at once.
+
+factory_setup.py works on one module at a time: it waits for the one
+CIRCUITPY drive, copies to it and resets the one serial port with the BHB's
+USB ID. With a hub full of modules that's the slowest part of a batch, so
+this finds every attached module and deploys to all of them in parallel.
+
+Each module is a CIRCUITPY drive paired with its serial port. CircuitPython
+writes the chip's unique ID to boot_out.txt and uses the same ID as the USB
+serial number, which is how the two are matched. Modules whose drive and
+port can't be matched aren't written to, since code.py can't be stopped
+first, and are reported as failed.
+
+With --dry-run each module's drive is compared with what would be deployed
+and what would be copied is printed, without stopping code.py or writing
+anything.
+
+One module failing doesn't stop the others. At the end a summary is printed
+and written as JSON to build/batch-report.json.
+
+J-Link programming isn't done here since it needs a probe per module. Flash
+modules without CircuitPython one at a time with factory_setup.py first.
+
+    python factory_setup.py batch [--workers N] [--full] [--source] [--dry-run]
+"""
+
+import glob
+import json
+import os
+import string
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import deploy
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+REPORT_PATH = os.path.join(ROOT_DIR, "build", "batch-report.json")
+
+DRIVE_PATTERNS = (
+    "/Volumes/CIRCUITPY*",
+    "/media/*/CIRCUITPY*",
+    "/run/media/*/CIRCUITPY*",
+)
+
+_print_lock = threading.Lock()
+
+
+def log(name, message):
+    # Workers print from several threads, so whole lines are written at once.
+    with _print_lock:
+        print("[{}] {}".format(name, message))
+        sys.stdout.flush()
+
+
+def find_drives():
+    """Returns the mount point of every attached CIRCUITPY drive."""
+    if sys.platform == "win32":
+        candidates = ["{}:\\".format(letter) for letter in string.ascii_uppercase]
+    else:
+        candidates = [path for pattern in DRIVE_PATTERNS for path in glob.glob(pattern)]
+    return sorted(
+        path
+        for path in candidates
+        if os.path.exists(os.path.join(path, "boot_out.txt"))
+    )
+
+
+def drive_uid(drive):
+    """The unique ID CircuitPython wrote to boot_out.txt, or None."""
+    try:
+        with open(os.path.join(drive, "boot_out.txt"), "r") as fh:
+            for line in fh:
+                if line.startswith("UID:"):
+                    return line[len("UID:") :].strip().upper()
+    except OSError:
+        pass
+    return None
+
+
+def find_ports(usb_device_id):
+    """Maps USB serial number to serial port for every attached module."""
+    import serial.tools.list_ports
+
+    vid, pid = (int(part, 16) for part in usb_device_id.split(":"))
+    return {
+        (port.serial_number or port.device).upper(): port.device
+        for port in serial.tools.list_ports.comports()
+        if port.vid == vid and port.pid == pid
+    }
+
+
+class Device:
+    """One attached module: its drive, its serial port and how it went."""
+
+    def __init__(self, drive, uid=None, port=None):
+        self.drive = drive
+        self.uid = uid
+        self.port = port
+        self.status = "pending"
+        self.error = None
+        self.copied = 0
+        self.copied_bytes = 0
+        self.removed = 0
+        self.seconds = 0.0
+
+    @property
+    def name(self):
+        return self.uid or os.path.basename(self.drive.rstrip("/\\")) or self.drive
+
+    def report(self):
+        return {
+            "name": self.name,
+            "drive": self.drive,
+            "port": self.port,
+            "status": self.status,
+            "error": self.error,
+            "copied": self.copied,
+            "copied_bytes": self.copied_bytes,
+            "removed": self.removed,
+            "seconds": round(self.seconds, 2),
+        }
+
+
+def discover(usb_device_id):
+    ports = find_ports(usb_device_id)
+    devices = []
+    for drive in find_drives():
+        uid = drive_uid(drive)
+        devices.append(Device(drive, uid, ports.pop(uid, None)))
+
+    # Older CircuitPython doesn't write the UID. If only one drive and one
+    # port are left over they have to belong together.
+    unmatched = [device for device in devices if device.port is None]
+    if len(unmatched) == 1 and len(ports) == 1:
+        unmatched[0].port = ports.popitem()[1]
+    return devices
+
+
+class SerialControl:
+    """Gets a module's attention over its serial port."""
+
+    def __init__(self, port):
+        self.port = port
+
+    def _send(self, data):
+        import serial
+
+        with serial.Serial(self.port, 115200, timeout=1) as conn:
+            conn.write(data)
+            conn.flush()
+
+    def force_into_repl(self):
+        # Ctrl-C twice stops code.py so that the drive can be written
+        # safely (CircuitPython issue #3986).
+        self._send(b"\x03\x03")
+        time.sleep(0.5)
+
+    def reset(self):
+        # Ctrl-D in the REPL is a soft reset, which runs the new code.py.
+        self._send(b"\x04")
+
+
+def deploy_device(
+    device, files_to_deploy, after_copy=None, full=False, control=None, dry_run=False
+):
+    """Deploys to one device, recording the outcome on it rather than raising.
+
+    With ``dry_run`` the outcome is what would have been copied.
+    """
+    start = time.monotonic()
+    control = control or SerialControl
+    try:
+        if device.port is None:
+            raise RuntimeError("No serial port found for {}".format(device.drive))
+        port = control(device.port)
+
+        if not dry_run:
+            log(device.name, "stopping code.py")
+            port.force_into_repl()
+
+        device_plan = deploy.plan(files_to_deploy, device.drive, full=full)
+        log(
+            device.name,
+            "{} {} files ({} bytes), {} unchanged, {} to remove".format(
+                "would copy" if dry_run else "copying",
+                len(device_plan.copy),
+                device_plan.size(device_plan.copy),
+                len(device_plan.unchanged),
+                len(device_plan.remove),
+            ),
+        )
+        device.copied = len(device_plan.copy)
+        device.copied_bytes = device_plan.size(device_plan.copy)
+        device.removed = len(device_plan.remove)
+        if not dry_run:
+            deploy.apply(device_plan)
+            if after_copy is not None:
+                after_copy(device.drive)
+
+            log(device.name, "resetting")
+            port.reset()
+        device.status = "ok"
+    except Exception as exc:
+        device.status = "failed"
+        device.error = "{}: {}".format(type(exc).__name__, exc)
+        log(device.name, "FAILED: {}".format(device.error))
+    device.seconds = time.monotonic() - start
+    return device
+
+
+def run(
+    devices,
+    files_to_deploy,
+    workers=4,
+    after_copy=None,
+    full=False,
+    control=None,
+    dry_run=False,
+):
+    """Deploys to all ``devices`` using a pool of ``workers`` threads.
+
+    Copying is mostly waiting on USB, so threads are enough to keep every
+    drive busy.
+    """
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        for device in devices:
+            pool.submit(
+                deploy_device,
+                device,
+                files_to_deploy,
+                after_copy,
+                full,
+                control,
+                dry_run,
+            )
+    return devices
+
+
+def print_summary(devices, seconds):
+    print("========== BATCH SUMMARY ==========")
+    for device in devices:
+        line = "{:<24} {:<7} {:>4} files {:>9} bytes {:>6.1f}s".format(
+            device.name,
+            device.status,
+            device.copied,
+            device.copied_bytes,
+            device.seconds,
+        )
+        if device.error:
+            line += "  " + device.error
+        print(line)
+    failed = sum(device.status != "ok" for device in devices)
+    print(
+        "{} of {} modules deployed in {:.1f}s.".format(
+            len(devices) - failed, len(devices), seconds
+        )
+    )
+
+
+def write_report(devices, seconds, path=REPORT_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as fh:
+        json.dump(
+            {
+                "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "seconds": round(seconds, 2),
+                "devices": [device.report() for device in devices],
+            },
+            fh,
+            indent=2,
+        )
+    print("Wrote {}".format(path))
+
+
+def batch(
+    usb_device_id,
+    files_to_deploy,
+    workers=4,
+    after_copy=None,
+    full=False,
+    dry_run=False,
+):
+    """Finds every attached module and deploys to them. Returns True if all
+    of them succeeded. With ``dry_run`` nothing is written, not even the
+    report."""
+    devices = discover(usb_device_id)
+    if not devices:
+        print("No CIRCUITPY drives found.")
+        return False
+    print("Found {} modules".format(len(devices)))
+
+    start = time.monotonic()
+    run(devices, files_to_deploy, workers, after_copy, full, dry_run=dry_run)
+    seconds = time.monotonic() - start
+
+    print_summary(devices, seconds)
+    if not dry_run:
+        write_report(devices, seconds)
+    return all(device.status == "ok" for device in devices)
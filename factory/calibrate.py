@@ -0,0 +1,345 @@
+"""Calibrates the pitch CV input of every attached Big Honking Button at once.
+
+All of the modules' CV inputs are wired to one adjustable reference. For
+each calibration point the operator is asked to set the reference to that
+voltage, then every module reads its ADC over the serial REPL at the same
+time. Once all points are measured, each module's readings are checked
+against the nominal calibration and written to its microcontroller.nvm, or
+to calibration.bin on its drive if it has no nvm. The nominal calibration
+and the record's format come from winterbloom_bhb/calibration.py, which is
+loaded from the firmware directory, see there for how modules load it.
+
+Modules are found the same way as for batch deploys, see batch.py. All of
+them have to be the same board revision since they share the reference. A
+copy of every record is kept in build/calibration/ and a summary is written
+to build/calibration-report.json.
+
+    python factory_setup.py calibrate [--workers N] [--samples N]
+"""
+
+import importlib.util
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import batch
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+RECORDS_DIR = os.path.join(ROOT_DIR, "build", "calibration")
+REPORT_PATH = os.path.join(ROOT_DIR, "build", "calibration-report.json")
+CALIBRATION_PY = os.path.join(ROOT_DIR, "firmware", "winterbloom_bhb", "calibration.py")
+
+
+def _load_calibration_module():
+    # Importing winterbloom_bhb needs CircuitPython's modules, but
+    # calibration.py on its own only needs struct, so it's loaded by path.
+    spec = importlib.util.spec_from_file_location("bhb_calibration", CALIBRATION_PY)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+calibration = _load_calibration_module()
+NOMINAL = calibration.NOMINAL
+
+# How far a reading may be from the nominal code before the module is
+# rejected, which catches a reference that wasn't set or a bad connection.
+MAX_DEVIATION = 120
+
+# The end points are only 8 codes from the ends of the ADC's range, so on
+# some modules they read as flat out. Readings this close are replaced by
+# where the neighbouring segment meets the end of the range.
+MAX_CODE = 4095
+RAIL_MARGIN = 2
+
+# Run on the module through the raw REPL. Each prints a single line.
+READ_REVISION = """\
+import board, digitalio
+pin = digitalio.DigitalInOut(board.V5)
+pin.switch_to_input(pull=digitalio.Pull.UP)
+print(4 if pin.value else 5)
+pin.deinit()
+"""
+
+READ_ADC = """\
+import _bhb
+_bhb.init_adc()
+total = 0
+for _ in range({samples}):
+    total += _bhb.read_adc()
+print(total)
+"""
+
+WRITE_RECORD = """\
+import microcontroller
+data = {data!r}
+nvm = microcontroller.nvm
+if nvm and len(nvm) >= len(data):
+    nvm[0:len(data)] = data
+    print("nvm" if bytes(nvm[0:len(data)]) == data else "failed")
+else:
+    print("file")
+"""
+
+
+def _uid_bytes(uid):
+    # boot_out.txt has the 16-byte unique ID in hex. Without it the record
+    # is for any chip, which is fine in nvm but not in a file.
+    try:
+        data = bytes.fromhex(uid or "")
+    except ValueError:
+        return None
+    return data if len(data) == 16 else None
+
+
+def pack(revision, uid, points):
+    """The record for winterbloom_bhb/calibration.py, see its layout."""
+    return calibration.Calibration(revision, points, _uid_bytes(uid)).pack()
+
+
+class Unit:
+    """A module being calibrated: its device and what's been measured."""
+
+    def __init__(self, device, runner):
+        self.device = device
+        self.runner = runner
+        self.revision = None
+        self.codes = []
+        self.points = None
+        self.stored = None
+        self.status = "pending"
+        self.error = None
+
+    @property
+    def name(self):
+        return self.device.name
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    def fail(self, message):
+        if self.error is None:
+            self.error = message
+            self.status = "failed"
+            batch.log(self.name, "FAILED: {}".format(message))
+
+    def report(self):
+        return {
+            "name": self.name,
+            "revision": self.revision,
+            "status": self.status,
+            "error": self.error,
+            "points": (
+                None
+                if self.points is None
+                else {str(code): volts for code, volts in sorted(self.points.items())}
+            ),
+            "stored": self.stored,
+        }
+
+
+def _each(units, fn, workers):
+    # Runs fn on every unit that hasn't failed, recording exceptions on it.
+    def guarded(unit):
+        try:
+            fn(unit)
+        except Exception as exc:
+            unit.fail("{}: {}".format(type(exc).__name__, exc))
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        list(pool.map(guarded, [unit for unit in units if unit.ok]))
+
+
+def read_revisions(units, workers=4):
+    """Returns the board revision to calibrate, or None if no unit answered.
+
+    If the units are a mix of revisions the most common one is calibrated
+    and the rest are left for another pass, since the reference range is
+    different for them.
+    """
+
+    def read(unit):
+        unit.revision = int(unit.runner.run(READ_REVISION))
+
+    _each(units, read, workers)
+    revisions = [unit.revision for unit in units if unit.ok]
+    if not revisions:
+        return None
+    keep = max(sorted(set(revisions)), key=revisions.count)
+    for unit in units:
+        if unit.ok and unit.revision != keep:
+            unit.fail("revision {}, calibrating v{} now".format(unit.revision, keep))
+    return keep
+
+
+def measure(units, voltage, samples=256, workers=4):
+    """Reads every unit's average ADC code with the reference at voltage."""
+    code = READ_ADC.format(samples=samples)
+
+    def read(unit):
+        total = int(unit.runner.run(code))
+        unit.codes.append((total + samples // 2) // samples)
+        batch.log(unit.name, "{:+.2f}V reads {}".format(voltage, unit.codes[-1]))
+
+    _each(units, read, workers)
+
+
+def fit(unit, voltages, nominal):
+    """Checks a unit's readings and turns them into calibration points."""
+    codes = unit.codes
+    if len(codes) != len(voltages):
+        unit.fail("measured {} of {} points".format(len(codes), len(voltages)))
+        return
+    # The input is inverted, so codes fall as the voltage rises.
+    if any(a <= b for a, b in zip(codes, codes[1:])):
+        unit.fail("readings aren't monotonic: {}".format(codes))
+        return
+    for voltage, code, expected in zip(voltages, codes, nominal):
+        if abs(code - expected) > MAX_DEVIATION:
+            unit.fail("{}V read {}, expected about {}".format(voltage, code, expected))
+            return
+    points = list(zip(codes, voltages))
+    for end, inner, rail in ((0, 1, MAX_CODE), (-1, -2, 0)):
+        if abs(points[end][0] - rail) <= RAIL_MARGIN:
+            points[end] = (rail, _extend(points[inner * 2 - end], points[inner], rail))
+    unit.points = dict(points)
+
+
+def _extend(a, b, code):
+    # The voltage at code on the line through the points a and b.
+    (c0, v0), (c1, v1) = a, b
+    return round(v1 + (code - c1) * (v1 - v0) / (c1 - c0), 3)
+
+
+def store(unit, records_dir=RECORDS_DIR):
+    data = pack(unit.revision, unit.device.uid, unit.points)
+    os.makedirs(records_dir, exist_ok=True)
+    with open(os.path.join(records_dir, "{}.bin".format(unit.name)), "wb") as fh:
+        fh.write(data)
+
+    where = unit.runner.run(WRITE_RECORD.format(data=data)).strip()
+    if where == "file":
+        with open(os.path.join(unit.device.drive, "calibration.bin"), "wb") as fh:
+            fh.write(data)
+    elif where != "nvm":
+        raise RuntimeError("nvm didn't read back what was written")
+    unit.stored = where
+    unit.status = "ok"
+    batch.log(unit.name, "saved to {}".format(where))
+
+
+def calibrate(units, prompt=input, samples=256, workers=4, records_dir=RECORDS_DIR):
+    """Calibrates all of ``units``, asking the operator to set each voltage.
+
+    Each unit's ``runner`` has a ``run(code)`` method that runs code on the
+    module and returns what it printed. Returns True if all of them passed.
+    """
+    revision = read_revisions(units, workers)
+    if revision is None:
+        return False
+    nominal = NOMINAL[revision]
+    # From the lowest voltage to the highest.
+    codes = sorted(nominal, reverse=True)
+    voltages = [nominal[code] for code in codes]
+
+    for voltage in voltages:
+        prompt("Set the reference to {:+.2f}V and press enter: ".format(voltage))
+        measure(units, voltage, samples, workers)
+
+    for unit in units:
+        if unit.ok:
+            fit(unit, voltages, codes)
+    _each(units, lambda unit: store(unit, records_dir), workers)
+    return all(unit.ok for unit in units)
+
+
+class SerialREPL:
+    """Runs code on a module through CircuitPython's raw REPL."""
+
+    def __init__(self, port, timeout=10):
+        self.port = port
+        self.timeout = timeout
+
+    def run(self, code):
+        import serial
+
+        with serial.Serial(self.port, 115200, timeout=self.timeout) as conn:
+            # Stop whatever is running and enter raw mode, where code is sent
+            # and run without being echoed.
+            conn.write(b"\r\x03\x03\x01")
+            self._read_until(conn, b"raw REPL; CTRL-B to exit\r\n>")
+            conn.write(code.encode("utf-8") + b"\x04")
+            if conn.read(2) != b"OK":
+                raise RuntimeError("The module didn't accept the code")
+            output = self._read_until(conn, b"\x04")[:-1]
+            error = self._read_until(conn, b"\x04")[:-1]
+            conn.write(b"\x02")
+        if error:
+            raise RuntimeError(error.decode("utf-8", "replace").strip())
+        return output.decode("utf-8")
+
+    def _read_until(self, conn, ending):
+        data = b""
+        deadline = time.monotonic() + self.timeout
+        while not data.endswith(ending):
+            if time.monotonic() > deadline:
+                raise RuntimeError("Timed out talking to {}".format(self.port))
+            data += conn.read(1)
+        return data
+
+
+def write_report(units, path=REPORT_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as fh:
+        json.dump(
+            {
+                "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "units": [unit.report() for unit in units],
+            },
+            fh,
+            indent=2,
+        )
+    print("Wrote {}".format(path))
+
+
+def print_summary(units):
+    print("========== CALIBRATION SUMMARY ==========")
+    for unit in units:
+        line = "{:<24} v{:<2} {:<7}".format(
+            unit.name, unit.revision or "?", unit.status
+        )
+        if unit.points:
+            line += " " + " ".join(str(code) for code in sorted(unit.points))
+        if unit.error:
+            line += "  " + unit.error
+        print(line)
+    failed = sum(not unit.ok for unit in units)
+    print("{} of {} modules calibrated.".format(len(units) - failed, len(units)))
+
+
+def batch_calibrate(usb_device_id, workers=4, samples=256):
+    """Finds every attached module and calibrates them. Returns True if all
+    of them succeeded."""
+    devices = batch.discover(usb_device_id)
+    if not devices:
+        print("No CIRCUITPY drives found.")
+        return False
+    print("Found {} modules".format(len(devices)))
+
+    units = []
+    for device in devices:
+        unit = Unit(device, SerialREPL(device.port) if device.port else None)
+        if device.port is None:
+            unit.fail("No serial port found for {}".format(device.drive))
+        units.append(unit)
+
+    ok = calibrate(units, samples=samples, workers=workers)
+    # A soft reset runs code.py again, which picks up the new calibration.
+    for unit in units:
+        if unit.device.port is not None:
+            batch.SerialControl(unit.device.port).reset()
+    print_summary(units)
+    write_report(units)
+    return ok
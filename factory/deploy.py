@@ -0,0 +1,195 @@
+"""Copies only the files that changed to a CIRCUITPY drive.
+
+Every deploy leaves a manifest on the drive with the hash and size of each
+file it wrote. The next deploy hashes the local files, compares them with
+the manifest and only copies the ones that are new or different, or whose
+size on the drive no longer matches. Files that the last deploy wrote but
+that are no longer part of the deploy are removed.
+
+CircuitPython restarts code.py whenever the drive is written to. To keep a
+restart part way through from running a mix of old and new code, files are
+written in this order: data such as samples, then the library (with each
+package's __init__ last), then everything else, then code.py, and finally the
+manifest. If a deploy is interrupted, the manifest isn't updated, so the next
+deploy copies anything that might not have made it.
+
+    python deploy.py DESTINATION --dry-run
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import sys
+
+MANIFEST_NAME = ".bhb_manifest.json"
+
+
+def _is_deployable(name):
+    return not name.startswith(".") and name != "__pycache__"
+
+
+def collect(files_to_deploy):
+    """Maps each destination path (relative to the drive) to its local file.
+
+    ``files_to_deploy`` is in the same form as factory_setup.FILES_TO_DEPLOY:
+    local files or directories mapped to the directory they go in, or to a
+    file name for a single file that's renamed on the way.
+    """
+    files = {}
+    for source, destination in files_to_deploy.items():
+        if os.path.isdir(source):
+            base = os.path.join(destination, os.path.basename(source))
+            for directory, dirnames, filenames in os.walk(source):
+                dirnames[:] = sorted(name for name in dirnames if _is_deployable(name))
+                relative = os.path.relpath(directory, source)
+                for name in sorted(filenames):
+                    if _is_deployable(name):
+                        target = os.path.normpath(os.path.join(base, relative, name))
+                        files[target] = os.path.join(directory, name)
+        elif os.path.splitext(destination)[1]:
+            files[os.path.normpath(destination)] = source
+        else:
+            target = os.path.join(destination, os.path.basename(source))
+            files[os.path.normpath(target)] = source
+    return files
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(65536), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def read_manifest(drive):
+    # A missing, unreadable or malformed manifest means nothing on the drive
+    # can be trusted, so everything is copied.
+    try:
+        with open(os.path.join(drive, MANIFEST_NAME), "r") as fh:
+            manifest = json.load(fh)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(manifest, dict) or not all(
+        isinstance(entry, dict) for entry in manifest.values()
+    ):
+        return {}
+    return manifest
+
+
+def _write_order(path):
+    # Lower sorts first, see the module docstring.
+    parts = path.replace(os.sep, "/").split("/")
+    if path == "code.py":
+        return (3, path)
+    if parts[0] == "lib":
+        return (1, os.path.basename(path) == "__init__.py", path)
+    if path.endswith(".py") or path.endswith(".mpy"):
+        return (2, path)
+    return (0, path)
+
+
+class Plan:
+    def __init__(self, drive, files, manifest, hashes, full=False):
+        self.drive = drive
+        self.files = files
+        self.hashes = hashes
+        self.copy = []
+        self.unchanged = []
+        for path in sorted(files, key=_write_order):
+            recorded = manifest.get(path)
+            on_drive = os.path.join(drive, path)
+            size = os.path.getsize(files[path])
+            if (
+                full
+                or recorded is None
+                or recorded.get("sha256") != hashes[path]
+                or not os.path.exists(on_drive)
+                or os.path.getsize(on_drive) != size
+            ):
+                self.copy.append(path)
+            else:
+                self.unchanged.append(path)
+        self.remove = sorted(path for path in manifest if path not in files)
+
+    def size(self, paths):
+        return sum(os.path.getsize(self.files[path]) for path in paths)
+
+    def print_summary(self):
+        for path in self.copy:
+            print("  copy   {} ({} bytes)".format(path, self.size([path])))
+        for path in self.remove:
+            print("  remove {}".format(path))
+        print(
+            "{} files to copy ({} bytes), {} unchanged ({} bytes saved), "
+            "{} to remove.".format(
+                len(self.copy),
+                self.size(self.copy),
+                len(self.unchanged),
+                self.size(self.unchanged),
+                len(self.remove),
+            )
+        )
+
+
+def plan(files_to_deploy, drive, full=False):
+    files = collect(files_to_deploy)
+    hashes = {path: file_hash(source) for path, source in files.items()}
+    # Even a full copy reads the manifest to find files that were dropped.
+    return Plan(drive, files, read_manifest(drive), hashes, full=full)
+
+
+def apply(plan):
+    for path in plan.copy:
+        target = os.path.join(plan.drive, path)
+        os.makedirs(os.path.dirname(target) or plan.drive, exist_ok=True)
+        shutil.copyfile(plan.files[path], target)
+
+    for path in plan.remove:
+        target = os.path.join(plan.drive, path)
+        if os.path.exists(target):
+            os.remove(target)
+
+    manifest = {
+        path: {"sha256": plan.hashes[path], "size": os.path.getsize(source)}
+        for path, source in plan.files.items()
+    }
+    with open(os.path.join(plan.drive, MANIFEST_NAME), "w") as fh:
+        json.dump(manifest, fh, indent=1, sort_keys=True)
+        fh.flush()
+        os.fsync(fh.fileno())
+
+
+def deploy(files_to_deploy, drive, dry_run=False, full=False):
+    """Copies what changed to ``drive`` and returns the Plan that was used.
+
+    ``full`` copies everything, but still removes the files the last deploy
+    wrote that are no longer part of this one.
+    """
+    deploy_plan = plan(files_to_deploy, drive, full=full)
+    deploy_plan.print_summary()
+    if not dry_run:
+        apply(deploy_plan)
+    return deploy_plan
+
+
+def main():
+    # A quick way to see what a deploy would do. The files are prepared the
+    # same way as factory_setup.py does, so --source and --raw-samples work
+    # here too.
+    import factory_setup
+
+    if len(sys.argv) < 2 or sys.argv[1].startswith("--"):
+        print("usage: deploy.py DESTINATION [--dry-run] [--full] [--source]")
+        sys.exit(1)
+    deploy(
+        factory_setup.prepare_files(),
+        sys.argv[1],
+        dry_run="--dry-run" in sys.argv,
+        full="--full" in sys.argv,
+    )
+
+
+if __name__ == "__main__":
+    main()
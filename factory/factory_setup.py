@@ -1,6 +1,11 @@
 import os
 import sys
 
+import batch
+import calibrate
+import deploy
+import mpy_build
+import sample_build
 import wintertools.circuitpython
 import wintertools.fs
 import wintertools.fw_fetch
@@ -21,16 +26,30 @@ FILES_TO_DOWNLOAD = {
     "https://raw.githubusercontent.com/theacodes/Winterbloom_VoltageIO/master/winterbloom_voltageio.py": "winterbloom_voltageio.py",
 }
 
+SAMPLES_DIR = os.path.join(ROOT_DIR, "samples")
+
 FILES_TO_DEPLOY = {
     wintertools.fs.cache_path("winterbloom_voltageio.py"): "lib",
     os.path.join(FIRMWARE_DIR, "winterbloom_bhb"): "lib",
-    os.path.join(ROOT_DIR, "samples"): ".",
+    SAMPLES_DIR: ".",
     os.path.join(ROOT_DIR, "examples"): ".",
     os.path.join(FIRMWARE_DIR, "LICENSE"): ".",
     os.path.join(FIRMWARE_DIR, "README.HTM"): ".",
     os.path.join(ROOT_DIR, "examples/default.py"): "code.py",
 }
 
+# Library modules that are deployed as .mpy files unless --source is given.
+# The examples stay as source so that they can be edited on the device.
+LIBRARY_SOURCES = [
+    wintertools.fs.cache_path("winterbloom_voltageio.py"),
+    os.path.join(FIRMWARE_DIR, "winterbloom_bhb"),
+]
+
+USE_SOURCE = "--source" in sys.argv
+RAW_SAMPLES = "--raw-samples" in sys.argv
+DRY_RUN = "--dry-run" in sys.argv
+FULL_COPY = "--full" in sys.argv
+
 
 def program_firmware():
     print("========== PROGRAMMING FIRMWARE ==========")
@@ -45,24 +64,70 @@ def program_firmware():
     wintertools.jlink.run(JLINK_DEVICE, JLINK_SCRIPT)
 
 
-def deploy_circuitpython_code(destination=None):
+def prepare_files(use_source=USE_SOURCE):
+    """Downloads and compiles what's needed and returns the files to deploy."""
+    print("Cleaning temporary files from src directories...")
+    wintertools.fs.clean_pycache(FIRMWARE_DIR)
+    wintertools.fs.clean_pycache(EXAMPLES_DIR)
+
+    missing = {
+        url: name
+        for url, name in FILES_TO_DOWNLOAD.items()
+        if FULL_COPY or not os.path.exists(wintertools.fs.cache_path(name))
+    }
+    if missing:
+        print("Downloading files to cache...")
+        wintertools.fs.download_files_to_cache(missing)
+
+    files_to_deploy = dict(FILES_TO_DEPLOY)
+    if not use_source:
+        print("Compiling library to .mpy...")
+        outputs, built = mpy_build.build(LIBRARY_SOURCES)
+        for source, output in zip(LIBRARY_SOURCES, outputs):
+            del files_to_deploy[source]
+            files_to_deploy[output] = "lib"
+        mpy_build.print_report(built)
+
+    # Pass --raw-samples to deploy the samples as they are in the repo.
+    if not RAW_SAMPLES:
+        print("Converting samples...")
+        output, processed = sample_build.build(SAMPLES_DIR)
+        del files_to_deploy[SAMPLES_DIR]
+        files_to_deploy[output] = "."
+        sample_build.print_report(processed)
+    return files_to_deploy
+
+
+def deploy_circuitpython_code(
+    destination=None, incremental=True, use_source=USE_SOURCE
+):
     print("========== DEPLOYING CODE ==========")
 
     if not destination:
         print("Waiting for CIRCUITPY drive...")
         destination = wintertools.fs.wait_for_drive("CIRCUITPY")
 
-        print("Forcing BHB into repl (workaround for CircuitPython issue #3986)")
-        wintertools.circuitpython.force_into_repl(USB_DEVICE_ID)
+        if not DRY_RUN:
+            print("Forcing BHB into repl (workaround for CircuitPython issue #3986)")
+            wintertools.circuitpython.force_into_repl(USB_DEVICE_ID)
 
-    print("Cleaning temporary files from src directories...")
-    wintertools.fs.clean_pycache(FIRMWARE_DIR)
-    wintertools.fs.clean_pycache(EXAMPLES_DIR)
+    files_to_deploy = prepare_files(use_source)
 
-    print("Downloading files to cache...")
-    wintertools.fs.download_files_to_cache(FILES_TO_DOWNLOAD)
-    print("Copying files...")
-    wintertools.fs.deploy_files(FILES_TO_DEPLOY, destination)
+    if not incremental:
+        print("Copying files...")
+        wintertools.fs.deploy_files(files_to_deploy, destination)
+    else:
+        # Only copies what changed since the last deploy to this drive, see
+        # deploy.py. --full copies everything, --dry-run only prints what
+        # would be copied.
+        print("Copying changed files...")
+        deploy.deploy(files_to_deploy, destination, dry_run=DRY_RUN, full=FULL_COPY)
+        if DRY_RUN:
+            return
+
+    mpy_build.remove_stale(
+        os.path.join(destination, "lib"), LIBRARY_SOURCES, use_source
+    )
 
     if not destination:
         print("Done copying files, resetting...")
@@ -70,9 +135,65 @@ def deploy_circuitpython_code(destination=None):
         print("Done!")
 
 
+def batch_deploy():
+    print("========== BATCH DEPLOY ==========")
+    workers = 4
+    if "--workers" in sys.argv:
+        workers = int(sys.argv[sys.argv.index("--workers") + 1])
+
+    files_to_deploy = prepare_files()
+
+    def remove_stale(drive):
+        mpy_build.remove_stale(os.path.join(drive, "lib"), LIBRARY_SOURCES, USE_SOURCE)
+
+    ok = batch.batch(
+        USB_DEVICE_ID,
+        files_to_deploy,
+        workers=workers,
+        after_copy=remove_stale,
+        full=FULL_COPY,
+        dry_run=DRY_RUN,
+    )
+    if not ok:
+        sys.exit(1)
+
+
+def batch_calibrate():
+    print("========== CALIBRATION ==========")
+    workers = 4
+    if "--workers" in sys.argv:
+        workers = int(sys.argv[sys.argv.index("--workers") + 1])
+    samples = 256
+    if "--samples" in sys.argv:
+        samples = int(sys.argv[sys.argv.index("--samples") + 1])
+
+    # Measures the CV input of every attached module against a shared
+    # reference and stores each one's calibration, see calibrate.py.
+    if not calibrate.batch_calibrate(USB_DEVICE_ID, workers=workers, samples=samples):
+        sys.exit(1)
+
+
 def main():
+    # Pass --source to deploy the library as .py files instead of compiling it.
+    # The published bundle is always source: people install it on whatever
+    # CircuitPython they have, and .mpy files only load on the version that
+    # matches the mpy-cross they were built with.
     if len(sys.argv) > 1 and sys.argv[1] == "publish":
-        deploy_circuitpython_code("distribution")
+        deploy_circuitpython_code("distribution", incremental=False, use_source=True)
+        return
+
+    # Deploys to every attached module at once, see batch.py. This comes
+    # before --dry-run so that `batch --dry-run` checks every module.
+    if len(sys.argv) > 1 and sys.argv[1] == "batch":
+        batch_deploy()
+        return
+
+    if len(sys.argv) > 1 and sys.argv[1] == "calibrate":
+        batch_calibrate()
+        return
+
+    if DRY_RUN:
+        deploy_circuitpython_code()
         return
 
     try:
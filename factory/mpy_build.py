@@ -0,0 +1,193 @@
+"""Cross-compiles the library to .mpy files for deployment.
+
+CircuitPython compiles every .py file it imports, which takes time at boot
+and needs heap for the compiler on top of the code itself. Deploying .mpy
+files made ahead of time by mpy-cross skips that. mpy-cross must come from
+the same CircuitPython release as the firmware, since .mpy files aren't
+compatible across versions. Set MPY_CROSS to its path if it isn't on PATH.
+
+Compiled files are cached by a hash of their source and the mpy-cross
+version, so only changed modules are recompiled. Files that aren't Python
+(such as the oscillator's wavetables) are copied as they are.
+
+    python mpy_build.py            # build and print the size report
+"""
+
+import hashlib
+import os
+import shutil
+import subprocess
+import sys
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+BUILD_DIR = os.path.join(ROOT_DIR, "build", "lib")
+CACHE_DIR = os.path.join(ROOT_DIR, "build", "mpy-cache")
+
+MPY_CROSS = os.environ.get("MPY_CROSS", "mpy-cross")
+
+
+def mpy_cross_version(mpy_cross=MPY_CROSS):
+    try:
+        result = subprocess.run(
+            [mpy_cross, "--version"], check=True, capture_output=True, text=True
+        )
+    except (OSError, subprocess.CalledProcessError) as exc:
+        raise RuntimeError(
+            "Couldn't run {}. Install mpy-cross for your CircuitPython version, "
+            "set MPY_CROSS to its path, or deploy with --source.".format(mpy_cross)
+        ) from exc
+    return result.stdout.strip()
+
+
+class BuiltFile:
+    def __init__(self, source, output, cached):
+        self.source = source
+        self.output = output
+        self.cached = cached
+
+    @property
+    def source_size(self):
+        return os.path.getsize(self.source)
+
+    @property
+    def output_size(self):
+        return os.path.getsize(self.output)
+
+    @property
+    def compiled(self):
+        return self.output.endswith(".mpy")
+
+
+def compile_file(source, output, mpy_cross, version):
+    with open(source, "rb") as fh:
+        contents = fh.read()
+    digest = hashlib.sha256(version.encode() + b"\0" + contents).hexdigest()
+    cached_path = os.path.join(CACHE_DIR, digest + ".mpy")
+    cached = os.path.exists(cached_path)
+
+    if not cached:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        subprocess.run(
+            [
+                mpy_cross,
+                "-o",
+                cached_path,
+                "-s",
+                os.path.basename(source),
+                source,
+            ],
+            check=True,
+        )
+
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    shutil.copyfile(cached_path, output)
+    return BuiltFile(source, output, cached)
+
+
+def build(sources, mpy_cross=MPY_CROSS):
+    """Compiles `sources` (files or package directories) into BUILD_DIR.
+
+    Returns the paths in BUILD_DIR that correspond to each source, in the
+    same order, along with a BuiltFile for every file that was built.
+    """
+    version = mpy_cross_version(mpy_cross)
+    if os.path.exists(BUILD_DIR):
+        shutil.rmtree(BUILD_DIR)
+
+    outputs = []
+    built = []
+    for source in sources:
+        source = os.path.abspath(source)
+        output = os.path.join(BUILD_DIR, os.path.basename(source))
+
+        if os.path.isdir(source):
+            files = sorted(
+                os.path.join(source, name)
+                for name in os.listdir(source)
+                if not name.startswith(".") and name != "__pycache__"
+            )
+            targets = [
+                (path, os.path.join(output, os.path.basename(path))) for path in files
+            ]
+        else:
+            targets = [(source, output)]
+
+        for path, target in targets:
+            if path.endswith(".py"):
+                built.append(
+                    compile_file(path, target[:-3] + ".mpy", mpy_cross, version)
+                )
+            else:
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                shutil.copyfile(path, target)
+                built.append(BuiltFile(path, target, cached=False))
+
+        if not os.path.isdir(source) and source.endswith(".py"):
+            output = output[:-3] + ".mpy"
+        outputs.append(output)
+
+    return outputs, built
+
+
+def remove_stale(lib_dir, sources, use_source):
+    """Removes the other kind of module left behind by a previous deploy.
+
+    CircuitPython imports foo.py in preference to foo.mpy, so an old .py
+    would hide a freshly deployed .mpy.
+    """
+    stale, wanted = (".mpy", ".py") if use_source else (".py", ".mpy")
+    for source in sources:
+        target = os.path.join(lib_dir, os.path.basename(source))
+        if os.path.isdir(target):
+            stems = [
+                os.path.join(target, os.path.splitext(name)[0])
+                for name in os.listdir(target)
+                if name.endswith(wanted)
+            ]
+        else:
+            stems = [os.path.splitext(target)[0]]
+        for stem in stems:
+            if os.path.exists(stem + wanted) and os.path.exists(stem + stale):
+                os.remove(stem + stale)
+
+
+def print_report(built):
+    source_total = 0
+    output_total = 0
+    print("{:<40} {:>8} {:>8} {:>7}".format("file", "source", "mpy", "cached"))
+    for item in built:
+        if not item.compiled:
+            continue
+        source_total += item.source_size
+        output_total += item.output_size
+        print(
+            "{:<40} {:>8} {:>8} {:>7}".format(
+                os.path.relpath(item.source, ROOT_DIR),
+                item.source_size,
+                item.output_size,
+                "yes" if item.cached else "no",
+            )
+        )
+    print(
+        "{:<40} {:>8} {:>8}   {:.0%} smaller on the drive".format(
+            "total",
+            source_total,
+            output_total,
+            1 - output_total / max(1, source_total),
+        )
+    )
+    print(
+        "The device no longer compiles {} bytes of source at boot. To see the "
+        "heap this saves, run factory/scripts/import_ram.py on the device "
+        "after deploying with and without --source.".format(source_total)
+    )
+
+
+def main():
+    sources = sys.argv[1:] or [os.path.join(ROOT_DIR, "firmware", "winterbloom_bhb")]
+    _, built = build(sources)
+    print_report(built)
+
+
+if __name__ == "__main__":
+    main()
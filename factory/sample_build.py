@@ -0,0 +1,447 @@
+"""Converts the samples to the format the firmware plays most cheaply.
+
+The device plays whatever WAV files are on the drive, but it pays for
+anything beyond mono 16-bit PCM: extra channels and higher rates mean more
+bytes streamed from flash for every second of sound, silence at either end
+is read and played for nothing, and 24 or 32-bit files can't be played at
+all. This writes a copy of each sample that's:
+
+- mono, averaging the channels of stereo files,
+- 16-bit (or 8-bit, for samples where size matters more than noise),
+- at the base sample rate, since play() always sets the rate to
+  base_sample_rate * 2 ** pitch_cv and a file at another rate would play
+  at the wrong pitch,
+- trimmed of silence at the start and end,
+- normalised to the same peak as the factory samples,
+- for looped segments such as honk_p2.wav, cut so that the end flows
+  back into the start without a jump,
+- with its cue points, their labels and its loops kept, moved to match any
+  resampling and trimming, since winterbloom_bhb/slices.py cuts samples up
+  at them.
+
+Outputs are cached in build/sample-cache by a hash of the source and the
+options used, so unchanged samples aren't processed again.
+
+    python sample_build.py [SAMPLES_DIR]    # build and print the report
+"""
+
+import array
+import hashlib
+import json
+import math
+import os
+import shutil
+import struct
+import sys
+import wave
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+SAMPLES_DIR = os.path.join(ROOT_DIR, "samples")
+BUILD_DIR = os.path.join(ROOT_DIR, "build", "samples")
+CACHE_DIR = os.path.join(ROOT_DIR, "build", "sample-cache")
+
+# Bump when the processing changes so that cached outputs are rebuilt.
+VERSION = 2
+
+DEFAULT_OPTIONS = {
+    "bits": 16,
+    "sample_rate": 44100,
+    "trim": True,
+    # Anything quieter than this at the ends is silence.
+    "trim_db": -60.0,
+    # The peak level the factory samples are mastered at. None leaves the
+    # level alone.
+    "peak_db": -5.0,
+    "loop": False,
+}
+
+# The long honk is read into RAM whole by examples/long_honk.py, so it's
+# 8-bit to halve that, and keeps its level. honk_p1-3.wav are the same honk
+# in three parts, which older code.py files play back to back, so they keep
+# their ends and relative levels. The middle one is looped.
+SAMPLE_OPTIONS = {
+    "honk_long.wav": {"trim": False, "peak_db": None, "bits": 8},
+    "honk_p1.wav": {"trim": False, "peak_db": None},
+    "honk_p2.wav": {"trim": False, "peak_db": None, "loop": True},
+    "honk_p3.wav": {"trim": False, "peak_db": None},
+}
+
+
+def options_for(name):
+    options = dict(DEFAULT_OPTIONS)
+    options.update(SAMPLE_OPTIONS.get(name, {}))
+    return options
+
+
+def _db(value):
+    return 20 * math.log10(max(value, 1e-9))
+
+
+def read_wav(path):
+    """Returns (channel_count, sample_width, sample_rate, frames), where frames
+    is a list of per-frame values averaged across channels in -1..1."""
+    with wave.open(path, "rb") as wav:
+        channels = wav.getnchannels()
+        width = wav.getsampwidth()
+        rate = wav.getframerate()
+        data = wav.readframes(wav.getnframes())
+
+    if width == 1:
+        values = [(value - 128) / 128 for value in data]
+    elif width == 2:
+        # WAV data is little-endian, as are the hosts this runs on.
+        values = [value / 32768 for value in array.array("h", data)]
+    elif width in (3, 4):
+        scale = float(1 << (width * 8 - 1))
+        values = [
+            int.from_bytes(data[i : i + width], "little", signed=True) / scale
+            for i in range(0, len(data), width)
+        ]
+    else:
+        raise ValueError("{} has an unsupported sample width".format(path))
+    if channels > 1:
+        values = [
+            sum(values[i : i + channels]) / channels
+            for i in range(0, len(values), channels)
+        ]
+    return channels, width, rate, values
+
+
+def write_wav(path, frames, bits, sample_rate):
+    if bits == 8:
+        data = bytes(
+            max(0, min(255, int(round(value * 128)) + 128)) for value in frames
+        )
+    else:
+        data = array.array(
+            "h",
+            (max(-32768, min(32767, int(round(value * 32768)))) for value in frames),
+        ).tobytes()
+    with wave.open(path, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(bits // 8)
+        wav.setframerate(sample_rate)
+        wav.writeframes(data)
+
+
+class Markers:
+    """The cue points, their labels and the loops of a WAV file, in frames."""
+
+    def __init__(self):
+        # (cue id, frame) for each cue point.
+        self.cues = []
+        # The body of the LIST/adtl chunk that labels the cue points, which
+        # refers to them by id and so is kept as it is.
+        self.labels = None
+        # The smpl chunk's sampler fields and (start, last frame) of each
+        # loop, with the rest of each loop's fields.
+        self.sampler = None
+        self.loops = []
+
+    def __bool__(self):
+        return bool(self.cues or self.loops)
+
+    def move(self, scale, offset, length):
+        # Resampling scales positions, trimming the start shifts them. Loops
+        # store their last frame, so that's moved as the frame after it to
+        # keep the loop ending where the next part starts.
+        def _move(frame, last=length - 1):
+            return max(0, min(last, int(round(frame * scale)) - offset))
+
+        self.cues = [(cue_id, _move(frame)) for cue_id, frame in self.cues]
+        self.loops = [
+            (_move(start), max(_move(start), _move(end + 1, length) - 1), fields)
+            for start, end, fields in self.loops
+        ]
+
+
+def read_markers(path):
+    markers = Markers()
+    with open(path, "rb") as fh:
+        data = fh.read()
+    offset = 12
+    while offset + 8 <= len(data):
+        chunk_id = data[offset : offset + 4]
+        size = struct.unpack_from("<I", data, offset + 4)[0]
+        body = data[offset + 8 : offset + 8 + size]
+        if chunk_id == b"cue ":
+            (count,) = struct.unpack_from("<I", body)
+            for index in range(count):
+                cue_id, _, _, _, _, frame = struct.unpack_from(
+                    "<II4sIII", body, 4 + index * 24
+                )
+                markers.cues.append((cue_id, frame))
+        elif chunk_id == b"LIST" and body[:4] == b"adtl":
+            markers.labels = body
+        elif chunk_id == b"smpl":
+            markers.sampler = list(struct.unpack_from("<9I", body))
+            for index in range(markers.sampler[7]):
+                fields = struct.unpack_from("<6I", body, 36 + index * 24)
+                markers.loops.append((fields[2], fields[3], fields))
+        offset += 8 + size + (size & 1)
+    return markers
+
+
+def write_markers(path, markers, sample_rate):
+    """Appends the markers' chunks to a WAV file written by write_wav()."""
+
+    def chunk(chunk_id, body):
+        return chunk_id + struct.pack("<I", len(body)) + body + b"\0" * (len(body) & 1)
+
+    extra = b""
+    if markers.cues:
+        body = struct.pack("<I", len(markers.cues))
+        for cue_id, frame in markers.cues:
+            body += struct.pack("<II4sIII", cue_id, frame, b"data", 0, 0, frame)
+        extra += chunk(b"cue ", body)
+    if markers.labels is not None:
+        extra += chunk(b"LIST", markers.labels)
+    if markers.loops:
+        sampler = list(markers.sampler)
+        sampler[2] = 1_000_000_000 // sample_rate
+        sampler[7] = len(markers.loops)
+        body = struct.pack("<9I", *sampler)
+        for start, end, fields in markers.loops:
+            body += struct.pack("<6I", fields[0], fields[1], start, end, *fields[4:])
+        extra += chunk(b"smpl", body)
+
+    with open(path, "r+b") as fh:
+        fh.seek(0, os.SEEK_END)
+        # The wave module doesn't pad odd-sized data, which 8-bit mono can be.
+        if fh.tell() & 1:
+            fh.write(b"\0")
+        fh.write(extra)
+        size = fh.tell() - 8
+        fh.seek(4)
+        fh.write(struct.pack("<I", size))
+
+
+def resample(frames, source_rate, target_rate, taps=16):
+    """Windowed-sinc resampling, low-passed below the lower Nyquist rate."""
+    if source_rate == target_rate:
+        return frames
+    ratio = target_rate / source_rate
+    cutoff = min(1.0, ratio)
+    count = int(len(frames) * ratio)
+    last = len(frames) - 1
+    output = []
+    for n in range(count):
+        center = n / ratio
+        start = int(center) - taps + 1
+        total = 0.0
+        for i in range(start, start + 2 * taps):
+            if 0 <= i <= last:
+                x = (i - center) * cutoff
+                sinc = 1.0 if x == 0 else math.sin(math.pi * x) / (math.pi * x)
+                window = 0.5 + 0.5 * math.cos(math.pi * (i - center) / taps)
+                total += frames[i] * cutoff * sinc * window
+        output.append(total)
+    return output
+
+
+def trim_bounds(frames, threshold_db):
+    """The first and one past the last frame that aren't silence."""
+    threshold = 10 ** (threshold_db / 20)
+    loud = [i for i, value in enumerate(frames) if abs(value) > threshold]
+    if not loud:
+        return 0, 1
+    return loud[0], loud[-1] + 1
+
+
+def trim(frames, threshold_db):
+    start, end = trim_bounds(frames, threshold_db)
+    return frames[start:end]
+
+
+def loop_jump(frames):
+    # How far the level jumps when a loop goes from the end back to the start.
+    return abs(frames[-1] + (frames[1] - frames[0]) - frames[0])
+
+
+def align_loop(frames):
+    """Cuts the end of a looped segment so that it flows into its start.
+
+    Looks through the second half for the frame that best matches the
+    start's level and slope, and ends the loop just before it. The start is
+    left alone, since it's what follows the attack.
+    """
+    if len(frames) < 8:
+        return frames
+    best_end = len(frames)
+    best_cost = loop_jump(frames)
+    for end in range(len(frames) // 2, len(frames) - 1):
+        cost = abs(frames[end] - frames[0]) + abs(frames[end + 1] - frames[1])
+        if cost < best_cost:
+            best_end, best_cost = end, cost
+    return frames[:best_end]
+
+
+class ProcessedSample:
+    def __init__(self, source, output, cached, notes):
+        self.source = source
+        self.output = output
+        self.cached = cached
+        self.notes = notes
+
+    @staticmethod
+    def _stream_rate(path):
+        # Bytes per second streamed from flash when played at the base pitch.
+        with wave.open(path, "rb") as wav:
+            return wav.getnchannels() * wav.getsampwidth() * wav.getframerate()
+
+    @property
+    def source_size(self):
+        return os.path.getsize(self.source)
+
+    @property
+    def output_size(self):
+        return os.path.getsize(self.output)
+
+    @property
+    def source_stream_rate(self):
+        return self._stream_rate(self.source)
+
+    @property
+    def output_stream_rate(self):
+        return self._stream_rate(self.output)
+
+
+def process(source, output, options):
+    """Converts one sample and returns notes describing what changed."""
+    channels, width, rate, frames = read_wav(source)
+    markers = read_markers(source)
+    scale = 1.0
+    start = 0
+    notes = []
+    if channels > 1:
+        notes.append("{} channels to mono".format(channels))
+    if width * 8 != options["bits"]:
+        notes.append("{} to {} bit".format(width * 8, options["bits"]))
+    if rate != options["sample_rate"]:
+        notes.append("{} to {} Hz".format(rate, options["sample_rate"]))
+        frames = resample(frames, rate, options["sample_rate"])
+        scale = options["sample_rate"] / rate
+
+    if options["trim"]:
+        length = len(frames)
+        start, end = trim_bounds(frames, options["trim_db"])
+        frames = frames[start:end]
+        if len(frames) != length:
+            notes.append("trimmed {} frames".format(length - len(frames)))
+
+    peak = max(abs(value) for value in frames)
+    if options["peak_db"] is not None and peak > 0:
+        gain_db = options["peak_db"] - _db(peak)
+        # Small differences are left alone rather than requantizing the
+        # whole file for an inaudible change.
+        if abs(gain_db) >= 0.1:
+            gain = 10 ** (gain_db / 20)
+            frames = [value * gain for value in frames]
+            notes.append("{:+.1f} dB".format(gain_db))
+
+    if options["loop"]:
+        before = loop_jump(frames)
+        frames = align_loop(frames)
+        notes.append("loop jump {:.3f} to {:.3f}".format(before, loop_jump(frames)))
+
+    write_wav(output, frames, options["bits"], options["sample_rate"])
+    if markers:
+        markers.move(scale, start, len(frames))
+        write_markers(output, markers, options["sample_rate"])
+        notes.append(
+            "kept {} cue points and {} loops".format(
+                len(markers.cues), len(markers.loops)
+            )
+        )
+    return notes
+
+
+def build_file(source, output):
+    options = options_for(os.path.basename(source))
+    with open(source, "rb") as fh:
+        contents = fh.read()
+    key = json.dumps([VERSION, options], sort_keys=True).encode()
+    digest = hashlib.sha256(key + b"\0" + contents).hexdigest()
+    cached_path = os.path.join(CACHE_DIR, digest + ".wav")
+    notes_path = os.path.join(CACHE_DIR, digest + ".json")
+    cached = os.path.exists(cached_path) and os.path.exists(notes_path)
+
+    if cached:
+        with open(notes_path, "r") as fh:
+            notes = json.load(fh)
+    else:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        notes = process(source, cached_path, options)
+        with open(notes_path, "w") as fh:
+            json.dump(notes, fh)
+
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    shutil.copyfile(cached_path, output)
+    return ProcessedSample(source, output, cached, notes)
+
+
+def build(samples_dir=SAMPLES_DIR):
+    """Converts every WAV in ``samples_dir`` into BUILD_DIR.
+
+    Other files are copied as they are. Returns BUILD_DIR and a
+    ProcessedSample for every WAV.
+    """
+    if os.path.exists(BUILD_DIR):
+        shutil.rmtree(BUILD_DIR)
+    os.makedirs(BUILD_DIR)
+
+    processed = []
+    for name in sorted(os.listdir(samples_dir)):
+        source = os.path.join(samples_dir, name)
+        output = os.path.join(BUILD_DIR, name)
+        if name.startswith(".") or os.path.isdir(source):
+            continue
+        if name.lower().endswith(".wav"):
+            processed.append(build_file(source, output))
+        else:
+            shutil.copyfile(source, output)
+    return BUILD_DIR, processed
+
+
+def print_report(processed):
+    source_total = 0
+    output_total = 0
+    print(
+        "{:<20} {:>8} {:>8} {:>6} {:>13}  {}".format(
+            "file", "source", "output", "saved", "stream B/s", "changes"
+        )
+    )
+    for item in processed:
+        source_total += item.source_size
+        output_total += item.output_size
+        stream = "{}".format(item.output_stream_rate)
+        if item.source_stream_rate != item.output_stream_rate:
+            stream = "{} > {}".format(item.source_stream_rate, stream)
+        print(
+            "{:<20} {:>8} {:>8} {:>6.0%} {:>13}  {}".format(
+                os.path.basename(item.source),
+                item.source_size,
+                item.output_size,
+                1 - item.output_size / max(1, item.source_size),
+                stream,
+                ", ".join(item.notes) or "-",
+            )
+        )
+    print(
+        "{:<20} {:>8} {:>8} {:>6.0%}".format(
+            "total",
+            source_total,
+            output_total,
+            1 - output_total / max(1, source_total),
+        )
+    )
+
+
+def main():
+    samples_dir = sys.argv[1] if len(sys.argv) > 1 else SAMPLES_DIR
+    _, processed = build(samples_dir)
+    print_report(processed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,20 @@
+# Copy this to the CIRCUITPY drive as code.py to see how much heap and time
+# importing the library takes. Compare the numbers after deploying with and
+# without --source to see what the precompiled .mpy files save.
+
+import gc
+import time
+
+gc.collect()
+free_before = gc.mem_free()
+start = time.monotonic_ns()
+
+import winterbloom_bhb  # noqa: E402, F401
+
+elapsed = time.monotonic_ns() - start
+gc.collect()
+free_after = gc.mem_free()
+
+print("import winterbloom_bhb: {} ms".format(elapsed // 1000000))
+print("heap used by the library: {} bytes".format(free_before - free_after))
+print("heap free: {} bytes".format(free_after))
@@ -0,0 +1,185 @@
+"""Measures how much the library allocates on each pass through the main loop.
+
+The library runs in the simulator with a gate that triggers and releases
+every --period seconds. After --warmup passes to get imports, caches and the
+first play() out of the way, tracemalloc measures each pass of the loop:
+
+- the peak number of bytes allocated during the pass, split into idle
+  passes, passes where the gate was triggered and passes where it was
+  released,
+- how much memory allocated by winterbloom_bhb is still held at the end
+  that wasn't at the start, and where it was allocated.
+
+The first is only a guide to compare commits by: on the host every int and
+float is a heap object and the simulator's fakes allocate too, whereas
+CircuitPython stores small ints in the pointer. The second is exact and
+should be zero, since anything the loop keeps growing will eventually fill
+the heap on the device. Exits with an error if it's over --max-growth, or
+if an idle pass peaked over --max-idle or a triggered pass over
+--max-trigger, for use in CI.
+
+--pitch picks how the loop re-pitches each trigger: "cv" with
+play(pitch_cv=bhb.pitch_in), which works in volts as floats, or "raw" with
+play(pitch_raw=bhb.pitch_in_raw), the integer path through the precomputed
+pitch table.
+
+    python benchmarks/allocations.py --max-growth 0 --max-idle 256 --max-trigger 1024
+"""
+
+import argparse
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from bhb_sim import Simulator, Timeline, Transitions  # noqa: E402
+
+LIBRARY_DIR = os.path.abspath(
+    os.path.join(os.path.dirname(__file__), "..", "winterbloom_bhb")
+)
+
+
+def measure(args):
+    timeline = Timeline(
+        duration=3600,
+        gate_in=Transitions.pulses(
+            start=0.0, period=args.period, width=args.period / 3, until=3600
+        ),
+        cv=1.0,
+    )
+    simulator = Simulator(timeline)
+    with simulator.installed():
+        simulator.clock.end_ns = timeline.duration_ns
+        import winterbloom_bhb
+
+        bhb = winterbloom_bhb.BigHonkingButton(gc_idle_ms=args.gc_idle_ms)
+        sample = bhb.load_sample(args.sample)
+
+        if args.pitch == "raw":
+            bhb.pitch_table
+
+            def loop():
+                bhb.update()
+                if bhb.triggered:
+                    bhb.play(sample, pitch_raw=bhb.pitch_in_raw)
+                if bhb.released:
+                    bhb.stop()
+
+        else:
+
+            def loop():
+                bhb.update()
+                if bhb.triggered:
+                    bhb.play(sample, pitch_cv=bhb.pitch_in)
+                if bhb.released:
+                    bhb.stop()
+
+        # Tracing starts before the warmup so that objects the loop replaces
+        # rather than accumulates, such as the last sample rate set, are in
+        # both snapshots.
+        peaks = {"idle": [], "trigger": [], "release": []}
+        tracemalloc.start(10)
+        try:
+            for _ in range(args.warmup):
+                loop()
+            start = tracemalloc.take_snapshot()
+            for _ in range(args.passes):
+                before = tracemalloc.get_traced_memory()[0]
+                tracemalloc.reset_peak()
+                loop()
+                peak = tracemalloc.get_traced_memory()[1] - before
+                if bhb.triggered:
+                    peaks["trigger"].append(peak)
+                elif bhb.released:
+                    peaks["release"].append(peak)
+                else:
+                    peaks["idle"].append(peak)
+            # The simulator's own logs keep what was passed to the fakes,
+            # such as each play()'s sample rate. Drop them so that only what
+            # the library holds is left.
+            del simulator.audio_events[:]
+            del simulator.gate_out_events[:]
+            del simulator.gc_collections[:]
+            del simulator.underruns[:]
+            end = tracemalloc.take_snapshot()
+        finally:
+            tracemalloc.stop()
+
+    library = [tracemalloc.Filter(True, os.path.join(LIBRARY_DIR, "*"))]
+    growth = [
+        stat
+        for stat in end.filter_traces(library).compare_to(
+            start.filter_traces(library), "lineno"
+        )
+        if stat.size_diff > 0
+    ]
+    return peaks, growth
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sample", default="samples/honk_p2.wav")
+    parser.add_argument("--period", type=float, default=0.01)
+    parser.add_argument("--warmup", type=int, default=2000)
+    parser.add_argument("--passes", type=int, default=5000)
+    parser.add_argument("--gc-idle-ms", type=int, default=0)
+    parser.add_argument("--pitch", choices=("cv", "raw"), default="cv")
+    parser.add_argument("--max-growth", type=int, default=None)
+    parser.add_argument("--max-idle", type=int, default=None)
+    parser.add_argument("--max-trigger", type=int, default=None)
+    args = parser.parse_args()
+
+    peaks, growth = measure(args)
+
+    print("Peak bytes allocated per pass:")
+    print("{:<10} {:>7} {:>7} {:>7} {:>7}".format("", "passes", "min", "median", "max"))
+    for kind, values in peaks.items():
+        if not values:
+            continue
+        values = sorted(values)
+        print(
+            "{:<10} {:>7} {:>7} {:>7} {:>7}".format(
+                kind, len(values), values[0], values[len(values) // 2], values[-1]
+            )
+        )
+
+    total = sum(stat.size_diff for stat in growth)
+    print(
+        "Held by winterbloom_bhb after {} passes: {} bytes".format(args.passes, total)
+    )
+    for stat in growth[:10]:
+        frame = stat.traceback[0]
+        print(
+            "    {}:{} +{} bytes in {} blocks".format(
+                os.path.relpath(frame.filename, LIBRARY_DIR),
+                frame.lineno,
+                stat.size_diff,
+                stat.count_diff,
+            )
+        )
+
+    failed = False
+    if args.max_growth is not None and total > args.max_growth:
+        print("Library memory grew by more than {} bytes".format(args.max_growth))
+        failed = True
+    if (
+        args.max_idle is not None
+        and peaks["idle"]
+        and max(peaks["idle"]) > args.max_idle
+    ):
+        print("An idle pass allocated more than {} bytes".format(args.max_idle))
+        failed = True
+    if (
+        args.max_trigger is not None
+        and peaks["trigger"]
+        and max(peaks["trigger"]) > args.max_trigger
+    ):
+        print("A triggered pass allocated more than {} bytes".format(args.max_trigger))
+        failed = True
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
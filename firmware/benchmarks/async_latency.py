@@ -0,0 +1,123 @@
+"""Compares trigger latency of the polling loop and the asyncio API.
+
+Runs default.py (a plain update() loop) and asyncio_honk.py (the same
+behaviour written with tasks) against the same timeline, then measures how
+long play_async() takes to resume its caller after a sample finishes, both
+on its own and with voices and a deferred sample. A negative time means it
+returned before the sample finished.
+
+    python benchmarks/async_latency.py --runs 5
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from bhb_sim import Simulator, Timeline, Transitions  # noqa: E402
+from bhb_sim.hardware import duration_ns  # noqa: E402
+from bhb_sim.simulator import EXAMPLES_DIR  # noqa: E402
+from bhb_sim.stats import format_ns, summarize  # noqa: E402
+
+PLAY_ASYNC_PROGRAM = """
+import asyncio
+import time
+import winterbloom_bhb
+
+bhb = winterbloom_bhb.BigHonkingButton({options})
+sample = bhb.load_sample("samples/kick.wav", deferred={deferred})
+resumed = []
+
+
+async def main():
+    while True:
+        await bhb.wait_triggered()
+        await bhb.play_async(sample)
+        resumed.append(time.monotonic_ns())
+
+
+asyncio.run(main())
+"""
+
+
+def compare_examples(args):
+    print(
+        "{:<14} {:>10} {:>10} {:>10} {:>10}".format(
+            "program", "lat p50", "lat p99", "period p50", "jitter"
+        )
+    )
+    for name in ("default", "asyncio_honk"):
+        latencies = []
+        periods = []
+        jitters = []
+        for run in range(args.runs):
+            simulator = Simulator(Timeline.default(args.duration), seed=run)
+            report = simulator.run(os.path.join(EXAMPLES_DIR, name + ".py"))
+            latencies.append(report.latency["p50"])
+            latencies.append(report.latency["p99"])
+            periods.append(report.loop_period["p50"])
+            jitters.append(report.jitter)
+        print(
+            "{:<14} {:>10} {:>10} {:>10} {:>10}".format(
+                name,
+                format_ns(summarize(latencies[0::2])["p50"]),
+                format_ns(summarize(latencies[1::2])["max"]),
+                format_ns(summarize(periods)["p50"]),
+                format_ns(summarize(jitters)["p50"]),
+            )
+        )
+
+
+def measure_play_async(args):
+    print("play_async() resumes its caller this long after the sample ends:")
+    for label, options, deferred in (
+        ("plain", "", False),
+        ("voices, deferred", "voices=2", True),
+    ):
+        timeline = Timeline(
+            duration=args.duration,
+            button=Transitions.pulses(
+                start=0.1, period=0.6, width=0.05, until=args.duration
+            ),
+        )
+        simulator = Simulator(timeline)
+        simulator.run_source(
+            PLAY_ASYNC_PROGRAM.format(options=options, deferred=deferred)
+        )
+
+        # With voices, the mixer starting on the audio output isn't a sample.
+        plays = [
+            event
+            for event in simulator.audio_events
+            if event.kind == "play" and not hasattr(event.sample, "voice")
+        ]
+        resumed = simulator.script_globals["resumed"]
+        lags = [
+            t - (play.time_ns + duration_ns(play.sample))
+            for play, t in zip(plays, resumed)
+        ]
+        lag = summarize(lags)
+        print(
+            "  {:<18} {} callers, {} min / {} p50 / {} max".format(
+                label,
+                lag["count"],
+                format_ns(lag.get("min")),
+                format_ns(lag.get("p50")),
+                format_ns(lag.get("max")),
+            )
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--duration", type=float, default=2.0)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    compare_examples(args)
+    measure_play_async(args)
+
+
+if __name__ == "__main__":
+    main()
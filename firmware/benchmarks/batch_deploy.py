@@ -0,0 +1,193 @@
+"""Runs factory/batch.py against fake modules to check its concurrency.
+
+Each fake module is a temporary directory standing in for its CIRCUITPY
+drive, with a boot_out.txt giving its unique ID, and a made-up serial port.
+Serial port discovery and the serial control that stops code.py and resets
+the module are replaced with stand-ins, which take --delay seconds to stop
+code.py like a real module does and record how many run at once. Of the
+--units modules, one has no serial port and one fails to stop code.py.
+
+This checks that:
+
+- modules are deployed to in parallel, up to --workers at once,
+- a failing module doesn't stop the others, and neither failed module is
+  written to,
+- a drive from older CircuitPython without a UID is paired with the only
+  port left over,
+- --dry-run doesn't touch a drive or a serial port.
+
+It prints the batch summary and exits with 1 if any check fails.
+
+    python benchmarks/batch_deploy.py --units 8 --workers 4
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import threading
+import time
+
+FIRMWARE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.join(FIRMWARE_DIR, "..", "factory"))
+
+import batch  # noqa: E402
+import deploy  # noqa: E402
+
+FAILING_PORT = "/dev/fake-failing"
+
+
+class FakeControl:
+    """Stands in for batch.SerialControl, see the module docstring."""
+
+    delay = 0.0
+    lock = threading.Lock()
+    active = 0
+    most_active = 0
+    calls = []
+
+    def __init__(self, port):
+        self.port = port
+
+    def force_into_repl(self):
+        cls = FakeControl
+        with cls.lock:
+            cls.calls.append((self.port, "repl"))
+            cls.active += 1
+            cls.most_active = max(cls.most_active, cls.active)
+        time.sleep(cls.delay)
+        with cls.lock:
+            cls.active -= 1
+        if self.port == FAILING_PORT:
+            raise RuntimeError("the module didn't answer")
+
+    def reset(self):
+        with FakeControl.lock:
+            FakeControl.calls.append((self.port, "reset"))
+
+
+def make_drive(parent, name, uid):
+    drive = os.path.join(parent, name)
+    os.makedirs(drive)
+    with open(os.path.join(drive, "boot_out.txt"), "w") as fh:
+        fh.write("Adafruit CircuitPython 6.1.0 on 2021-01-21\n")
+        if uid:
+            fh.write("UID:{}\n".format(uid))
+    return drive
+
+
+def make_sources(parent):
+    # A small library and code.py, enough for a deploy to write something.
+    package = os.path.join(parent, "winterbloom_bhb")
+    os.makedirs(package)
+    for name in ("__init__.py", "bhb.py", "cv.py"):
+        with open(os.path.join(package, name), "w") as fh:
+            fh.write("# {}\n".format(name) * 200)
+    code = os.path.join(parent, "code.py")
+    with open(code, "w") as fh:
+        fh.write("import winterbloom_bhb\n")
+    return {package: "lib", code: "code.py"}
+
+
+def written(drive):
+    return sorted(
+        os.path.relpath(os.path.join(directory, name), drive)
+        for directory, _, names in os.walk(drive)
+        for name in names
+        if name != "boot_out.txt"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--units", type=int, default=8)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--delay", type=float, default=0.2, help="Seconds.")
+    args = parser.parse_args()
+    if args.units < 3:
+        parser.error("--units has to be at least 3.")
+
+    work = tempfile.TemporaryDirectory()
+    files_to_deploy = make_sources(os.path.join(work.name, "src"))
+    failures = []
+
+    def check(ok, message):
+        if not ok:
+            failures.append(message)
+
+    drives = []
+    ports = {}
+    for index in range(args.units):
+        uid = "{:032X}".format(0xB40 + index)
+        drives.append(make_drive(work.name, "CIRCUITPY{}".format(index), uid))
+        if index == 0:
+            continue  # No serial port.
+        ports[uid] = FAILING_PORT if index == 1 else "/dev/fake{}".format(index)
+
+    batch.find_drives = lambda: list(drives)
+    batch.find_ports = lambda usb_device_id: dict(ports)
+    batch.SerialControl = FakeControl
+    FakeControl.delay = args.delay
+
+    # A dry run looks at every module without touching any of them.
+    with contextlib.redirect_stdout(io.StringIO()):
+        batch.batch("239A:6005", files_to_deploy, workers=args.workers, dry_run=True)
+    check(not FakeControl.calls, "the dry run used the serial ports")
+    check(not any(written(drive) for drive in drives), "the dry run wrote to a drive")
+
+    devices = batch.discover("239A:6005")
+    start = time.monotonic()
+    with contextlib.redirect_stdout(io.StringIO()):
+        batch.run(devices, files_to_deploy, workers=args.workers)
+    seconds = time.monotonic() - start
+    batch.print_summary(devices, seconds)
+    batch.write_report(devices, seconds, os.path.join(work.name, "report.json"))
+
+    expected = sorted(list(deploy.collect(files_to_deploy)) + [deploy.MANIFEST_NAME])
+    for index, device in enumerate(devices):
+        if index < 2:
+            check(device.status == "failed", "{} didn't fail".format(device.name))
+            check(not written(device.drive), "{} was written".format(device.name))
+        else:
+            check(device.status == "ok", "{} failed".format(device.name))
+            check(
+                written(device.drive) == expected,
+                "{} has {}".format(device.name, written(device.drive)),
+            )
+            check(
+                (device.port, "reset") in FakeControl.calls,
+                "{} wasn't reset".format(device.name),
+            )
+
+    # Every module with a port stops code.py, so the pool should have kept
+    # all of its workers busy, and no more.
+    workers = min(args.workers, args.units - 1)
+    serial = (args.units - 1) * args.delay
+    print(
+        "{} at once at most, {:.2f}s against {:.2f}s one at a time".format(
+            FakeControl.most_active, seconds, serial
+        )
+    )
+    check(
+        FakeControl.most_active == workers,
+        "ran {} at once".format(FakeControl.most_active),
+    )
+    check(seconds < serial * 0.75 or workers == 1, "the batch wasn't parallel")
+
+    # Without a UID in boot_out.txt the only port left over is paired up.
+    old = make_drive(work.name, "OLD", None)
+    batch.find_drives = lambda: [old]
+    batch.find_ports = lambda usb_device_id: {"SERIAL": "/dev/fake-old"}
+    devices = batch.discover("239A:6005")
+    check(devices[0].port == "/dev/fake-old", "the drive without a UID wasn't paired")
+
+    work.cleanup()
+    for failure in failures:
+        print("FAILED: " + failure)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""Measures how long each example takes to become ready for its first trigger.
+
+Every example is run twice: as written, and rewritten to use
+BigHonkingButton(lazy=True) with load_sample(..., deferred=True). For each
+this reports the time from power-on to the first update(), which is when the
+module starts watching its inputs, and the trigger -> play() latency of the
+first trigger, which is where lazily set up hardware and deferred samples
+are paid for. Use --phases to print where the time went during setup.
+
+    python benchmarks/boot.py --cpu-scale 20 --phases default
+"""
+
+import argparse
+import os
+import re
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from bhb_sim import Simulator, Timeline, Transitions, example_scripts  # noqa: E402
+from bhb_sim.stats import format_ns  # noqa: E402
+
+
+def make_lazy(source):
+    source = source.replace("BigHonkingButton(", "BigHonkingButton(lazy=True, ")
+    return re.sub(r"load_sample\(([^()]*)\)", r"load_sample(\1, deferred=True)", source)
+
+
+def first_trigger_latency(simulator, ready_ns):
+    # The first trigger after the loop started, and the play() that answered it.
+    edges = [t for t, _, state in simulator.timeline.edges() if state and t >= ready_ns]
+    if not edges:
+        return None
+    plays = [e.time_ns for e in simulator.audio_events if e.kind == "play"]
+    plays = [t for t in plays if t >= edges[0]]
+    return plays[0] - edges[0] if plays else None
+
+
+def run(script, lazy, args):
+    with open(script, "r") as fh:
+        source = fh.read()
+    if lazy:
+        source = make_lazy(source)
+
+    # A single trigger shortly after power-on.
+    timeline = Timeline(
+        duration=args.trigger_at + 0.2,
+        gate_in=Transitions([(args.trigger_at, True), (args.trigger_at + 0.01, False)]),
+        button=Transitions([(args.trigger_at, True), (args.trigger_at + 0.01, False)]),
+    )
+    simulator = Simulator(
+        timeline, cpu_scale=args.cpu_scale, flash_seek_ns=args.flash_seek_ns
+    )
+    report = simulator.run_source(source, script)
+    bhb = simulator.script_globals.get("bhb")
+    return {
+        "ready": report.boot,
+        "first": first_trigger_latency(simulator, report.boot or 0),
+        "phases": list(bhb.boot_phases) if bhb is not None else [],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("examples", nargs="*", help="Example names, default all.")
+    parser.add_argument("--cpu-scale", type=float, default=20.0)
+    parser.add_argument("--flash-seek-ns", type=int, default=500_000)
+    parser.add_argument("--trigger-at", type=float, default=0.5)
+    parser.add_argument("--phases", action="store_true")
+    args = parser.parse_args()
+
+    scripts = example_scripts()
+    if args.examples:
+        scripts = [
+            script
+            for script in scripts
+            if os.path.splitext(os.path.basename(script))[0] in args.examples
+        ]
+
+    print(
+        "{:<14} {:>12} {:>12} {:>12} {:>12}".format(
+            "example", "ready", "lazy ready", "1st trigger", "lazy 1st"
+        )
+    )
+    for script in scripts:
+        name = os.path.splitext(os.path.basename(script))[0]
+        eager = run(script, False, args)
+        lazy = run(script, True, args)
+        print(
+            "{:<14} {:>12} {:>12} {:>12} {:>12}".format(
+                name,
+                format_ns(eager["ready"]),
+                format_ns(lazy["ready"]),
+                format_ns(eager["first"]),
+                format_ns(lazy["first"]),
+            )
+        )
+        if args.phases:
+            for label, result in (("as written", eager), ("lazy", lazy)):
+                print("    {}:".format(label))
+                for phase, duration in result["phases"]:
+                    print("      {:<30} {:>10}".format(phase, format_ns(duration)))
+
+
+if __name__ == "__main__":
+    main()
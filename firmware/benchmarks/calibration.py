@@ -0,0 +1,183 @@
+"""Calibrates simulated modules with factory/calibrate.py and checks their pitch.
+
+Each simulated module's ADC has its own gain error of up to --gain-error,
+offset of up to --offset-error codes and a slight bow, with --noise volts of
+noise on every reading. The factory routine runs against all of them as it would against
+real modules, with the same code sent over the "REPL", so the readings come
+from the simulated ADC and the records end up in each module's simulated
+nvm. The last module has no nvm and gets calibration.bin on its drive
+instead.
+
+Each module then boots BigHonkingButton with and without its calibration
+and reads pitch_in at voltages across the range. This reports the worst
+pitch error in cents (1V/octave) of each, where the calibration came from,
+and whether the module skipped checking the revision pin. It exits with 1
+if any calibrated module is off by more than --max-cents, or if a drive's
+calibration.bin is picked up by a module it doesn't belong to.
+
+    python benchmarks/calibration.py --units 8 --noise 0.005
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import random
+import sys
+import tempfile
+
+FIRMWARE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, FIRMWARE_DIR)
+sys.path.insert(0, os.path.join(FIRMWARE_DIR, "..", "factory"))
+
+import batch  # noqa: E402
+import calibrate  # noqa: E402
+from bhb_sim import Simulator, Timeline  # noqa: E402
+
+CHECK_VOLTAGES = [v / 4 for v in range(-18, 19)]
+
+PITCH = """
+import winterbloom_bhb
+
+bhb = winterbloom_bhb.BigHonkingButton(calibration={calibration})
+phases = [name for name, _ in bhb.boot_phases]
+source = bhb.calibration_source
+readings = []
+for voltage in voltages:
+    reference[0] = voltage
+    readings.append(bhb.pitch_in)
+"""
+
+
+def unit_adc(rng, args):
+    """ADC code -> voltage points for a module with its own errors."""
+    gain = 1 + rng.uniform(-args.gain_error, args.gain_error)
+    offset = rng.uniform(-args.offset_error, args.offset_error)
+    bow = rng.uniform(-args.bow, args.bow)
+    points = {}
+    for step in range(-22, 23):
+        voltage = step / 4
+        # Nominally 2025 at 0V and 406 codes per volt, falling as it rises.
+        code = 2025 - 406.0 * voltage * gain + offset + bow * (1 - (voltage / 5) ** 2)
+        points[int(round(code))] = voltage
+    return points
+
+
+class SimulatedREPL:
+    """Runs code sent by calibrate.py on a simulated module."""
+
+    def __init__(self, simulator):
+        self.simulator = simulator
+
+    def run(self, code):
+        output = io.StringIO()
+        with self.simulator.installed(), contextlib.redirect_stdout(output):
+            exec(code, {"__name__": "__main__"})
+        return output.getvalue()
+
+
+def check_pitch(simulator, reference, calibration):
+    # Reads pitch_in at each of CHECK_VOLTAGES without any noise.
+    noise = simulator.timeline.cv_noise
+    simulator.timeline.cv_noise = 0.0
+    scope = {"voltages": CHECK_VOLTAGES, "reference": reference}
+    try:
+        with simulator.installed():
+            exec(PITCH.format(calibration=calibration), scope)
+    finally:
+        simulator.timeline.cv_noise = noise
+    worst = max(
+        abs(read - voltage) * 1200
+        for read, voltage in zip(scope["readings"], CHECK_VOLTAGES)
+    )
+    return worst, scope["source"], "revision" not in scope["phases"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--units", type=int, default=8)
+    parser.add_argument("--noise", type=float, default=0.005, help="Volts.")
+    parser.add_argument("--samples", type=int, default=64)
+    parser.add_argument("--gain-error", type=float, default=0.02)
+    parser.add_argument("--offset-error", type=float, default=30.0, help="Codes.")
+    parser.add_argument("--bow", type=float, default=6.0, help="Codes.")
+    parser.add_argument("--max-cents", type=float, default=5.0)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    drives = tempfile.TemporaryDirectory()
+    reference = [0.0]
+    units = []
+    simulators = []
+    for index in range(args.units):
+        uid = bytes(rng.getrandbits(8) for _ in range(16))
+        drive = os.path.join(drives.name, "CIRCUITPY{}".format(index))
+        os.makedirs(drive)
+        simulator = Simulator(
+            Timeline(duration=3600, cv=lambda t: reference[0], cv_noise=args.noise),
+            root=drive,
+            seed=index,
+            adc_calibration=unit_adc(rng, args),
+            nvm=b"" if index == args.units - 1 else None,
+            uid=uid,
+        )
+        device = batch.Device(drive, uid.hex().upper())
+        units.append(calibrate.Unit(device, SimulatedREPL(simulator)))
+        simulators.append(simulator)
+
+    def prompt(message):
+        # The operator turning the reference to the requested voltage.
+        reference[0] = float(message.split("to ")[1].split("V")[0])
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        calibrate.calibrate(
+            units,
+            prompt=prompt,
+            samples=args.samples,
+            workers=1,
+            records_dir=os.path.join(drives.name, "records"),
+        )
+
+    print(
+        "{:<34} {:>7} {:>8} {:>10} {:>6} {:>11}".format(
+            "unit", "status", "stored", "default", "cal", "no rev pin"
+        )
+    )
+    passed = True
+    for unit, simulator in zip(units, simulators):
+        default, _, _ = check_pitch(simulator, reference, False)
+        calibrated, source, skipped = check_pitch(simulator, reference, True)
+        passed = passed and unit.ok and calibrated <= args.max_cents
+        print(
+            "{:<34} {:>7} {:>8} {:>9.1f}c {:>5.1f}c {:>11}".format(
+                unit.name,
+                unit.status,
+                source,
+                default,
+                calibrated,
+                "yes" if skipped else "no",
+            )
+        )
+        if unit.error:
+            print("    " + unit.error)
+
+    # A drive copied onto another module brings its calibration.bin along.
+    owner, other = simulators[-1], simulators[0]
+    stranger = Simulator(
+        Timeline(duration=3600, cv=lambda t: reference[0]),
+        root=owner.root,
+        adc_calibration=other.adc_calibration,
+        nvm=b"",
+        uid=other.uid,
+    )
+    _, source, _ = check_pitch(stranger, reference, True)
+    print("Another module with a copy of that drive uses: {}".format(source))
+    passed = passed and source == "default"
+
+    drives.cleanup()
+    sys.exit(0 if passed else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Compares reading pitch_in directly with the buffered CVReader on noisy CV.
+
+The CV input slowly sweeps a little past both ends of its range, with noise
+added to every ADC reading, while the program picks one of eight items with
+select_from_list_using_cv(). Every change in selection beyond the ones made
+when reading the same sweep without noise is flicker. For each configuration
+this reports ADC reads per second, loops per second and how many times the
+selection changed.
+
+    python benchmarks/cv_reader.py --noise 0.02
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from bhb_sim import Simulator, Timeline  # noqa: E402
+
+PROGRAM = """
+import winterbloom_bhb
+
+bhb = winterbloom_bhb.BigHonkingButton(cv_samples={samples})
+if bhb.cv_reader is not None:
+    bhb.cv_reader.filter = {filter!r}
+    bhb.cv_reader.hysteresis = {hysteresis}
+
+items = list(range(8))
+selected = None
+changes = 0
+while bhb.update():
+    if bhb.cv_reader is not None and not bhb.cv_changed:
+        continue
+    item = bhb.select_from_list_using_cv(items, bhb.pitch_in)
+    if item != selected:
+        if selected is not None:
+            changes += 1
+        selected = item
+"""
+
+CONFIGS = [
+    ("pitch_in", 0, "mean", 0.0),
+    ("mean x4", 4, "mean", 0.0),
+    ("mean x4 +hyst", 4, "mean", 0.05),
+    ("median x5 +hyst", 5, "median", 0.05),
+    ("mean x16 +hyst", 16, "mean", 0.05),
+]
+
+
+def run(samples, filter, hysteresis, args, noise):
+    timeline = Timeline(
+        duration=args.duration,
+        cv=[(0.0, -5.5), (args.duration, 5.5)],
+        cv_noise=noise,
+    )
+    simulator = Simulator(timeline, cpu_scale=args.cpu_scale)
+    report = simulator.run_source(
+        PROGRAM.format(samples=samples, filter=filter, hysteresis=hysteresis)
+    )
+    return {
+        "reads": simulator.adc_reads / args.duration,
+        "loops": report.update_cost["count"] / args.duration,
+        "changes": simulator.script_globals["changes"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--duration", type=float, default=2.0)
+    parser.add_argument("--noise", type=float, default=0.02)
+    parser.add_argument("--cpu-scale", type=float, default=20.0)
+    args = parser.parse_args()
+
+    ideal = run(0, "mean", 0.0, args, noise=0.0)["changes"]
+    print("Without noise the selection changes {} times.".format(ideal))
+    print("{:<18} {:>10} {:>10} {:>8}".format("", "reads/s", "loops/s", "changes"))
+    for name, samples, filter, hysteresis in CONFIGS:
+        result = run(samples, filter, hysteresis, args, noise=args.noise)
+        print(
+            "{:<18} {:>10.0f} {:>10.0f} {:>8}".format(
+                name, result["reads"], result["loops"], result["changes"]
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""Compares select_from_list_using_cv() with a precomputed CVSelector.
+
+A list of items is selected from while the CV input slowly sweeps past both
+ends of its range with noise on every reading. For each approach this
+reports the time per selection (including reading the CV), how often the
+selection changed compared with the same sweep without noise, and for the
+selector how long building it took and how much memory its table uses. It
+also checks that a semitone-quantized selector picks the right note for
+every semitone in the range.
+
+    python benchmarks/cv_selector.py --items 32 --noise 0.02
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from bhb_sim import Simulator, Timeline  # noqa: E402
+from bhb_sim.stats import format_ns  # noqa: E402
+
+PROGRAM = """
+import time
+import winterbloom_bhb
+
+bhb = winterbloom_bhb.BigHonkingButton()
+items = list(range({items}))
+
+build_start = time.monotonic_ns()
+selector = bhb.cv_selector(items, hysteresis={hysteresis})
+build_time = time.monotonic_ns() - build_start
+
+selected = None
+changes = 0
+calls = 0
+spent = 0
+while bhb.update():
+    start = time.monotonic_ns()
+    if {use_selector}:
+        item = selector.select(bhb.pitch_in_raw)
+    else:
+        item = bhb.select_from_list_using_cv(items, bhb.pitch_in)
+    spent += time.monotonic_ns() - start
+    calls += 1
+    if item != selected:
+        if selected is not None:
+            changes += 1
+        selected = item
+"""
+
+CHECK_SCALE = """
+import winterbloom_bhb
+
+bhb = winterbloom_bhb.BigHonkingButton()
+notes = list(range(120))
+selector = bhb.cv_selector(notes, scale=range(12))
+"""
+
+
+def run(use_selector, args, noise, hysteresis):
+    timeline = Timeline(
+        duration=args.duration,
+        cv=[(0.0, -5.5), (args.duration, 5.5)],
+        cv_noise=noise,
+    )
+    simulator = Simulator(timeline, cpu_scale=args.cpu_scale)
+    simulator.run_source(
+        PROGRAM.format(
+            items=args.items, use_selector=use_selector, hysteresis=hysteresis
+        )
+    )
+    return simulator.script_globals
+
+
+def check_scale():
+    # Every semitone from -5V up should land on its own note.
+    simulator = Simulator(Timeline(duration=1.0))
+    simulator.run_source(CHECK_SCALE)
+    selector = simulator.script_globals["selector"]
+    wrong = 0
+    for note in range(121):
+        voltage = -5.0 + note / 12
+        code = simulator.voltage_to_adc(voltage)
+        selector.index = -1
+        if selector.index_for(code) != min(note, 119):
+            wrong += 1
+    return wrong
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=2.0)
+    parser.add_argument("--noise", type=float, default=0.02)
+    parser.add_argument("--hysteresis", type=float, default=0.05)
+    parser.add_argument("--cpu-scale", type=float, default=1.0)
+    args = parser.parse_args()
+
+    ideal = run(False, args, noise=0.0, hysteresis=0.0)["changes"]
+    print("Without noise the selection changes {} times.".format(ideal))
+    print(
+        "{:<26} {:>10} {:>8} {:>10} {:>8}".format(
+            "", "per call", "changes", "build", "bytes"
+        )
+    )
+    configs = [
+        ("select_from_list_using_cv", False, 0.0),
+        ("CVSelector", True, 0.0),
+        ("CVSelector +hysteresis", True, args.hysteresis),
+    ]
+    for name, use_selector, hysteresis in configs:
+        result = run(use_selector, args, args.noise, hysteresis)
+        selector = result["selector"]
+        print(
+            "{:<26} {:>10} {:>8} {:>10} {:>8}".format(
+                name,
+                format_ns(result["spent"] / max(1, result["calls"])),
+                result["changes"],
+                format_ns(result["build_time"]) if use_selector else "-",
+                selector.size_bytes if use_selector else "-",
+            )
+        )
+
+    print("Semitone selector notes off by one or more: {}".format(check_scale()))
+
+
+if __name__ == "__main__":
+    main()
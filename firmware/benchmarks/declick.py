@@ -0,0 +1,145 @@
+"""Measures what declicking costs at the trigger and how much it smooths out.
+
+Samples kept in a SampleBank are retriggered part way through. For each ramp
+length this reports the trigger -> play() latency, how much of it was added
+compared with plain retriggering, and the size of the jump in output level
+across each retrigger (as a fraction of full scale), which is what's heard
+as a click.
+
+The latency comes from a run on the host's clock scaled by --cpu-scale. The
+jumps are measured in the output rendered by bhb_sim.render from a second,
+deterministic run on a stepped clock, as the largest difference between
+frames across each retrigger, skipping the frames where AudioOut is stopped
+between the old sample and the new one. For reference, "slope" is the
+largest difference between neighbouring frames anywhere else in the output,
+which is how steep the samples themselves get.
+
+This needs NumPy for the rendering.
+
+    python benchmarks/declick.py --lengths 0 16 64 256 --cpu-scale 1
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from bhb_sim import Simulator, Timeline, Transitions  # noqa: E402
+from bhb_sim.render import render  # noqa: E402
+from bhb_sim.stats import format_ns, summarize  # noqa: E402
+
+# Frames either side of a retrigger that are looked at for its jump.
+WINDOW = 2
+
+SAMPLES = ["samples/kick.wav", "samples/snare.wav", "samples/honk.wav"]
+
+PROGRAM = """
+import winterbloom_bhb
+
+bhb = winterbloom_bhb.BigHonkingButton(declick={length})
+bank = winterbloom_bhb.SampleBank(budget=262144, declicker=bhb.declicker)
+paths = {paths!r}
+for path in paths:
+    bank.load(path)
+
+count = 0
+while bhb.update():
+    if bhb.triggered:
+        bhb.play(bank.get(paths[count % len(paths)]))
+        count += 1
+"""
+
+
+def _timeline(args):
+    return Timeline(
+        duration=0.2 + args.triggers * args.period,
+        gate_in=Transitions.pulses(
+            start=0.2, period=args.period, width=0.005, count=args.triggers
+        ),
+    )
+
+
+def _steps(simulator, rendering):
+    import numpy
+
+    audio = rendering.audio
+    rate = rendering.output_rate
+    jumps = numpy.abs(numpy.diff(audio))
+    around = numpy.zeros(len(jumps), dtype=bool)
+    steps = []
+    events = simulator.audio_events
+    # The first play starts from silence, so it isn't a retrigger.
+    for before, event in zip(events[1:], events[2:]):
+        if event.kind != "play" or before.kind != "stop":
+            continue
+        # The frames between stopping and playing again are silent in the
+        # rendering, whatever the DAC holds on the hardware, so the jump is
+        # from the last frame before the stop.
+        last = -(-before.time_ns * rate // 1_000_000_000) - 1
+        first = -(-event.audible_ns * rate // 1_000_000_000)
+        if last < 0 or first + WINDOW >= len(audio):
+            continue
+        head = audio[first : first + WINDOW + 1]
+        steps.append(
+            max(abs(head[0] - audio[last]), float(numpy.abs(numpy.diff(head)).max()))
+        )
+        around[max(0, last - WINDOW) : first + WINDOW] = True
+    slope = float(jumps[~around].max()) if not around.all() else 0.0
+    return steps, slope
+
+
+def run(length, args):
+    program = PROGRAM.format(length=length, paths=SAMPLES)
+    simulator = Simulator(_timeline(args), cpu_scale=args.cpu_scale)
+    report = simulator.run_source(program)
+
+    simulator = Simulator(
+        _timeline(args), clock_step_ns=int(args.step_us * 1000), capture_audio=True
+    )
+    simulator.run_source(program)
+    steps, slope = _steps(simulator, render(simulator, dac_bits=None))
+    return report.latency, summarize(steps), slope
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--lengths", type=int, nargs="+", default=[0, 16, 32, 64, 128, 256]
+    )
+    parser.add_argument("--triggers", type=int, default=60)
+    parser.add_argument("--period", type=float, default=0.037)
+    parser.add_argument("--cpu-scale", type=float, default=1.0)
+    parser.add_argument(
+        "--step-us",
+        type=float,
+        default=20.0,
+        help="How far the clock moves on each call in the rendered run.",
+    )
+    args = parser.parse_args()
+
+    print(
+        "{:>7} {:>10} {:>10} {:>10} {:>10} {:>10} {:>10}".format(
+            "length", "lat p50", "lat p99", "added", "step p50", "step max", "slope"
+        )
+    )
+    baseline = None
+    for length in args.lengths:
+        latency, steps, slope = run(length, args)
+        if baseline is None:
+            baseline = latency["p50"]
+        print(
+            "{:>7} {:>10} {:>10} {:>10} {:>10.4f} {:>10.4f} {:>10.4f}".format(
+                length,
+                format_ns(latency["p50"]),
+                format_ns(latency["p99"]),
+                format_ns(latency["p50"] - baseline),
+                steps["p50"],
+                steps["max"],
+                slope,
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
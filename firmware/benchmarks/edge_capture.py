@@ -0,0 +1,84 @@
+"""Compares polled and edge-captured gate inputs under short triggers.
+
+Sends 1ms triggers into gate in while the program's loop is kept busy for a
+configurable time per pass, then counts how many triggers the program saw
+and how far the captured edge timestamps are from the real edges.
+
+    python benchmarks/edge_capture.py --period 0.004 --load 0.003
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from bhb_sim import Simulator, Timeline, Transitions  # noqa: E402
+from bhb_sim.stats import summarize  # noqa: E402
+
+PROGRAM = """
+import time
+import winterbloom_bhb
+
+bhb = winterbloom_bhb.BigHonkingButton(edge_capture={edge_capture})
+sample = bhb.load_sample("samples/kick.wav")
+seen = []
+
+while bhb.update():
+    if bhb.gate_in.triggered:
+        seen.append(bhb.trigger_time)
+        bhb.play(sample)
+    time.sleep({load})
+"""
+
+
+def run(edge_capture, args):
+    timeline = Timeline(
+        duration=args.duration,
+        gate_in=Transitions.pulses(
+            start=0.1, period=args.period, width=args.width, until=args.duration
+        ),
+    )
+    simulator = Simulator(timeline, cpu_scale=args.cpu_scale)
+    simulator.run_source(PROGRAM.format(edge_capture=edge_capture, load=args.load))
+
+    last_update = simulator.update_times[-1]
+    sent = [t for t, state in timeline.inputs["gate_in"].edges() if state]
+    sent = [t for t in sent if t < last_update]
+    seen = simulator.script_globals["seen"]
+
+    errors = []
+    if edge_capture:
+        for t, timestamp in zip(sent, seen):
+            errors.append(timestamp - (t // 1_000_000))
+    return len(sent), len(seen), summarize(errors)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--duration", type=float, default=2.0)
+    parser.add_argument("--period", type=float, default=0.004)
+    parser.add_argument("--width", type=float, default=0.001)
+    parser.add_argument(
+        "--load", type=float, default=0.003, help="Seconds of work per loop."
+    )
+    parser.add_argument("--cpu-scale", type=float, default=1.0)
+    args = parser.parse_args()
+
+    print(
+        "{:.1f}ms triggers every {:.1f}ms, {:.1f}ms of work per loop".format(
+            args.width * 1000, args.period * 1000, args.load * 1000
+        )
+    )
+    for edge_capture in (False, True):
+        sent, seen, errors = run(edge_capture, args)
+        line = "{:<8} saw {:>5} of {:>5} triggers ({:.1f}%)".format(
+            "edges" if edge_capture else "polled", seen, sent, 100 * seen / sent
+        )
+        if errors["count"]:
+            line += ", timestamp error {}..{}ms".format(errors["min"], errors["max"])
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""Runs every example against the simulator and reports loop timing.
+
+For each program this reports the host cost of each update() call, the loop
+period and its jitter (p99 - p50), and trigger -> play() latency percentiles.
+Use --json to save the numbers so they can be compared between commits.
+
+    python benchmarks/examples_latency.py --duration 2 --json before.json
+"""
+
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from bhb_sim import Report, Simulator, Timeline, example_scripts  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("examples", nargs="*", help="Example names, default all.")
+    parser.add_argument("--duration", type=float, default=2.0)
+    parser.add_argument("--timeline", help="Timeline JSON file to use.")
+    parser.add_argument(
+        "--cpu-scale",
+        type=float,
+        default=1.0,
+        help="How many times slower than the host the simulated CPU is.",
+    )
+    parser.add_argument("--revision", type=int, default=5)
+    parser.add_argument("--json", help="Write the results to this file.")
+    args = parser.parse_args()
+
+    scripts = example_scripts()
+    if args.examples:
+        scripts = [
+            script
+            for script in scripts
+            if os.path.splitext(os.path.basename(script))[0] in args.examples
+        ]
+
+    if args.timeline:
+        timeline = Timeline.from_json(args.timeline)
+    else:
+        timeline = Timeline.default(args.duration)
+
+    reports = []
+    print(
+        "Simulating {:.1f}s per example at cpu scale {}".format(
+            timeline.duration, args.cpu_scale
+        )
+    )
+    print(Report.HEADER)
+    for script in scripts:
+        simulator = Simulator(
+            timeline, revision=args.revision, cpu_scale=args.cpu_scale
+        )
+        report = simulator.run(script)
+        reports.append(report)
+        print(report.row())
+
+    if args.json:
+        with open(args.json, "w") as fh:
+            json.dump([report.as_dict() for report in reports], fh, indent=2)
+
+
+if __name__ == "__main__":
+    main()
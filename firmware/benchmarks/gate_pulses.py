@@ -0,0 +1,145 @@
+"""Measures the width of gate output pulses under different amounts of loop load.
+
+The gate input is triggered every --period seconds and the program answers
+each trigger with a --widths millisecond pulse on the gate output, while
+spending --loads milliseconds of busy work on every pass through its loop.
+Three ways of making the pulse are compared:
+
+- "loop": set the output high, then low on the first pass through the loop
+  once the width has passed, which is what setting gate_out by hand does.
+- "sleep": set the output high, time.sleep() for the width, then set it low,
+  which holds up the loop for the whole pulse.
+- "pulse": bhb.pulse(width_ms), see winterbloom_bhb/pulses.py.
+
+Widths are measured from the simulator's log of gate output writes. Along
+with the error in width this reports the trigger -> pulse latency and the
+longest the loop went without calling update().
+
+Simulated time moves on by --step-us on every call into the hardware so
+that the numbers are the same from run to run.
+
+    python benchmarks/gate_pulses.py --widths 1 5 10 --loads 0 1 5
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from bhb_sim import Simulator, Timeline, Transitions  # noqa: E402
+from bhb_sim.stats import format_ns  # noqa: E402
+
+PROGRAM = """
+import time
+import winterbloom_bhb
+
+bhb = winterbloom_bhb.BigHonkingButton()
+width_ns = int({width} * 1000000)
+load_ns = int({load} * 1000000)
+off_at = None
+
+while bhb.update():
+    if bhb.triggered:
+        if {method!r} == "pulse":
+            bhb.pulse({width})
+        elif {method!r} == "sleep":
+            bhb.gate_out = True
+            time.sleep({width} / 1000)
+            bhb.gate_out = False
+        else:
+            bhb.gate_out = True
+            off_at = time.monotonic_ns() + width_ns
+    if off_at is not None and time.monotonic_ns() >= off_at:
+        bhb.gate_out = False
+        off_at = None
+
+    end = time.monotonic_ns() + load_ns
+    while time.monotonic_ns() < end:
+        pass
+"""
+
+METHODS = ("loop", "sleep", "pulse")
+
+
+def pulses(events):
+    """(start, end) of every high period in the log of gate output writes."""
+    found = []
+    start = None
+    for t, value in events:
+        if value and start is None:
+            start = t
+        elif not value and start is not None:
+            found.append((start, t))
+            start = None
+    return found
+
+
+def run(method, width, load, args):
+    transitions = Transitions.pulses(
+        start=0.05,
+        period=args.period,
+        width=args.period / 2,
+        until=args.duration - 0.05,
+    )
+    simulator = Simulator(
+        Timeline(duration=args.duration, gate_in=transitions),
+        clock_step_ns=int(args.step_us * 1000),
+    )
+    simulator.run_source(PROGRAM.format(method=method, width=width, load=load))
+
+    width_ns = width * 1_000_000
+    found = pulses(simulator.gate_out_events)
+    errors = [end - start - width_ns for start, end in found]
+    triggers = [t for t, state in transitions.edges() if state]
+    latencies = []
+    for trigger in triggers:
+        starts = [start for start, _ in found if start >= trigger]
+        if starts:
+            latencies.append(starts[0] - trigger)
+    times = simulator.update_times
+    gap = max((b - a for a, b in zip(times, times[1:])), default=None)
+    return len(triggers), errors, latencies, gap
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--widths", type=float, nargs="+", default=[1, 5, 10])
+    parser.add_argument("--loads", type=float, nargs="+", default=[0, 1, 5])
+    parser.add_argument("--period", type=float, default=0.1)
+    parser.add_argument("--duration", type=float, default=2.0)
+    parser.add_argument("--step-us", type=float, default=25.0)
+    args = parser.parse_args()
+
+    print(
+        "{:>6} {:>6} {:<6} {:>7} {:>10} {:>10} {:>10} {:>10}".format(
+            "width",
+            "load",
+            "method",
+            "pulses",
+            "err mean",
+            "err max",
+            "lat max",
+            "max gap",
+        )
+    )
+    for width in args.widths:
+        for load in args.loads:
+            for method in METHODS:
+                triggers, errors, latencies, gap = run(method, width, load, args)
+                print(
+                    "{:>6} {:>6} {:<6} {:>7} {:>10} {:>10} {:>10} {:>10}".format(
+                        "{:g}ms".format(width),
+                        "{:g}ms".format(load),
+                        method,
+                        "{}/{}".format(len(errors), triggers),
+                        format_ns(sum(errors) / len(errors) if errors else None),
+                        format_ns(max(errors, key=abs) if errors else None),
+                        format_ns(max(latencies) if latencies else None),
+                        format_ns(gap),
+                    )
+                )
+
+
+if __name__ == "__main__":
+    main()
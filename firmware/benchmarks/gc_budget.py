@@ -0,0 +1,121 @@
+"""Compares CircuitPython's automatic garbage collection with gc_idle_ms.
+
+Two loads are tried. With "steady" the simulated heap fills at --alloc
+bytes per second whatever the program is doing. With "per trigger" every
+play() allocates --alloc-per-trigger bytes instead, like a program that
+builds a buffer or opens a file for each trigger, so the heap fills up
+right as a trigger is handled. With automatic collection, a collection
+happens whenever the heap is full. With BigHonkingButton(gc_idle_ms=...),
+collections wait until no trigger has arrived and nothing has played for
+that long. For each this reports how many collections there were, how many
+were on a trigger's path (running when it arrived, or set off between it
+and its play()), the trigger -> play() latency and how often the sample
+being played from the drive ran dry.
+
+    python benchmarks/gc_budget.py --alloc 40000 --alloc-per-trigger 4096
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from bhb_sim import Simulator, Timeline, Transitions  # noqa: E402
+from bhb_sim.stats import format_ns  # noqa: E402
+
+PROGRAM = """
+import winterbloom_bhb
+
+bhb = winterbloom_bhb.BigHonkingButton(gc_idle_ms={idle_ms})
+sample = bhb.load_sample("samples/clap.wav")
+
+while bhb.update():
+    if bhb.triggered:
+        bhb.play(sample)
+"""
+
+
+def run(idle_ms, alloc, alloc_per_trigger, args):
+    # Uneven gaps between triggers so that collections can't fall into step
+    # with them.
+    gaps = [0.31, 0.47, 0.29, 0.53, 0.37]
+    times = []
+    t = 0.1
+    while t < args.duration:
+        times.append(t)
+        t += gaps[len(times) % len(gaps)]
+    # Pulses outlast a collection, so that a play() held up by one still
+    # counts towards the trigger's latency rather than its falling edge's.
+    width = max(0.005, 2 * args.gc_ms / 1000)
+    transitions = []
+    for t in times:
+        transitions += [(t, True), (t + width, False)]
+
+    simulator = Simulator(
+        Timeline(duration=args.duration, gate_in=Transitions(transitions)),
+        gc_collect_ns=int(args.gc_ms * 1_000_000),
+        alloc_bytes_per_s=alloc,
+        alloc_bytes_per_play=alloc_per_trigger,
+    )
+    report = simulator.run_source(PROGRAM.format(idle_ms=idle_ms))
+
+    # Each trigger's path runs from its edge to the play() it leads to.
+    plays = [event.time_ns for event in simulator.audio_events if event.kind == "play"]
+    paths = []
+    for t in times:
+        edge = int(t * 1_000_000_000)
+        play = next((p for p in plays if p >= edge), edge)
+        paths.append((edge, play))
+    collect_ns = simulator.gc_collect_ns
+    on_trigger = sum(
+        1
+        for start in simulator.gc_collections
+        if any(start <= play and start + collect_ns > edge for edge, play in paths)
+    )
+    return len(simulator.gc_collections), on_trigger, report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--alloc", type=int, default=40000)
+    parser.add_argument("--alloc-per-trigger", type=int, default=4096)
+    parser.add_argument("--gc-ms", type=float, default=6.0)
+    parser.add_argument("--idle-ms", type=int, default=20)
+    args = parser.parse_args()
+
+    print(
+        "{:<12} {:<12} {:>11} {:>10} {:>10} {:>10} {:>10} {:>9}".format(
+            "load",
+            "",
+            "collections",
+            "on trigger",
+            "lat p50",
+            "lat p99",
+            "lat max",
+            "underruns",
+        )
+    )
+    loads = (("steady", args.alloc, 0), ("per trigger", 0, args.alloc_per_trigger))
+    for load, alloc, alloc_per_trigger in loads:
+        for name, idle_ms in (("automatic", 0), ("gc_idle_ms", args.idle_ms)):
+            collections, on_trigger, report = run(
+                idle_ms, alloc, alloc_per_trigger, args
+            )
+            print(
+                "{:<12} {:<12} {:>11} {:>10} {:>10} {:>10} {:>10} {:>9}".format(
+                    load,
+                    name,
+                    collections,
+                    on_trigger,
+                    format_ns(report.latency.get("p50")),
+                    format_ns(report.latency.get("p99")),
+                    format_ns(report.latency.get("max")),
+                    report.underruns,
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
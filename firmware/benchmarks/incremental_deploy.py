@@ -0,0 +1,150 @@
+"""Deploys to a temporary directory standing in for a CIRCUITPY drive.
+
+The library, samples and examples are copied to a temporary source tree and
+deployed from there with factory/deploy.py, the way factory_setup.py lays
+them out, into another temporary directory for the drive. This checks that:
+
+- the first deploy copies every file, writes code.py after the library and
+  leaves a manifest that matches,
+- deploying again without changes copies nothing,
+- a file dropped from the deploy is removed from the drive, with and
+  without --full, while files the deploy never wrote are left alone.
+
+It prints what each deploy copied and exits with 1 if any check fails.
+
+    python benchmarks/incremental_deploy.py
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+
+FIRMWARE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+ROOT_DIR = os.path.join(FIRMWARE_DIR, "..")
+sys.path.insert(0, os.path.join(ROOT_DIR, "factory"))
+
+import deploy  # noqa: E402
+
+
+def make_sources(directory):
+    # A copy of what factory_setup.py deploys, so files can be dropped.
+    shutil.copytree(
+        os.path.join(FIRMWARE_DIR, "winterbloom_bhb"),
+        os.path.join(directory, "winterbloom_bhb"),
+        ignore=shutil.ignore_patterns("__pycache__"),
+    )
+    shutil.copytree(
+        os.path.join(ROOT_DIR, "samples"), os.path.join(directory, "samples")
+    )
+    shutil.copytree(
+        os.path.join(ROOT_DIR, "examples"), os.path.join(directory, "examples")
+    )
+    shutil.copy(os.path.join(FIRMWARE_DIR, "LICENSE"), directory)
+    return {
+        os.path.join(directory, "winterbloom_bhb"): "lib",
+        os.path.join(directory, "samples"): ".",
+        os.path.join(directory, "examples"): ".",
+        os.path.join(directory, "LICENSE"): ".",
+        os.path.join(directory, "examples", "default.py"): "code.py",
+    }
+
+
+def run_deploy(files_to_deploy, drive, full=False):
+    # Records the order files are written in along with the plan.
+    written = []
+    copyfile = shutil.copyfile
+
+    def recording_copyfile(source, target):
+        written.append(os.path.relpath(target, drive))
+        return copyfile(source, target)
+
+    shutil.copyfile = recording_copyfile
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            plan = deploy.deploy(files_to_deploy, drive, full=full)
+    finally:
+        shutil.copyfile = copyfile
+    print(
+        "{:<22} copied {:>3} files {:>8} bytes, {:>3} unchanged, {} removed".format(
+            "full" if full else "incremental",
+            len(plan.copy),
+            plan.size(plan.copy),
+            len(plan.unchanged),
+            len(plan.remove),
+        )
+    )
+    return plan, written
+
+
+def main():
+    argparse.ArgumentParser(description=__doc__.splitlines()[0]).parse_args()
+
+    work = tempfile.TemporaryDirectory()
+    sources = os.path.join(work.name, "src")
+    drive = os.path.join(work.name, "CIRCUITPY")
+    os.makedirs(sources)
+    os.makedirs(drive)
+    files_to_deploy = make_sources(sources)
+    failures = []
+
+    def check(ok, message):
+        if not ok:
+            failures.append(message)
+
+    # The first deploy copies everything.
+    plan, written = run_deploy(files_to_deploy, drive)
+    everything = deploy.collect(files_to_deploy)
+    check(sorted(plan.copy) == sorted(everything), "first deploy missed files")
+    library = [i for i, path in enumerate(written) if path.startswith("lib")]
+    check(
+        written and written[-1] == "code.py" and max(library) < len(written) - 1,
+        "code.py wasn't written after the library",
+    )
+    manifest = deploy.read_manifest(drive)
+    check(
+        sorted(manifest) == sorted(everything)
+        and all(
+            manifest[path]["sha256"] == deploy.file_hash(os.path.join(drive, path))
+            for path in manifest
+        ),
+        "the manifest doesn't match the drive",
+    )
+
+    # Deploying the same files again doesn't copy anything.
+    plan, written = run_deploy(files_to_deploy, drive)
+    check(not written, "an unchanged deploy copied {}".format(written))
+    check(not plan.remove, "an unchanged deploy removed {}".format(plan.remove))
+
+    # A file of the user's own, which no deploy wrote, is kept.
+    with open(os.path.join(drive, "mine.wav"), "wb") as fh:
+        fh.write(b"RIFF")
+
+    for full in (False, True):
+        dropped = os.path.join("samples", "clap.wav" if full else "kick.wav")
+        os.remove(os.path.join(sources, dropped))
+        plan, written = run_deploy(files_to_deploy, drive, full=full)
+        check(plan.remove == [dropped], "{} wasn't removed".format(dropped))
+        check(
+            not os.path.exists(os.path.join(drive, dropped)),
+            "{} is still on the drive".format(dropped),
+        )
+        check(dropped not in deploy.read_manifest(drive), "manifest kept the file")
+        if full:
+            check(len(written) == len(plan.files), "--full didn't copy everything")
+        else:
+            check(not written, "removing a file copied {}".format(written))
+
+    check(os.path.exists(os.path.join(drive, "mine.wav")), "mine.wav was removed")
+
+    work.cleanup()
+    for failure in failures:
+        print("FAILED: " + failure)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
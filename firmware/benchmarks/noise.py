@@ -0,0 +1,201 @@
+"""Times the noise generators and checks the spectrum of what they make.
+
+Speed is compared against the loop examples/noise.py used to have, which
+calls random.random() for every sample. The times are the host's, so only
+the ratios mean anything. Filling is timed once the generator has made its
+table, and "table" is how long making the table took, as a multiple of how
+long the old loop takes to make the same number of samples.
+
+For each colour this generates --seconds of noise at 44.1kHz, averages the
+spectra of 1024-sample windows and fits a line through the power in octave
+bands from 86Hz to 11kHz. White noise should come out flat, pink at -3dB
+per octave and brown at -6dB. It also reports the DC offset, the peak level,
+how many samples were clipped and how alike the first --length samples are
+to the same number a second later, which is 1.0 for a buffer that's played
+again and about 0 for fresh noise.
+
+    python benchmarks/noise.py --seconds 2
+"""
+
+import argparse
+import array
+import cmath
+import math
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from bhb_sim import Simulator, Timeline  # noqa: E402
+
+RATE = 44100
+WINDOW = 1024
+
+
+def random_loop(length, volume=0.8):
+    # The loop from the old examples/noise.py.
+    volume = volume * (2**15 - 1)
+    samples = array.array("H", [0] * length)
+    for i in range(length):
+        samples[i] = int(random.random() * volume)
+    return samples
+
+
+def fft(values):
+    # Iterative radix-2 FFT, len(values) must be a power of two.
+    n = len(values)
+    out = [complex(v) for v in values]
+    j = 0
+    for i in range(1, n):
+        bit = n >> 1
+        while j & bit:
+            j ^= bit
+            bit >>= 1
+        j |= bit
+        if i < j:
+            out[i], out[j] = out[j], out[i]
+    size = 2
+    while size <= n:
+        step = cmath.exp(-2j * math.pi / size)
+        for start in range(0, n, size):
+            w = 1
+            for k in range(size // 2):
+                a = out[start + k]
+                b = out[start + k + size // 2] * w
+                out[start + k] = a + b
+                out[start + k + size // 2] = a - b
+                w *= step
+        size *= 2
+    return out
+
+
+def spectrum(values):
+    """Average power in each FFT bin over Hann-windowed segments."""
+    window = [0.5 - 0.5 * math.cos(2 * math.pi * i / WINDOW) for i in range(WINDOW)]
+    power = [0.0] * (WINDOW // 2)
+    count = 0
+    for start in range(0, len(values) - WINDOW + 1, WINDOW):
+        segment = values[start : start + WINDOW]
+        mean = sum(segment) / WINDOW
+        bins = fft([(v - mean) * w for v, w in zip(segment, window)])
+        for k in range(WINDOW // 2):
+            power[k] += abs(bins[k]) ** 2
+        count += 1
+    return [p / count for p in power]
+
+
+def slope_db_per_octave(power):
+    # The mean power per bin in each octave band from 86Hz up, which keeps
+    # white noise flat even though each band is twice as wide as the last,
+    # then a least-squares line through dB against octave.
+    points = []
+    low = 2
+    while low * 2 <= WINDOW // 2:
+        band = power[low : low * 2]
+        points.append((math.log2(low), 10 * math.log10(sum(band) / len(band))))
+        low *= 2
+    n = len(points)
+    mean_x = sum(x for x, _ in points) / n
+    mean_y = sum(y for _, y in points) / n
+    num = sum((x - mean_x) * (y - mean_y) for x, y in points)
+    den = sum((x - mean_x) ** 2 for x, _ in points)
+    return num / den
+
+
+def correlation(a, b):
+    n = min(len(a), len(b))
+    mean_a = sum(a[:n]) / n
+    mean_b = sum(b[:n]) / n
+    num = sum((a[i] - mean_a) * (b[i] - mean_b) for i in range(n))
+    den = math.sqrt(
+        sum((a[i] - mean_a) ** 2 for i in range(n))
+        * sum((b[i] - mean_b) ** 2 for i in range(n))
+    )
+    return num / den if den else 0.0
+
+
+def rate(generate, length, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        generate()
+    return length * repeat / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--seconds", type=float, default=2.0, help="At least 1.1, for the 1s corr."
+    )
+    parser.add_argument("--length", type=int, default=2048)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    simulator = Simulator(Timeline(duration=1))
+    with simulator.installed():
+        from winterbloom_bhb import wav
+        from winterbloom_bhb.noise import COLORS, NoiseGenerator
+
+        info = wav.WavInfo()
+        baseline = rate(lambda: random_loop(args.length), args.length, args.repeat)
+        print("Samples generated per second on this host:")
+        print(
+            "{:<22} {:>12} {:>8} {:>8}".format(
+                "random.random() loop", int(baseline), "1.0x", "table"
+            )
+        )
+        for bits in (16, 8):
+            info.bits_per_sample = bits
+            buffer = wav.empty_buffer(info, frame_count=args.length)
+            for color in COLORS:
+                generator = NoiseGenerator(color, bits=bits)
+                start = time.perf_counter()
+                generator.fill(buffer, 0, 1)
+                table = time.perf_counter() - start
+                table *= baseline / generator.table_size
+                speed = rate(lambda: generator.fill(buffer), args.length, args.repeat)
+                print(
+                    "{:<22} {:>12} {:>7.1f}x {:>7.1f}x".format(
+                        "{} {}-bit".format(color, bits),
+                        int(speed),
+                        speed / baseline,
+                        table,
+                    )
+                )
+
+        print()
+        print(
+            "{:<8} {:>10} {:>8} {:>8} {:>9} {:>12}".format(
+                "colour", "dB/octave", "DC", "peak", "clipped", "1s corr"
+            )
+        )
+        info.bits_per_sample = 16
+        count = int(args.seconds * RATE)
+        for color in COLORS:
+            generator = NoiseGenerator(color, level=0.8, bits=16)
+            values = wav.empty_buffer(info, frame_count=count)
+            generator.fill(values)
+            values = list(values)
+            first = values[: args.length]
+            second = values[RATE : RATE + args.length]
+            clipped = sum(1 for v in values if v in (-32768, 32767))
+            peak = max(abs(v) for v in values) / 32768
+            print(
+                "{:<8} {:>+10.2f} {:>8.0f} {:>7.0%} {:>8.3%} {:>12.3f}".format(
+                    color,
+                    slope_db_per_octave(spectrum(values)),
+                    sum(values) / len(values),
+                    peak,
+                    clipped / len(values),
+                    correlation(first, second),
+                )
+            )
+        looped = list(random_loop(args.length))
+        print("{:<8} {:>51.3f}".format("looped", correlation(looped, looped)))
+
+
+if __name__ == "__main__":
+    main()
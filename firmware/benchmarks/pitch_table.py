@@ -0,0 +1,98 @@
+"""Compares the pitch CV float path with the precomputed pitch table.
+
+Times pitch_in + pow() against pitch_in_raw + PitchTable.sample_rate() for
+every ADC code, reports the worst pitch error of the table in cents and
+checks that both paths respect the 350kHz sample rate limit.
+
+    python benchmarks/pitch_table.py --revision 4
+"""
+
+import argparse
+import math
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from bhb_sim import Simulator, Timeline  # noqa: E402
+from bhb_sim.stats import format_ns  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--revision", type=int, default=5)
+    parser.add_argument("--base-sample-rate", type=int, default=44100)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    simulator = Simulator(Timeline(duration=1), revision=args.revision)
+    with simulator.installed():
+        import winterbloom_bhb
+        from winterbloom_bhb.pitch import MAX_SAMPLE_RATE
+
+        bhb = winterbloom_bhb.BigHonkingButton()
+        bhb.base_sample_rate = args.base_sample_rate
+        base = bhb.base_sample_rate
+        codes = range(4096)
+
+        build_start = time.perf_counter_ns()
+        table = bhb.pitch_table
+        build_time = time.perf_counter_ns() - build_start
+
+        # Point VoltageIn at a fake ADC so each code can be converted directly.
+        class _Probe:
+            value = 0
+
+        probe = _Probe()
+        voltage_in = bhb._pitch_in
+        voltage_in._analog_in = probe
+
+        def float_path(code):
+            probe.value = code
+            return min(int(base * pow(2, voltage_in.voltage)), MAX_SAMPLE_RATE)
+
+        float_best = table_best = None
+        for _ in range(args.repeat):
+            start = time.perf_counter_ns()
+            expected = [float_path(code) for code in codes]
+            elapsed = time.perf_counter_ns() - start
+            float_best = elapsed if float_best is None else min(float_best, elapsed)
+
+            start = time.perf_counter_ns()
+            actual = [table.sample_rate(code) for code in codes]
+            elapsed = time.perf_counter_ns() - start
+            table_best = elapsed if table_best is None else min(table_best, elapsed)
+
+    worst_cents = 0
+    clamped = table_clamped = 0
+    for code in codes:
+        if actual[code] > MAX_SAMPLE_RATE:
+            raise AssertionError("Code {} gave {}Hz".format(code, actual[code]))
+        if expected[code] == MAX_SAMPLE_RATE:
+            clamped += 1
+            table_clamped += actual[code] == MAX_SAMPLE_RATE
+        cents = abs(1200 * math.log2(actual[code] / expected[code]))
+        worst_cents = max(worst_cents, cents)
+
+    print("revision {}, base sample rate {}Hz".format(args.revision, base))
+    print(
+        "table: {} entries, {} bytes, built in {}".format(
+            len(table._table), table.size_bytes, format_ns(build_time)
+        )
+    )
+    print("float path: {} per conversion".format(format_ns(float_best / len(codes))))
+    print(
+        "table path: {} per conversion ({:.1f}x faster)".format(
+            format_ns(table_best / len(codes)), float_best / table_best
+        )
+    )
+    print("worst error: {:.3f} cents".format(worst_cents))
+    print(
+        "{} codes clamp to {}Hz on the float path, {} exactly on the table path, "
+        "none exceed it".format(clamped, MAX_SAMPLE_RATE, table_clamped)
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""Profiles the examples in the simulator and compares against a saved profile.
+
+Every example runs with BigHonkingButton's profiler turned on (see
+winterbloom_bhb/profiler.py), which counts and times update(), play(),
+stop(), pitch_in, the loop period and the time spent in user code. Save the
+results from one commit with --json and compare another against them with
+--compare. Comparisons use the mean, since the percentiles are only
+accurate to a power of two, and exit with an error if any mean grew by more
+than --threshold. Times come from the host, so only compare profiles taken
+on the same machine. Each example is run --runs times and the fastest mean
+of each timing is used, which takes out most of the host's noise.
+
+    python benchmarks/profile.py --json base.json
+    python benchmarks/profile.py --compare base.json --threshold 0.25
+"""
+
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from bhb_sim import Simulator, Timeline, example_scripts  # noqa: E402
+from bhb_sim.stats import format_ns  # noqa: E402
+
+NAMES = ("update", "play", "stop", "pitch_in", "loop", "user")
+
+
+def mean_ns(stats):
+    if not stats["count"]:
+        return None
+    return stats["total_us"] * 1000 / stats["count"]
+
+
+def best_mean_ns(runs, key):
+    means = [mean_ns(run[key]) for run in runs]
+    means = [mean for mean in means if mean is not None]
+    return min(means) if means else None
+
+
+def print_profile(name, profile):
+    print(name)
+    for key in NAMES:
+        stats = profile[key]
+        if not stats["count"]:
+            continue
+        print(
+            "    {:<10} {:>8} calls  mean {:>9}  p50 <{:>9}  p99 <{:>9}  max {:>9}".format(
+                key,
+                stats["count"],
+                format_ns(mean_ns(stats)),
+                format_ns(stats["p50_ns"]),
+                format_ns(stats["p99_ns"]),
+                format_ns(stats["max_ns"]),
+            )
+        )
+
+
+def compare(profiles, baseline, threshold):
+    """Prints how each mean changed and returns the ones that got worse."""
+    regressions = []
+    print("{:<14} {:<10} {:>10} {:>10} {:>8}".format("", "", "base", "now", "change"))
+    for name, runs in sorted(profiles.items()):
+        if name not in baseline:
+            continue
+        for key in NAMES:
+            before = best_mean_ns(baseline[name], key)
+            after = best_mean_ns(runs, key)
+            if before is None or after is None:
+                continue
+            change = after / before - 1 if before else 0.0
+            flag = ""
+            if change > threshold:
+                flag = "  <-- slower"
+                regressions.append((name, key, change))
+            print(
+                "{:<14} {:<10} {:>10} {:>10} {:>+7.0%}{}".format(
+                    name, key, format_ns(before), format_ns(after), change, flag
+                )
+            )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("examples", nargs="*", help="Example names, default all.")
+    parser.add_argument("--duration", type=float, default=2.0)
+    parser.add_argument("--cpu-scale", type=float, default=1.0)
+    parser.add_argument("--json", help="Write the profiles to this file.")
+    parser.add_argument("--compare", help="Compare against profiles in this file.")
+    parser.add_argument("--threshold", type=float, default=0.25)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    scripts = example_scripts()
+    if args.examples:
+        scripts = [
+            script
+            for script in scripts
+            if os.path.splitext(os.path.basename(script))[0] in args.examples
+        ]
+
+    profiles = {}
+    for script in scripts:
+        for _ in range(args.runs):
+            simulator = Simulator(
+                Timeline.default(args.duration), cpu_scale=args.cpu_scale, profile=True
+            )
+            report = simulator.run(script)
+            if report.profile is not None:
+                profiles.setdefault(report.name, []).append(report.profile)
+        if report.name in profiles and not args.compare:
+            print_profile(report.name, profiles[report.name][0])
+
+    if args.json:
+        with open(args.json, "w") as fh:
+            json.dump(profiles, fh, indent=2)
+
+    if args.compare:
+        with open(args.compare, "r") as fh:
+            baseline = json.load(fh)
+        regressions = compare(profiles, baseline, args.threshold)
+        if regressions:
+            print(
+                "{} timings got slower by more than {:.0%}".format(
+                    len(regressions), args.threshold
+                )
+            )
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""Compares streamed samples with samples preloaded into a SampleBank.
+
+Each sample is triggered several times in a row. For both load_sample() and
+SampleBank this reports how long loading took, how much RAM the bank used
+and the trigger -> audible latency of the first and the repeated triggers,
+using the simulator's model of flash reads for streamed samples.
+
+By default the bank's budget fits every sample, so that its row compares
+keeping samples in RAM with streaming all of them. With --budget a bank of
+that size is reported separately, with the samples that didn't fit streamed.
+
+    python benchmarks/sample_bank.py --budget 32768
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from bhb_sim import Simulator, Timeline, Transitions  # noqa: E402
+from bhb_sim.simulator import ROOT_DIR  # noqa: E402
+from bhb_sim.stats import format_ns, summarize  # noqa: E402
+
+SAMPLES = [
+    "samples/honk_p2.wav",
+    "samples/honk.wav",
+    "samples/kick.wav",
+    "samples/clap.wav",
+]
+
+PROGRAM = """
+import time
+import winterbloom_bhb
+
+bhb = winterbloom_bhb.BigHonkingButton()
+paths = {paths!r}
+
+load_start = time.monotonic_ns()
+if {use_bank}:
+    bank = winterbloom_bhb.SampleBank(budget={budget})
+    for path in paths:
+        bank.load(path)
+    get = bank.get
+else:
+    bank = None
+    loaded = dict((path, bhb.load_sample(path)) for path in paths)
+    get = loaded.get
+load_time = time.monotonic_ns() - load_start
+
+count = 0
+while bhb.update():
+    if bhb.triggered:
+        bhb.play(get(paths[(count // {repeats}) % len(paths)]))
+        count += 1
+"""
+
+
+def run(use_bank, budget, args):
+    triggers = len(SAMPLES) * args.repeats
+    timeline = Timeline(
+        duration=0.2 + triggers * args.period,
+        gate_in=Transitions.pulses(
+            start=0.2, period=args.period, width=0.005, count=triggers
+        ),
+    )
+    simulator = Simulator(timeline, flash_bytes_per_s=args.flash_bytes_per_s)
+    simulator.run_source(
+        PROGRAM.format(
+            paths=SAMPLES, use_bank=use_bank, budget=budget, repeats=args.repeats
+        )
+    )
+
+    edges = [t for t, state in timeline.inputs["gate_in"].edges() if state]
+    plays = [event for event in simulator.audio_events if event.kind == "play"]
+    first, repeat = [], []
+    for index, (edge, play) in enumerate(zip(edges, plays)):
+        latency = play.audible_ns - edge
+        (first if index % args.repeats == 0 else repeat).append(latency)
+
+    script_globals = simulator.script_globals
+    bank = script_globals["bank"]
+    return {
+        "load": script_globals["load_time"],
+        "first": summarize(first),
+        "repeat": summarize(repeat),
+        "report": bank.report() if bank else None,
+        "used": bank.used if bank else 0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--budget", type=int, help="Also report a bank with this many bytes."
+    )
+    parser.add_argument("--repeats", type=int, default=4)
+    parser.add_argument("--period", type=float, default=0.05)
+    parser.add_argument("--flash-bytes-per-s", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    print(
+        "{:<17} {:>10} {:>12} {:>12} {:>10}".format(
+            "", "load", "first p50", "repeat p50", "RAM"
+        )
+    )
+    # The whole files are a little more than their audio, so this fits them.
+    fits = sum(os.path.getsize(os.path.join(ROOT_DIR, path)) for path in SAMPLES)
+    cases = [("load_sample", False, 0), ("SampleBank", True, fits)]
+    if args.budget is not None:
+        cases.append(("SampleBank {}".format(args.budget), True, args.budget))
+
+    for name, use_bank, budget in cases:
+        result = run(use_bank, budget, args)
+        print(
+            "{:<17} {:>10} {:>12} {:>12} {:>10}".format(
+                name,
+                format_ns(result["load"]),
+                format_ns(result["first"]["p50"]),
+                format_ns(result["repeat"]["p50"]),
+                result["used"],
+            )
+        )
+        if result["report"]:
+            for path, size, kind in result["report"]:
+                print("    {:<24} {:>6} bytes {}".format(path, size, kind))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""Sweeps streaming buffer sizes against how long the main loop holds up refills.
+
+A long sample is played on a loop while the program calls gc.collect() on
+every pass through its loop, which in the simulator blocks background tasks
+for --load milliseconds each time. For each buffer size this counts how
+often the DAC ran out of data, for load_sample() with that buffer_size and
+for a ChunkedSample with the same number of bytes in its two chunks.
+
+    python benchmarks/stream_buffers.py --loads 0 2 5 10 20
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from bhb_sim import Simulator, Timeline  # noqa: E402
+
+PROGRAM = """
+import gc
+import winterbloom_bhb
+from winterbloom_bhb.chunked import ChunkedSample
+
+bhb = winterbloom_bhb.BigHonkingButton()
+if {chunked}:
+    sample = ChunkedSample({path!r}, chunk_frames={size} // 4)
+else:
+    sample = bhb.load_sample({path!r}, buffer_size={size})
+bhb.play(sample, loop=True)
+
+while bhb.update():
+    if {load}:
+        gc.collect()
+"""
+
+
+def run(chunked, size, load_ms, args):
+    simulator = Simulator(
+        Timeline(duration=args.duration),
+        gc_collect_ns=int(load_ms * 1_000_000),
+        flash_bytes_per_s=args.flash_bytes_per_s,
+    )
+    simulator.run_source(
+        PROGRAM.format(chunked=chunked, path=args.sample, size=size, load=load_ms > 0)
+    )
+    if chunked:
+        return simulator.script_globals["sample"].underruns
+    return len(simulator.underruns)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sample", default="samples/dist.wav")
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[512, 1024, 2048, 4096, 8192]
+    )
+    parser.add_argument("--loads", type=float, nargs="+", default=[0, 1, 2, 5, 10, 20])
+    parser.add_argument("--duration", type=float, default=2.0)
+    parser.add_argument("--flash-bytes-per-s", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    print("Underruns per second, by how long each loop holds up refills:")
+    header = "{:<14} {:>7}".format("reader", "bytes") + "".join(
+        "{:>8}".format("{:g}ms".format(load)) for load in args.loads
+    )
+    print(header)
+    for chunked in (False, True):
+        for size in args.sizes:
+            row = "{:<14} {:>7}".format(
+                "ChunkedSample" if chunked else "load_sample", size
+            )
+            for load in args.loads:
+                underruns = run(chunked, size, load, args)
+                row += "{:>8.1f}".format(underruns / args.duration)
+            print(row)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+"""Measures how closely the tempo follower's ticks track an external clock.
+
+A clock with --jitter milliseconds of random timing error on each pulse is
+fed into the gate input and the program sets the gate output on each tick.
+Each tick is matched against the ideal clock, without the jitter, and with
+--multiply against the ideal subdivisions of it. This reports the phase
+error of the ticks, how far they drift from the clock per minute and how
+many ticks were missed or extra. The first --settle beats of each scenario,
+and of each tempo change, are left out while the estimate settles.
+
+"last interval" is how examples/tap_tempo.py used to work: the interval is
+the time between the last two triggers and the sample plays once that much
+time has passed since it last played. "tempo" is BigHonkingButton(
+tempo_taps=...) with and without edge capture.
+
+Simulated time moves on by --step-us on every call into the hardware
+rather than following the host's clock, so that the results are the same
+from run to run and only change with --seed.
+
+    python benchmarks/tempo.py --jitter 2 --step-us 25
+"""
+
+import argparse
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from bhb_sim import Simulator, Timeline, Transitions  # noqa: E402
+from bhb_sim.stats import format_ns, percentile  # noqa: E402
+
+LAST_INTERVAL = """
+import time
+import winterbloom_bhb
+
+bhb = winterbloom_bhb.BigHonkingButton()
+interval = 0.5
+last_sample_played = time.monotonic()
+last_button_press = time.monotonic()
+
+while bhb.update():
+    now = time.monotonic()
+    if now > last_sample_played + interval:
+        last_sample_played = now
+        bhb.gate_out = True
+    else:
+        bhb.gate_out = False
+    if bhb.triggered:
+        interval = (now - last_button_press) / {multiply}
+        last_button_press = now
+"""
+
+TEMPO = """
+import winterbloom_bhb
+
+bhb = winterbloom_bhb.BigHonkingButton(
+    tempo_taps={taps}, edge_capture={edge_capture}
+)
+bhb.tempo.multiply = {multiply}
+
+while bhb.update():
+    bhb.gate_out = bhb.tempo.ticked
+"""
+
+# (name, [(start time, bpm), ...], multiply)
+SCENARIOS = (
+    ("steady 120", [(0.0, 120)], 1),
+    ("120 to 140", [(0.0, 120), (8.0, 140)], 1),
+    ("120 x2", [(0.0, 120)], 2),
+    ("slow 60", [(0.0, 60)], 1),
+)
+
+
+def ideal_beats(tempos, duration):
+    """Ideal beat times in ns, along with the index of the tempo they're in."""
+    beats = []
+    t = 0.1
+    for index, (start, bpm) in enumerate(tempos):
+        end = tempos[index + 1][0] if index + 1 < len(tempos) else duration
+        t = max(t, start)
+        while t < end:
+            beats.append((int(t * 1_000_000_000), index))
+            t += 60.0 / bpm
+    return beats
+
+
+def rising_edges(events):
+    edges = []
+    last = False
+    for t, value in events:
+        if value and not last:
+            edges.append(t)
+        last = value
+    return edges
+
+
+def measure(ticks, beats, multiply, settle):
+    # The ideal ticks, leaving out the ones while each tempo settles.
+    targets = []
+    for i, (t, tempo) in enumerate(beats[:-1]):
+        settled = i >= settle and beats[i - settle][1] == tempo
+        step = (beats[i + 1][0] - t) // multiply
+        for sub in range(multiply):
+            targets.append((t + sub * step, step, settled))
+
+    errors = []
+    missed = 0
+    matched = set()
+    index = 0
+    for target, step, settled in targets:
+        while index + 1 < len(ticks) and ticks[index + 1] <= target:
+            index += 1
+        candidates = [i for i in (index, index + 1) if i < len(ticks)]
+        if not candidates:
+            missed += settled
+            continue
+        best = min(candidates, key=lambda i: abs(ticks[i] - target))
+        if abs(ticks[best] - target) >= step // 2:
+            missed += settled
+            continue
+        matched.add(best)
+        if settled:
+            errors.append((target, ticks[best] - target))
+
+    first = min(t for t, _, settled in targets if settled)
+    last = max(t for t, _, settled in targets if settled)
+    extra = sum(1 for i, t in enumerate(ticks) if first <= t <= last) - len(
+        [i for i in matched if first <= ticks[i] <= last]
+    )
+    return errors, missed, extra
+
+
+def drift_per_minute(errors):
+    # Least-squares slope of the phase error against time.
+    if len(errors) < 2:
+        return 0.0
+    n = len(errors)
+    mean_t = sum(t for t, _ in errors) / n
+    mean_e = sum(e for _, e in errors) / n
+    num = sum((t - mean_t) * (e - mean_e) for t, e in errors)
+    den = sum((t - mean_t) ** 2 for t, _ in errors)
+    return num / den * 60_000_000_000 if den else 0.0
+
+
+def run(program, tempos, multiply, args, seed):
+    rng = random.Random(seed)
+    beats = ideal_beats(tempos, args.duration)
+    transitions = []
+    for t, _ in beats:
+        t = t / 1_000_000_000 + rng.gauss(0.0, args.jitter / 1000)
+        transitions += [(t, True), (t + 0.005, False)]
+
+    simulator = Simulator(
+        Timeline(duration=args.duration, gate_in=Transitions(transitions)),
+        clock_step_ns=int(args.step_us * 1000),
+    )
+    simulator.run_source(program)
+    ticks = rising_edges(simulator.gate_out_events)
+    return measure(ticks, beats, multiply, args.settle)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--duration", type=float, default=16.0)
+    parser.add_argument("--jitter", type=float, default=2.0)
+    parser.add_argument("--taps", type=int, default=4)
+    parser.add_argument("--settle", type=int, default=4)
+    parser.add_argument("--step-us", type=float, default=25.0)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    print(
+        "{:<12} {:<14} {:>9} {:>9} {:>9} {:>11} {:>7} {:>6}".format(
+            "scenario",
+            "follower",
+            "err mean",
+            "|err| p99",
+            "|err| max",
+            "drift/min",
+            "missed",
+            "extra",
+        )
+    )
+    for name, tempos, multiply in SCENARIOS:
+        followers = (
+            ("last interval", LAST_INTERVAL.format(multiply=multiply)),
+            (
+                "tempo",
+                TEMPO.format(taps=args.taps, edge_capture=False, multiply=multiply),
+            ),
+            (
+                "tempo+capture",
+                TEMPO.format(taps=args.taps, edge_capture=True, multiply=multiply),
+            ),
+        )
+        for follower, program in followers:
+            errors, missed, extra = run(program, tempos, multiply, args, args.seed)
+            values = [e for _, e in errors]
+            magnitudes = sorted(abs(e) for e in values)
+            print(
+                "{:<12} {:<14} {:>9} {:>9} {:>9} {:>11} {:>7} {:>6}".format(
+                    name,
+                    follower,
+                    format_ns(sum(values) / len(values) if values else None),
+                    format_ns(percentile(magnitudes, 99) if magnitudes else None),
+                    format_ns(magnitudes[-1] if magnitudes else None),
+                    format_ns(drift_per_minute(errors)),
+                    missed,
+                    extra,
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""Measures the cost of voice allocation under a 50Hz trigger stream.
+
+Plays kick, snare and clap in turn on every trigger with a single voice and
+with the mixer at several voice counts and both stealing strategies. Reports
+the host cost of each play() and update() call, the memory the library
+holds once the BigHonkingButton has been made (measured with tracemalloc,
+so these are CPython's object sizes rather than CircuitPython's), how many samples were
+cut off by a new trigger and the most samples that were sounding at once.
+The mixing itself happens in CircuitPython's audio interrupt and isn't
+measured here.
+
+    python benchmarks/voices.py --rate 50 --duration 4
+"""
+
+import argparse
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from bhb_sim import Simulator, Timeline, Transitions  # noqa: E402
+from bhb_sim.hardware import duration_ns  # noqa: E402
+from bhb_sim.stats import format_ns, summarize  # noqa: E402
+
+LIBRARY_DIR = os.path.abspath(
+    os.path.join(os.path.dirname(__file__), "..", "winterbloom_bhb")
+)
+
+PROGRAM = """
+import time
+import winterbloom_bhb
+
+bhb = winterbloom_bhb.BigHonkingButton(voices={voices}, voice_stealing={stealing!r})
+samples = [
+    bhb.load_sample("samples/kick.wav"),
+    bhb.load_sample("samples/snare.wav"),
+    bhb.load_sample("samples/clap.wav"),
+]
+costs = []
+count = 0
+
+while bhb.update():
+    if bhb.triggered:
+        start = time.perf_counter_ns()
+        bhb.play(samples[count % len(samples)])
+        costs.append(time.perf_counter_ns() - start)
+        count += 1
+"""
+
+
+def analyze(audio_events):
+    # Ignore the mixer itself, which is started once at boot.
+    plays = [
+        event
+        for event in audio_events
+        if event.kind == "play" and not event.sample.name.startswith("Mixer")
+    ]
+    sounding = []
+    steals = 0
+    most = 0
+    ends = {}
+    for event in plays:
+        end = ends.get(event.voice)
+        if end is not None and end > event.audible_ns:
+            steals += 1
+        ends[event.voice] = event.audible_ns + duration_ns(event.sample)
+        sounding = [end for end in ends.values() if end > event.audible_ns]
+        most = max(most, len(sounding))
+    return steals, most
+
+
+def run(voices, stealing, args):
+    timeline = Timeline(
+        duration=args.duration,
+        gate_in=Transitions.pulses(
+            start=0.1, period=1 / args.rate, width=0.002, until=args.duration
+        ),
+    )
+    simulator = Simulator(timeline)
+    simulator.run_source(PROGRAM.format(voices=voices, stealing=stealing))
+    steals, most = analyze(simulator.audio_events)
+    return (
+        summarize(simulator.script_globals["costs"]),
+        summarize(simulator.update_costs),
+        steals,
+        most,
+    )
+
+
+def memory(voices, stealing):
+    # What the library holds once a BigHonkingButton has been made.
+    simulator = Simulator(Timeline(duration=1.0))
+    with simulator.installed():
+        import winterbloom_bhb
+
+        tracemalloc.start()
+        try:
+            bhb = winterbloom_bhb.BigHonkingButton(
+                voices=voices, voice_stealing=stealing
+            )
+            snapshot = tracemalloc.take_snapshot()
+        finally:
+            tracemalloc.stop()
+        del bhb
+    library = [tracemalloc.Filter(True, os.path.join(LIBRARY_DIR, "*"))]
+    return sum(
+        stat.size for stat in snapshot.filter_traces(library).statistics("filename")
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rate", type=float, default=50.0, help="Triggers per second.")
+    parser.add_argument("--duration", type=float, default=4.0)
+    args = parser.parse_args()
+
+    print(
+        "{:>6} {:<12} {:>10} {:>10} {:>10} {:>11} {:>8} {:>8} {:>8}".format(
+            "voices",
+            "stealing",
+            "play p50",
+            "play p99",
+            "overhead",
+            "update p50",
+            "memory",
+            "cut off",
+            "overlap",
+        )
+    )
+    baseline = None
+    for voices, stealing in [
+        (1, "oldest"),
+        (2, "oldest"),
+        (2, "round_robin"),
+        (4, "oldest"),
+        (4, "round_robin"),
+        (8, "oldest"),
+        (8, "round_robin"),
+    ]:
+        costs, updates, steals, most = run(voices, stealing, args)
+        held = memory(voices, stealing)
+        if baseline is None:
+            baseline = costs["p50"]
+        print(
+            "{:>6} {:<12} {:>10} {:>10} {:>10} {:>11} {:>8} {:>8} {:>8}".format(
+                voices,
+                "-" if voices == 1 else stealing,
+                format_ns(costs["p50"]),
+                format_ns(costs["p99"]),
+                format_ns(costs["p50"] - baseline),
+                format_ns(updates["p50"]),
+                held,
+                "{}/{}".format(steals, costs["count"]),
+                most,
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
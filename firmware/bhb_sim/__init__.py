@@ -0,0 +1,22 @@
+"""Host-side simulator for Big Honking Button programs.
+
+This lets winterbloom_bhb and the examples run under regular CPython with a
+scripted timeline standing in for the button, gate and CV inputs, so that
+latency and loop timing can be measured without a module on the bench. It
+isn't deployed to the device.
+"""
+
+from bhb_sim.clock import SimulationFinished, VirtualClock
+from bhb_sim.report import Report
+from bhb_sim.simulator import Simulator, example_scripts
+from bhb_sim.timeline import Timeline, Transitions
+
+__all__ = [
+    "Report",
+    "SimulationFinished",
+    "Simulator",
+    "Timeline",
+    "Transitions",
+    "VirtualClock",
+    "example_scripts",
+]
@@ -0,0 +1,153 @@
+import asyncio
+import selectors
+import time as _time
+import types
+
+
+class SimulationFinished(BaseException):
+    """Raised inside the simulated program once its timeline has run out.
+
+    This derives from BaseException so that a bare ``except Exception`` in a
+    user's program can't swallow it.
+    """
+
+
+class VirtualClock:
+    """The simulated module's notion of time.
+
+    Simulated time advances with the host's wall clock multiplied by
+    ``cpu_scale`` (so a scale of 20 approximates a CPU twenty times slower
+    than the host) plus any time spent in ``time.sleep()``, which returns
+    immediately instead of blocking. This keeps busy loops honest while
+    letting sleepy programs run faster than realtime.
+
+    Programs using asyncio run on an event loop from ``event_loop()``,
+    whose clock is this one and which passes time with ``sleep()`` while it
+    waits for its next timer, just like a program calling ``time.sleep()``.
+
+    With ``step_ns`` set, the host's clock isn't used at all: each time the
+    program reads the clock or touches the hardware, time moves on by
+    ``step_ns``. That's a cruder model of how long code takes, but one that
+    comes out the same every run, for measurements that the host's own
+    pauses would otherwise throw off.
+
+    ``background``, if set, is called with ``(now_ns, idle)`` whenever the
+    program touches the clock, standing in for CircuitPython's background
+    tasks. ``idle`` is True right after a sleep, during which those tasks
+    would have kept running. Time passed with ``stall()`` doesn't run them.
+    """
+
+    def __init__(self, cpu_scale=1.0, step_ns=None):
+        self.cpu_scale = cpu_scale
+        self.step_ns = step_ns
+        self.end_ns = None
+        self.background = None
+        self.reset()
+
+    def reset(self):
+        self._start = _time.perf_counter_ns()
+        self._slept_ns = 0
+        self._steps = 0
+        self.reads = 0
+        self.finished = False
+
+    def now_ns(self):
+        # Counted so that the simulator can tell when a program has looked
+        # at anything, see Simulator's fast_forward.
+        self.reads += 1
+        if self.step_ns is not None:
+            return self._steps * self.step_ns + self._slept_ns
+        elapsed = _time.perf_counter_ns() - self._start
+        return int(elapsed * self.cpu_scale) + self._slept_ns
+
+    def check(self):
+        self._steps += 1
+        now = self.now_ns()
+        if self.background is not None:
+            self.background(now, False)
+        if self.end_ns is not None and now >= self.end_ns:
+            self.finished = True
+            # asyncio tasks hold on to exceptions instead of raising them, so
+            # make sure a program running under asyncio also comes to a stop.
+            try:
+                asyncio.get_running_loop().stop()
+            except RuntimeError:
+                pass
+            raise SimulationFinished()
+        return now
+
+    def sleep(self, seconds):
+        self.check()
+        self._slept_ns += int(seconds * 1_000_000_000)
+        if self.background is not None:
+            self.background(self.now_ns(), True)
+        self.check()
+
+    def skip(self, ns):
+        """Passes idle time without taking any steps, for fast-forwarding."""
+        self._slept_ns += ns
+        if self.background is not None:
+            self.background(self.now_ns(), True)
+
+    def stall(self, seconds):
+        """Passes time like a blocking call that holds up background tasks."""
+        self._slept_ns += int(seconds * 1_000_000_000)
+        self.check()
+
+    def event_loop(self):
+        """Returns an asyncio event loop that runs on this clock."""
+        return _VirtualEventLoop(self)
+
+    def time_module(self):
+        """Returns a stand-in for the ``time`` module that runs on this clock."""
+        module = types.ModuleType("time")
+        module.__dict__.update(
+            (name, value)
+            for name, value in vars(_time).items()
+            if not name.startswith("__")
+        )
+        module.monotonic = lambda: self.check() / 1_000_000_000
+        module.monotonic_ns = self.check
+        module.sleep = self.sleep
+        return module
+
+
+class _VirtualSelector(selectors.DefaultSelector):
+    # asyncio waits for its next timer by selecting with a timeout. This
+    # only polls and passes that time on the clock instead.
+
+    def __init__(self, clock):
+        super().__init__()
+        self._clock = clock
+
+    def select(self, timeout=None):
+        events = super().select(0)
+        if events or timeout == 0:
+            return events
+        if timeout is None:
+            # Nothing is scheduled, so the program waits until the end.
+            if self._clock.end_ns is None:
+                return events
+            timeout = max(0, self._clock.end_ns - self._clock.now_ns()) / 1e9
+        self._clock.sleep(timeout)
+        return events
+
+
+class _VirtualEventLoop(asyncio.SelectorEventLoop):
+    def __init__(self, clock):
+        super().__init__(_VirtualSelector(clock))
+        self._clock = clock
+
+    def time(self):
+        return self._clock.now_ns() / 1_000_000_000
+
+
+class VirtualEventLoopPolicy(asyncio.DefaultEventLoopPolicy):
+    """Makes asyncio.run() and friends use ``clock.event_loop()``."""
+
+    def __init__(self, clock):
+        super().__init__()
+        self._clock = clock
+
+    def new_event_loop(self):
+        return self._clock.event_loop()
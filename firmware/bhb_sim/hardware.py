@@ -0,0 +1,566 @@
+"""Pure-Python stand-ins for the CircuitPython modules used by winterbloom_bhb.
+
+Each fake talks to the currently installed :class:`bhb_sim.Simulator`, which
+owns the clock, the input timeline and the recorded outputs.
+"""
+
+import types
+import wave
+
+_active = None
+
+
+def current():
+    if _active is None:
+        raise RuntimeError("No simulator is installed.")
+    return _active
+
+
+def activate(simulator):
+    global _active
+    _active = simulator
+
+
+# board
+
+
+class Pin:
+    def __init__(self, name):
+        self.name = name
+
+    def __repr__(self):
+        return "board.{}".format(self.name)
+
+
+PIN_NAMES = ("BUTTON", "GATE_IN", "GATE_OUT", "HONK_OUT", "V5")
+
+
+# digitalio
+
+
+class Direction:
+    INPUT = "INPUT"
+    OUTPUT = "OUTPUT"
+
+
+class Pull:
+    UP = "UP"
+    DOWN = "DOWN"
+
+
+class DriveMode:
+    PUSH_PULL = "PUSH_PULL"
+    OPEN_DRAIN = "OPEN_DRAIN"
+
+
+class DigitalInOut:
+    def __init__(self, pin):
+        self._pin = pin
+        self.direction = Direction.INPUT
+        self.pull = None
+        self._value = False
+
+    def switch_to_input(self, pull=None):
+        self.direction = Direction.INPUT
+        self.pull = pull
+
+    def switch_to_output(self, value=False, drive_mode=DriveMode.PUSH_PULL):
+        self.direction = Direction.OUTPUT
+        self.value = value
+
+    @property
+    def value(self):
+        if self.direction == Direction.OUTPUT:
+            return self._value
+        return current().read_pin(self._pin.name)
+
+    @value.setter
+    def value(self, value):
+        value = bool(value)
+        if value != self._value:
+            current().write_pin(self._pin.name, value)
+        self._value = value
+
+    def deinit(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.deinit()
+
+
+# audiocore
+
+
+class WaveFile:
+    def __init__(self, file, buffer=None):
+        self.file = file
+        self.buffer_size = len(buffer) if buffer is not None else 512
+        self.name = getattr(file, "name", repr(file))
+        with wave.open(file, "rb") as wav:
+            self.channel_count = wav.getnchannels()
+            self.bits_per_sample = wav.getsampwidth() * 8
+            self.sample_rate = wav.getframerate()
+            self.frame_count = wav.getnframes()
+        file.seek(0)
+
+    def deinit(self):
+        self.file.close()
+
+
+class RawSample:
+    def __init__(self, buffer, *, channel_count=1, sample_rate=8000):
+        self.buffer = buffer
+        self.name = "RawSample({})".format(len(buffer))
+        self.channel_count = channel_count
+        self.sample_rate = sample_rate
+        self.bits_per_sample = memoryview(buffer).itemsize * 8
+        self.frame_count = len(buffer) // channel_count
+
+    def deinit(self):
+        pass
+
+
+def duration_ns(sample):
+    return sample.frame_count * 1_000_000_000 // max(1, sample.sample_rate)
+
+
+def sample_value(sample, frame):
+    """The first channel's value at ``frame``, scaled to -1..1.
+
+    Returns None for streamed samples, whose data the fakes don't read.
+    """
+    buffer = getattr(sample, "buffer", None)
+    if buffer is None:
+        return None
+    value = buffer[frame * sample.channel_count]
+    if sample.bits_per_sample == 8:
+        return (value - 128) / 128
+    return value / 32768
+
+
+# audioio
+
+
+class _Stream:
+    """Refills of a playing WaveFile's buffer from flash.
+
+    CircuitPython splits the buffer in two halves and reads the next part of
+    the file into a half once the DAC is done with it. Here that happens
+    whenever background tasks run, see VirtualClock.background. If the DAC
+    reaches the end of what has been read before the next refill, that's an
+    underrun, which sounds like a crackle.
+    """
+
+    def __init__(self, sample, start_ns, loop):
+        frame_size = sample.channel_count * sample.bits_per_sample // 8
+        half = sample.buffer_size // 2
+        self.half_ns = max(
+            1, (half // frame_size) * 1_000_000_000 // sample.sample_rate
+        )
+        self.read_ns = half * 1_000_000_000 // current().flash_bytes_per_s
+        self.end_ns = None if loop else start_ns + duration_ns(sample)
+        # The first half was read before the sample became audible.
+        self.ready_ns = start_ns + self.half_ns
+
+    def service(self, now, idle):
+        """Refills the buffer and returns the number of underruns."""
+        if self.end_ns is not None and self.ready_ns >= self.end_ns:
+            return 0
+        if idle:
+            self.ready_ns = max(self.ready_ns, now + self.half_ns)
+            return 0
+
+        underruns = 0
+        if now > self.ready_ns:
+            underruns += 1
+            self.ready_ns = now
+        while self.ready_ns - now <= self.half_ns:
+            read_done = now + self.read_ns
+            if read_done > self.ready_ns:
+                underruns += 1
+                self.ready_ns = read_done
+            self.ready_ns += self.half_ns
+            if self.end_ns is not None and self.ready_ns >= self.end_ns:
+                break
+        return underruns
+
+
+class AudioOut:
+    def __init__(self, left_channel, *, right_channel=None, quiescent_value=0x8000):
+        self.pin = left_channel
+        self._sample = None
+        self._loop = False
+        self._started_ns = 0
+        self._paused = False
+        self._stream = None
+        current().audio_outs.append(self)
+
+    def play(self, sample, *, loop=False):
+        current().allocate_for_play()
+        now = current().clock.check()
+        self._sample = sample
+        self._loop = loop
+        self._started_ns = now
+        self._paused = False
+        current().record_audio("play", now, sample, loop, value=sample_value(sample, 0))
+        self._started_ns = current().audio_events[-1].audible_ns
+        if isinstance(sample, WaveFile):
+            self._stream = _Stream(sample, self._started_ns, loop)
+        else:
+            self._stream = None
+
+    def stop(self):
+        now = current().clock.check()
+        if self._sample is not None:
+            current().record_audio(
+                "stop", now, self._sample, self._loop, value=self._output(now)
+            )
+        self._sample = None
+        self._stream = None
+
+    def _output(self, now):
+        # The value at the DAC just before now, 0 once the sample has ended.
+        if not self.playing:
+            return 0.0
+        elapsed = max(0, now - self._started_ns)
+        frame = elapsed * self._sample.sample_rate // 1_000_000_000
+        return sample_value(self._sample, frame % self._sample.frame_count)
+
+    def pause(self):
+        self._paused = True
+
+    def resume(self):
+        self._paused = False
+
+    @property
+    def paused(self):
+        return self._paused
+
+    @property
+    def playing(self):
+        if self._sample is None:
+            return False
+        if self._loop:
+            return True
+        elapsed = current().clock.now_ns() - self._started_ns
+        return elapsed < duration_ns(self._sample)
+
+    def deinit(self):
+        self.stop()
+
+
+# audiomixer
+
+
+class MixerVoice:
+    def __init__(self, mixer, index):
+        self._mixer = mixer
+        self._index = index
+        self._sample = None
+        self._loop = False
+        self._started_ns = 0
+        self.level = 1.0
+
+    def play(self, sample, *, loop=False):
+        mixer = self._mixer
+        if (
+            sample.sample_rate != mixer.sample_rate
+            or sample.channel_count != mixer.channel_count
+            or sample.bits_per_sample != mixer.bits_per_sample
+        ):
+            raise ValueError("The sample's format does not match the mixer's")
+        current().allocate_for_play()
+        now = current().clock.check()
+        current().record_audio(
+            "play", now, sample, loop, voice=self._index, level=self.level
+        )
+        self._sample = sample
+        self._loop = loop
+        self._started_ns = current().audio_events[-1].audible_ns
+
+    def stop(self):
+        if self._sample is not None:
+            now = current().clock.check()
+            current().record_audio(
+                "stop", now, self._sample, self._loop, voice=self._index
+            )
+        self._sample = None
+
+    @property
+    def playing(self):
+        if self._sample is None:
+            return False
+        if self._loop:
+            return True
+        elapsed = current().clock.now_ns() - self._started_ns
+        return elapsed < duration_ns(self._sample)
+
+
+class Mixer:
+    def __init__(
+        self,
+        *,
+        voice_count=2,
+        buffer_size=1024,
+        channel_count=2,
+        bits_per_sample=16,
+        samples_signed=True,
+        sample_rate=8000,
+    ):
+        self.name = "Mixer({})".format(voice_count)
+        self.channel_count = channel_count
+        self.bits_per_sample = bits_per_sample
+        self.sample_rate = sample_rate
+        # The mixer keeps producing (possibly silent) output until stopped.
+        self.frame_count = 1 << 62
+        self.voice = tuple(MixerVoice(self, index) for index in range(voice_count))
+
+    def play(self, sample, *, voice=0, loop=False):
+        self.voice[voice].play(sample, loop=loop)
+
+    def stop_voice(self, voice=0):
+        self.voice[voice].stop()
+
+    @property
+    def playing(self):
+        return any(voice.playing for voice in self.voice)
+
+    def deinit(self):
+        pass
+
+
+# keypad
+
+
+class Event:
+    def __init__(self, key_number=0, pressed=True):
+        self.key_number = key_number
+        self.pressed = pressed
+        self.timestamp = 0
+
+    @property
+    def released(self):
+        return not self.pressed
+
+
+class EventQueue:
+    def __init__(self, max_events):
+        self._max_events = max_events
+        self._events = []
+        self.overflowed = False
+
+    def _put(self, key_number, pressed, timestamp):
+        if len(self._events) >= self._max_events:
+            self.overflowed = True
+            return
+        self._events.append((key_number, pressed, timestamp))
+
+    def get_into(self, event):
+        self._fill()
+        if not self._events:
+            return False
+        event.key_number, event.pressed, event.timestamp = self._events.pop(0)
+        return True
+
+    def get(self):
+        event = Event()
+        return event if self.get_into(event) else None
+
+    def clear(self):
+        self._events.clear()
+        self.overflowed = False
+
+    def __len__(self):
+        self._fill()
+        return len(self._events)
+
+    def __bool__(self):
+        return len(self) > 0
+
+    def _fill(self):
+        pass
+
+
+class Keys:
+    """Scans the scripted inputs every ``interval`` like keypad's background task.
+
+    An edge is seen at the first scan after it happens, so a pulse that starts
+    and ends between two scans is missed, just like on hardware.
+    """
+
+    def __init__(
+        self, pins, *, value_when_pressed, pull=True, interval=0.02, max_events=64
+    ):
+        self._names = [pin.name.lower() for pin in pins]
+        self._interval_ns = int(interval * 1_000_000_000)
+        self._scanned_ns = 0
+        self._states = [False] * len(pins)
+        self.events = EventQueue(max_events)
+        self.events._fill = self._scan
+        self.key_count = len(pins)
+
+    def _scan(self):
+        sim = current()
+        now = sim.clock.check()
+        interval = self._interval_ns
+        last_scan = now - now % interval
+        if last_scan <= self._scanned_ns:
+            return
+
+        changes = []
+        for key_number, name in enumerate(self._names):
+            transitions = sim.timeline.inputs[name]
+            for t, _ in transitions.edges_between(self._scanned_ns, last_scan):
+                scan = -(-t // interval) * interval
+                changes.append((scan, key_number))
+
+        for scan, key_number in sorted(set(changes)):
+            name = self._names[key_number]
+            state = sim.timeline.state_at(name, scan)
+            if state != self._states[key_number]:
+                self._states[key_number] = state
+                self.events._put(key_number, state, ticks_ms(scan))
+
+        self._scanned_ns = last_scan
+
+    def reset(self):
+        self._states = [False] * len(self._names)
+
+    def deinit(self):
+        pass
+
+
+# supervisor
+
+
+def ticks_ms(t_ns=None):
+    if t_ns is None:
+        t_ns = current().clock.check()
+    return (t_ns // 1_000_000) & ((1 << 29) - 1)
+
+
+# gc
+
+
+def gc_collect():
+    current().collect_garbage()
+
+
+def gc_enable():
+    current().gc_enabled = True
+
+
+def gc_disable():
+    current().gc_enabled = False
+
+
+def gc_isenabled():
+    return current().gc_enabled
+
+
+def gc_mem_alloc():
+    return current().heap_allocated()
+
+
+def gc_mem_free():
+    return current().heap_size - current().heap_allocated()
+
+
+# microcontroller
+
+
+class NVM:
+    """The simulator's ``nvm`` bytes, which start out erased to 0xFF."""
+
+    def __len__(self):
+        return len(current().nvm)
+
+    def __getitem__(self, index):
+        return current().nvm[index]
+
+    def __setitem__(self, index, value):
+        nvm = current().nvm
+        if isinstance(index, slice) and len(nvm[index]) != len(value):
+            raise ValueError("Slice and value have different lengths")
+        nvm[index] = value
+
+
+class Processor:
+    @property
+    def uid(self):
+        return bytearray(current().uid)
+
+
+# _bhb
+
+
+def init_adc():
+    pass
+
+
+def read_adc():
+    return current().read_adc()
+
+
+def build_modules():
+    """Creates fresh fake modules, keyed by the name they're imported as."""
+    board = types.ModuleType("board")
+    for name in PIN_NAMES:
+        setattr(board, name, Pin(name))
+
+    digitalio = types.ModuleType("digitalio")
+    digitalio.DigitalInOut = DigitalInOut
+    digitalio.Direction = Direction
+    digitalio.Pull = Pull
+    digitalio.DriveMode = DriveMode
+
+    audiocore = types.ModuleType("audiocore")
+    audiocore.WaveFile = WaveFile
+    audiocore.RawSample = RawSample
+
+    audioio = types.ModuleType("audioio")
+    audioio.AudioOut = AudioOut
+
+    audiomixer = types.ModuleType("audiomixer")
+    audiomixer.Mixer = Mixer
+    audiomixer.MixerVoice = MixerVoice
+
+    keypad = types.ModuleType("keypad")
+    keypad.Keys = Keys
+    keypad.Event = Event
+    keypad.EventQueue = EventQueue
+
+    supervisor = types.ModuleType("supervisor")
+    supervisor.ticks_ms = ticks_ms
+
+    bhb = types.ModuleType("_bhb")
+    bhb.init_adc = init_adc
+    bhb.read_adc = read_adc
+
+    gc = types.ModuleType("gc")
+    gc.collect = gc_collect
+    gc.enable = gc_enable
+    gc.disable = gc_disable
+    gc.isenabled = gc_isenabled
+    gc.mem_alloc = gc_mem_alloc
+    gc.mem_free = gc_mem_free
+
+    microcontroller = types.ModuleType("microcontroller")
+    microcontroller.nvm = NVM()
+    microcontroller.cpu = Processor()
+
+    return {
+        "board": board,
+        "digitalio": digitalio,
+        "audiocore": audiocore,
+        "audioio": audioio,
+        "audiomixer": audiomixer,
+        "keypad": keypad,
+        "supervisor": supervisor,
+        "_bhb": bhb,
+        "gc": gc,
+        "microcontroller": microcontroller,
+    }
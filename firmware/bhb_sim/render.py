@@ -0,0 +1,311 @@
+"""Renders what a simulated module played to audio, faster than realtime.
+
+The simulator only logs when samples start and stop. :func:`render` turns
+that log back into the signal at the HONK OUT jack: each play is resampled
+at the rate it was started with, which already includes play()'s
+``44100 * 2 ** pitch_cv`` and the 350kHz clamp, and held at each frame's
+value until the next like the DAC does, then quantized to the DAC's 10
+bits. Mixer voices are summed at their level and clipped. The gate output
+is rendered alongside it from the log of gate writes.
+
+Run the program with ``Simulator(capture_audio=True)`` so that buffers the
+program overwrites later, such as the noise generator's, are rendered with
+what they held when they were played. Streamed WAV files are read from the
+host's copy. Buffers that change while they play, such as ChunkedSample's,
+are rendered as they were when play() was called.
+
+This needs NumPy, which is only used on the host.
+"""
+
+import json
+import os
+import wave
+
+_NS = 1_000_000_000
+
+# RawSample's buffer formats, to NumPy dtypes and the value of silence.
+_FORMATS = {
+    "b": ("i1", 0, 128),
+    "B": ("u1", 128, 128),
+    "h": ("<i2", 0, 32768),
+    "H": ("<u2", 32768, 32768),
+}
+
+
+def _numpy():
+    try:
+        import numpy
+    except ImportError as exc:
+        raise RuntimeError(
+            "Rendering needs NumPy, install it with `pip install numpy`."
+        ) from exc
+    return numpy
+
+
+class Rendering:
+    """The rendered HONK OUT and GATE OUT signals.
+
+    ``audio`` is the output level from -1 to 1 and ``gate`` whether the gate
+    output was high, one entry per output frame at ``output_rate``.
+    """
+
+    def __init__(self, audio, gate, gate_edges, plays, output_rate):
+        self.audio = audio
+        self.gate = gate
+        self.gate_edges = gate_edges
+        self.plays = plays
+        self.output_rate = output_rate
+
+    @property
+    def duration(self):
+        return len(self.audio) / self.output_rate
+
+    def write_wav(self, path):
+        """Writes a 16-bit stereo WAV with HONK OUT on the left, GATE OUT right."""
+        np = _numpy()
+        frames = np.empty((len(self.audio), 2), dtype="<i2")
+        frames[:, 0] = np.clip(np.round(self.audio * 32768), -32768, 32767)
+        frames[:, 1] = np.where(self.gate, 32767, 0)
+        with wave.open(path, "wb") as fh:
+            fh.setnchannels(2)
+            fh.setsampwidth(2)
+            fh.setframerate(self.output_rate)
+            fh.writeframes(frames.tobytes())
+
+    def fingerprint(self, block_ms=10):
+        """A compact summary for golden-file comparisons.
+
+        Times are in milliseconds. ``envelope`` is the peak level of each
+        ``block_ms`` block in thousandths of full scale.
+        """
+        np = _numpy()
+        block = max(1, self.output_rate * block_ms // 1000)
+        count = len(self.audio) // block
+        peaks = np.abs(self.audio[: count * block]).reshape(count, block).max(axis=1)
+        return {
+            "output_rate": self.output_rate,
+            "block_ms": block_ms,
+            "gate_edges": [[_ms(t), state] for t, state in self.gate_edges],
+            "plays": [
+                [_ms(t), name, sample_rate, loop]
+                for t, name, sample_rate, loop in self.plays
+            ],
+            "envelope": [int(round(p)) for p in peaks * 1000],
+        }
+
+
+def _ms(t_ns):
+    return round(t_ns / 1_000_000, 3)
+
+
+def _sample_name(sample, root):
+    name = sample.name
+    if os.path.isabs(name):
+        name = os.path.relpath(name, root).replace(os.sep, "/")
+    return name
+
+
+class _Sources:
+    # Decoded sample data, keyed by the event it was captured with or by the
+    # WAV file it was read from.
+
+    def __init__(self, np):
+        self.np = np
+        self._files = {}
+
+    def frames(self, event):
+        np = self.np
+        sample = event.sample
+        buffer = getattr(sample, "buffer", None)
+        if buffer is not None:
+            dtype, offset, scale = _FORMATS[memoryview(buffer).format]
+            data = event.data if event.data is not None else bytes(buffer)
+            values = np.frombuffer(data, dtype=dtype)
+            channels = sample.channel_count
+        else:
+            path = sample.name
+            if path not in self._files:
+                self._files[path] = self._read_wav(path)
+            values, offset, scale, channels = self._files[path]
+        # The DAC only plays the first channel.
+        return (values[::channels].astype(np.float64) - offset) / scale
+
+    def _read_wav(self, path):
+        with wave.open(path, "rb") as fh:
+            width = fh.getsampwidth()
+            channels = fh.getnchannels()
+            data = fh.readframes(fh.getnframes())
+        if width == 1:
+            return self.np.frombuffer(data, dtype="u1"), 128, 128, channels
+        return self.np.frombuffer(data, dtype="<i2"), 0, 32768, channels
+
+
+def _segments(events, end_ns):
+    """(start event, end time) for each play, ending at the next play or stop."""
+    segments = []
+    for index, event in enumerate(events):
+        if event.kind != "play":
+            continue
+        end = events[index + 1].time_ns if index + 1 < len(events) else end_ns
+        segments.append((event, max(event.audible_ns, end)))
+    return segments
+
+
+def _mix(np, out, segments, sources, output_rate, level=False):
+    for event, end_ns in segments:
+        if _is_mixer(event.sample):
+            continue
+        frames = sources.frames(event)
+        if not len(frames):
+            continue
+        start = -(-event.audible_ns * output_rate // _NS)
+        stop = min(len(out), -(-end_ns * output_rate // _NS))
+        if start >= stop:
+            continue
+        # The frame at the DAC at each output time, held until the next.
+        times = np.arange(start, stop, dtype=np.float64) / output_rate
+        index = np.floor(
+            (times - event.audible_ns / _NS) * event.sample_rate + 1e-9
+        ).astype(np.int64)
+        if event.loop:
+            index %= len(frames)
+        else:
+            index = index[index < len(frames)]
+        gain = event.level if level and event.level is not None else 1.0
+        out[start : start + len(index)] += frames[index] * gain
+
+
+def _is_mixer(sample):
+    return hasattr(sample, "voice")
+
+
+def render(simulator, output_rate=44100, dac_bits=10):
+    """Renders a finished simulation's audio and gate outputs.
+
+    ``dac_bits`` is the resolution of the DAC, or None to leave the output
+    unquantized.
+    """
+    np = _numpy()
+    end_ns = simulator.clock.now_ns()
+    length = end_ns * output_rate // _NS
+    sources = _Sources(np)
+
+    direct = [e for e in simulator.audio_events if e.voice is None]
+    voices = {}
+    for event in simulator.audio_events:
+        if event.voice is not None:
+            voices.setdefault(event.voice, []).append(event)
+
+    audio = np.zeros(length, dtype=np.float64)
+    direct_segments = _segments(direct, end_ns)
+    _mix(np, audio, direct_segments, sources, output_rate)
+
+    if voices:
+        bus = np.zeros(length, dtype=np.float64)
+        for events in voices.values():
+            _mix(np, bus, _segments(events, end_ns), sources, output_rate, True)
+        np.clip(bus, -1.0, 32767 / 32768, out=bus)
+        # The voices are only heard while the mixer is playing on AudioOut.
+        for event, segment_end in direct_segments:
+            if _is_mixer(event.sample):
+                start = -(-event.audible_ns * output_rate // _NS)
+                stop = min(length, -(-segment_end * output_rate // _NS))
+                audio[start:stop] += bus[start:stop]
+
+    if dac_bits is not None:
+        steps = 1 << (dac_bits - 1)
+        audio = np.clip(np.floor(audio * steps), -steps, steps - 1) / steps
+
+    gate_edges = []
+    last = False
+    for t, value in simulator.gate_out_events:
+        if value != last and t < end_ns:
+            gate_edges.append((t, value))
+            last = value
+    # Each state lasts from its edge until the next one.
+    times = np.array([t for t, _ in gate_edges], dtype=np.int64)
+    bounds = np.concatenate(([0], -(-times * output_rate // _NS), [length]))
+    bounds = np.minimum(bounds, length)
+    states = np.array([False] + [value for _, value in gate_edges], dtype=bool)
+    gate = np.repeat(states, np.diff(bounds))
+
+    plays = [
+        (e.audible_ns, _sample_name(e.sample, simulator.root), e.sample_rate, e.loop)
+        for e in simulator.audio_events
+        if e.kind == "play"
+    ]
+    return Rendering(audio, gate, gate_edges, plays, output_rate)
+
+
+def compare_fingerprints(expected, actual, time_tolerance_ms=0.1, level_tolerance=1):
+    """Lists how ``actual`` differs from ``expected``, empty if they match.
+
+    Gate edges and plays may move by up to ``time_tolerance_ms`` and each
+    block of the envelope by ``level_tolerance`` thousandths.
+    """
+    problems = []
+    for key in ("output_rate", "block_ms"):
+        if expected[key] != actual[key]:
+            problems.append(
+                "{} is {}, expected {}".format(key, actual[key], expected[key])
+            )
+    if problems:
+        return problems
+
+    def _timed(key, describe):
+        want, got = expected[key], actual[key]
+        if len(want) != len(got):
+            problems.append(
+                "{} {}, expected {}".format(len(got), key.replace("_", " "), len(want))
+            )
+        for a, b in zip(want, got):
+            if a[1:] != b[1:] or abs(a[0] - b[0]) > time_tolerance_ms:
+                problems.append(
+                    "{} at {}ms, expected {} at {}ms".format(
+                        describe(b), b[0], describe(a), a[0]
+                    )
+                )
+                break
+
+    _timed("gate_edges", lambda e: "gate high" if e[1] else "gate low")
+    _timed("plays", lambda e: "play {} at {}Hz".format(e[1], e[2]))
+
+    want, got = expected["envelope"], actual["envelope"]
+    if len(want) != len(got):
+        problems.append("{} envelope blocks, expected {}".format(len(got), len(want)))
+    for index, (a, b) in enumerate(zip(want, got)):
+        if abs(a - b) > level_tolerance:
+            problems.append(
+                "level {} at {}ms, expected {}".format(
+                    b / 1000, index * expected["block_ms"], a / 1000
+                )
+            )
+            break
+    return problems
+
+
+def load_fingerprint(path):
+    with open(path, "r") as fh:
+        return json.load(fh)
+
+
+def save_fingerprint(fingerprint, path):
+    # One list per line keeps diffs of golden files readable.
+    lines = ["{"]
+    items = list(fingerprint.items())
+    for index, (key, value) in enumerate(items):
+        comma = "," if index + 1 < len(items) else ""
+        if isinstance(value, list) and key != "envelope":
+            lines.append("  {}: [".format(json.dumps(key)))
+            for row, entry in enumerate(value):
+                lines.append(
+                    "    {}{}".format(
+                        json.dumps(entry), "," if row + 1 < len(value) else ""
+                    )
+                )
+            lines.append("  ]{}".format(comma))
+        else:
+            lines.append("  {}: {}{}".format(json.dumps(key), json.dumps(value), comma))
+    lines.append("}")
+    with open(path, "w") as fh:
+        fh.write("\n".join(lines) + "\n")
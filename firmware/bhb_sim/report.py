@@ -0,0 +1,98 @@
+import os
+
+from bhb_sim.stats import format_ns, summarize
+
+
+def _trigger_latencies(timeline, audio_events, end_ns):
+    """Time from each rising input edge to the first play() that follows it.
+
+    A trigger only counts as answered if the play happens before the next
+    edge on any input, otherwise it's attributed to that later edge.
+    """
+    edges = [edge for edge in timeline.edges() if edge[0] < end_ns]
+    plays = [event.time_ns for event in audio_events if event.kind == "play"]
+    latencies = []
+    triggers = 0
+    play_index = 0
+
+    for index, (t, _, state) in enumerate(edges):
+        next_edge = edges[index + 1][0] if index + 1 < len(edges) else end_ns
+        while play_index < len(plays) and plays[play_index] < t:
+            play_index += 1
+        if not state:
+            continue
+        triggers += 1
+        if play_index < len(plays) and plays[play_index] < next_edge:
+            latencies.append(plays[play_index] - t)
+
+    return triggers, latencies
+
+
+class Report:
+    """Timing results from a single simulated run. All times are in ns."""
+
+    def __init__(self, script, simulator):
+        self.script = script
+        self.name = os.path.splitext(os.path.basename(script))[0]
+        self.cpu_scale = simulator.clock.cpu_scale
+        self.audio_events = simulator.audio_events
+        self.gate_out_events = simulator.gate_out_events
+        self.underruns = len(simulator.underruns)
+        self.profile = simulator.profilers[0].as_dict() if simulator.profilers else None
+
+        update_times = simulator.update_times
+        end_ns = update_times[-1] if update_times else 0
+        periods = [b - a for a, b in zip(update_times, update_times[1:])]
+        self.triggers, latencies = _trigger_latencies(
+            simulator.timeline, simulator.audio_events, end_ns
+        )
+
+        self.boot = update_times[0] if update_times else None
+        self.update_cost = summarize(simulator.update_costs)
+        self.loop_period = summarize(periods)
+        self.latency = summarize(latencies)
+
+    @property
+    def jitter(self):
+        if not self.loop_period["count"]:
+            return None
+        return self.loop_period["p99"] - self.loop_period["p50"]
+
+    def as_dict(self):
+        return {
+            "name": self.name,
+            "cpu_scale": self.cpu_scale,
+            "boot": self.boot,
+            "triggers": self.triggers,
+            "update_cost": self.update_cost,
+            "loop_period": self.loop_period,
+            "loop_jitter": self.jitter,
+            "latency": self.latency,
+            "plays": sum(1 for event in self.audio_events if event.kind == "play"),
+            "underruns": self.underruns,
+        }
+
+    HEADER = "{:<14} {:>8} {:>10} {:>10} {:>10} {:>10} {:>10} {:>10} {:>9}".format(
+        "example",
+        "loops",
+        "update p50",
+        "update p99",
+        "period p50",
+        "jitter",
+        "lat p50",
+        "lat p99",
+        "answered",
+    )
+
+    def row(self):
+        return "{:<14} {:>8} {:>10} {:>10} {:>10} {:>10} {:>10} {:>10} {:>9}".format(
+            self.name,
+            self.update_cost["count"],
+            format_ns(self.update_cost.get("p50")),
+            format_ns(self.update_cost.get("p99")),
+            format_ns(self.loop_period.get("p50")),
+            format_ns(self.jitter),
+            format_ns(self.latency.get("p50")),
+            format_ns(self.latency.get("p99")),
+            "{}/{}".format(self.latency["count"], self.triggers),
+        )
@@ -0,0 +1,539 @@
+import asyncio
+import bisect
+import builtins
+import contextlib
+import logging
+import os
+import pkgutil
+import random
+import sys
+import time as _time
+import types
+
+from bhb_sim import hardware
+from bhb_sim.clock import SimulationFinished, VirtualClock, VirtualEventLoopPolicy
+from bhb_sim.report import Report
+
+FIRMWARE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+ROOT_DIR = os.path.abspath(os.path.join(FIRMWARE_DIR, ".."))
+EXAMPLES_DIR = os.path.join(ROOT_DIR, "examples")
+
+LIBRARY = "winterbloom_bhb"
+
+
+class _IgnoreSimulationFinished(logging.Filter):
+    # Tasks that were interrupted by the end of a simulation would otherwise
+    # log "Task exception was never retrieved" when they're collected.
+    def filter(self, record):
+        exc_info = record.exc_info
+        return not (exc_info and isinstance(exc_info[1], SimulationFinished))
+
+
+logging.getLogger("asyncio").addFilter(_IgnoreSimulationFinished())
+
+
+def _is_library_module(name):
+    return name == LIBRARY or name.startswith(LIBRARY + ".")
+
+
+class AudioEvent:
+    """A play() or stop() call.
+
+    ``audible_ns`` is when the sound actually starts, which for streamed
+    samples is after the first buffer has been read from flash. ``value`` is
+    the output level (-1 to 1) just before a stop or at the start of a play,
+    or None where it isn't known, such as for streamed samples and mixer
+    voices. A large difference between the two across a retrigger is a
+    click. ``level`` is a mixer voice's level when it started playing.
+
+    With the simulator's ``capture_audio`` set, ``data`` is a copy of a
+    RawSample's buffer as it was when play() was called, since programs
+    such as the noise generator go on to overwrite it.
+    """
+
+    __slots__ = (
+        "kind",
+        "time_ns",
+        "audible_ns",
+        "sample",
+        "loop",
+        "sample_rate",
+        "voice",
+        "value",
+        "level",
+        "data",
+    )
+
+    def __init__(
+        self,
+        kind,
+        time_ns,
+        sample,
+        loop,
+        sample_rate,
+        audible_ns=None,
+        voice=None,
+        value=None,
+        level=None,
+        data=None,
+    ):
+        self.kind = kind
+        self.voice = voice
+        self.value = value
+        self.level = level
+        self.data = data
+        self.time_ns = time_ns
+        self.audible_ns = time_ns if audible_ns is None else audible_ns
+        self.sample = sample
+        self.loop = loop
+        self.sample_rate = sample_rate
+
+    def __repr__(self):
+        return "<AudioEvent {} {} at {}ns>".format(
+            self.kind, self.sample.name, self.time_ns
+        )
+
+
+class Simulator:
+    """Runs Big Honking Button programs on the host against a scripted timeline.
+
+    While installed, the simulator replaces ``board``, ``digitalio``,
+    ``audiocore``, ``audioio``, ``audiomixer``, ``keypad``, ``supervisor``,
+    ``_bhb``, ``gc``, ``microcontroller`` and ``time`` with the fakes in
+    :mod:`bhb_sim.hardware` and imports a fresh copy of ``winterbloom_bhb``
+    on top of them. Paths are resolved relative to ``root``, which plays the
+    part of the ``CIRCUITPY`` drive, apart from ``lib/`` which is the
+    firmware directory.
+
+    Simulated time follows the host's clock scaled by ``cpu_scale``, or with
+    ``clock_step_ns`` moves on by that much on every call into the fakes,
+    see :class:`bhb_sim.clock.VirtualClock`.
+
+    Opening a file costs ``flash_seek_ns``. Starting a streamed ``WaveFile``
+    is modelled as a seek plus reading the first half of its buffer at
+    ``flash_bytes_per_s``. The seek is skipped when the same file was the
+    last one streamed, standing in for the filesystem's sector cache.
+
+    While a ``WaveFile`` plays on ``AudioOut``, its buffer is refilled
+    whenever the program calls into the fakes or sleeps. The times at which
+    the DAC ran out of data are kept in ``underruns``.
+
+    ``gc.collect()`` takes ``gc_collect_ns`` and doesn't refill anything
+    while it runs. The heap fills up at ``alloc_bytes_per_s`` from a quarter
+    full after each collection, and while ``gc`` is enabled a collection
+    happens by itself once it's full, as it would on the device. On top of
+    that, every ``play()`` allocates ``alloc_bytes_per_play`` just before it
+    starts the sample, like a program that builds a buffer or opens a file
+    for each trigger, so a collection that it sets off lands on the trigger.
+    The times of all collections are kept in ``gc_collections``.
+
+    The CV input is read through the nominal calibration table for the
+    board revision, or through ``adc_calibration``, a mapping of ADC codes
+    to voltages in the same form, to simulate a particular unit's ADC.
+    ``nvm`` is the contents of ``microcontroller.nvm``, erased by default,
+    and ``uid`` the chip's unique ID. Both are kept on the simulator, where
+    what the program saved can be read back.
+
+    ``capture_audio=True`` keeps a copy of every RawSample's data when it's
+    played, for rendering what was heard with :mod:`bhb_sim.render`.
+
+    With ``profile=True`` every BigHonkingButton the program makes is
+    profiled, see ``winterbloom_bhb/profiler.py``, and its Profiler is kept
+    in ``profilers``.
+
+    ``fast_forward=True`` skips over stretches where the program's loop
+    only goes round calling ``update()``. Once a few passes in a row have
+    gone by without the program touching the hardware or the clock between
+    them, the clock jumps ahead by whole passes of the loop to a couple of
+    passes before the next input edge, the next time the library has
+    something scheduled, or the end of the timeline, whichever is first.
+    Because the jump is a whole number of passes, the program reads the
+    inputs at the same times as it would have without it and the output is
+    the same. It's left off while ``update()`` has work that depends on
+    time but isn't scheduled: reading the CV with ``cv_samples``, the GC
+    budget, a ChunkedSample, or a sample waiting on ``play_next()``, and
+    under asyncio. This is for rendering what a program plays; the loop
+    timings in the Report leave out the skipped passes. A program that
+    changes what it does after some number of passes, rather than after
+    some time, would behave differently.
+    """
+
+    def __init__(
+        self,
+        timeline,
+        revision=5,
+        cpu_scale=1.0,
+        clock_step_ns=None,
+        root=ROOT_DIR,
+        seed=0,
+        flash_seek_ns=500_000,
+        flash_bytes_per_s=1_000_000,
+        gc_collect_ns=4_000_000,
+        heap_size=32_768,
+        alloc_bytes_per_s=0,
+        alloc_bytes_per_play=0,
+        profile=False,
+        capture_audio=False,
+        adc_calibration=None,
+        nvm=None,
+        uid=bytes(range(16)),
+        fast_forward=False,
+    ):
+        self.timeline = timeline
+        self.revision = revision
+        self.clock = VirtualClock(cpu_scale, clock_step_ns)
+        self.root = root
+        self.seed = seed
+        self.audio_events = []
+        self.gate_out_events = []
+        self.update_times = []
+        self.update_costs = []
+        self.adc_reads = 0
+        self.underruns = []
+        self.gc_collections = []
+        self.audio_outs = []
+        self.profile = profile
+        self.capture_audio = capture_audio
+        self.profilers = []
+        self.script_globals = None
+        self.flash_seek_ns = flash_seek_ns
+        self.flash_bytes_per_s = flash_bytes_per_s
+        self.gc_collect_ns = gc_collect_ns
+        self.heap_size = heap_size
+        self.alloc_bytes_per_s = alloc_bytes_per_s
+        self.alloc_bytes_per_play = alloc_bytes_per_play
+        self.gc_enabled = True
+        self._collected_ns = 0
+        self._allocated = 0
+        self.clock.background = self._background
+        self._calibration = None
+        self.adc_calibration = adc_calibration
+        self.nvm = bytearray(nvm) if nvm is not None else bytearray(b"\xff" * 256)
+        self.uid = bytes(uid)
+        self._last_streamed = None
+        self._noise = random.Random(seed)
+        self.fast_forward = fast_forward
+        self._edge_times = [t for t, _, _ in timeline.edges()]
+
+    # Called by the fake hardware.
+
+    def read_pin(self, name):
+        now = self.clock.check()
+        if name == "V5":
+            # Pulled low on v5+.
+            return self.revision < 5
+        key = name.lower()
+        if key in self.timeline.inputs:
+            # Inputs are active-low.
+            return not self.timeline.state_at(key, now)
+        return False
+
+    def write_pin(self, name, value):
+        if name == "GATE_OUT":
+            self.gate_out_events.append((self.clock.now_ns(), value))
+
+    def read_adc(self):
+        now = self.clock.check()
+        self.adc_reads += 1
+        voltage = self.timeline.cv_at(now)
+        if self.timeline.cv_noise:
+            voltage += self._noise.gauss(0.0, self.timeline.cv_noise)
+        return self.voltage_to_adc(voltage)
+
+    def collect_garbage(self):
+        now = self.clock.now_ns()
+        self.gc_collections.append(now)
+        self._collected_ns = now + self.gc_collect_ns
+        self._allocated = 0
+        self.clock.stall(self.gc_collect_ns / 1_000_000_000)
+
+    def heap_allocated(self, now=None):
+        if now is None:
+            now = self.clock.now_ns()
+        grown = max(0, now - self._collected_ns) * self.alloc_bytes_per_s
+        allocated = grown // 1_000_000_000 + self._allocated
+        return min(self.heap_size, self.heap_size // 4 + allocated)
+
+    def allocate_for_play(self):
+        # Called by the fakes' play() before they look at the clock. Like a
+        # real allocation, one that doesn't fit sets off a collection right
+        # there, which holds up the play().
+        if not self.alloc_bytes_per_play:
+            return
+        self._allocated += self.alloc_bytes_per_play
+        if self.gc_enabled and self.heap_allocated() >= self.heap_size:
+            self.collect_garbage()
+
+    def _background(self, now, idle):
+        if (
+            self.gc_enabled
+            and (self.alloc_bytes_per_s or self._allocated)
+            and self.heap_allocated(now) >= self.heap_size
+        ):
+            self.collect_garbage()
+        for audio_out in self.audio_outs:
+            stream = audio_out._stream
+            if stream is not None:
+                count = stream.service(now, idle)
+                if count:
+                    self.underruns.extend([now] * count)
+
+    def record_audio(
+        self, kind, time_ns, sample, loop, voice=None, value=None, level=None
+    ):
+        audible_ns = time_ns
+        data = None
+        if kind == "play":
+            audible_ns += self.stream_start_ns(sample)
+            buffer = getattr(sample, "buffer", None)
+            if self.capture_audio and buffer is not None:
+                data = bytes(memoryview(buffer).cast("B"))
+        self.audio_events.append(
+            AudioEvent(
+                kind,
+                time_ns,
+                sample,
+                loop,
+                sample.sample_rate,
+                audible_ns,
+                voice,
+                value,
+                level,
+                data,
+            )
+        )
+
+    def stream_start_ns(self, sample):
+        if not isinstance(sample, hardware.WaveFile):
+            return 0
+        fill = (sample.buffer_size // 2) * 1_000_000_000 // self.flash_bytes_per_s
+        if self._last_streamed is sample:
+            return fill
+        self._last_streamed = sample
+        return self.flash_seek_ns + fill
+
+    def voltage_to_adc(self, voltage):
+        points = self._calibration
+        if voltage <= points[0][0]:
+            code = points[0][1]
+        elif voltage >= points[-1][0]:
+            code = points[-1][1]
+        else:
+            for (v0, c0), (v1, c1) in zip(points, points[1:]):
+                if v0 <= voltage <= v1:
+                    code = c0 + (c1 - c0) * (voltage - v0) / (v1 - v0)
+                    break
+        return min(4095, max(0, int(round(code))))
+
+    # Device filesystem.
+
+    def device_path(self, path):
+        path = os.fspath(path).lstrip("/")
+        # The library is installed in lib/ on the device.
+        if path.startswith("lib/"):
+            return os.path.join(FIRMWARE_DIR, path[len("lib/") :])
+        return os.path.join(self.root, path)
+
+    def open(self, path, *args, **kwargs):
+        # Finding a file and reading its first sector means a seek.
+        self.clock.sleep(self.flash_seek_ns / 1_000_000_000)
+        return open(self.device_path(path), *args, **kwargs)
+
+    def _device_os(self):
+        device_os = types.ModuleType("os")
+        device_os.__dict__.update(vars(os))
+        device_os.getcwd = lambda: "/"
+        device_os.listdir = lambda path="/": os.listdir(self.device_path(path))
+        device_os.stat = lambda path: os.stat(self.device_path(path))
+        device_os.remove = lambda path: os.remove(self.device_path(path))
+        device_os.mkdir = lambda path: os.mkdir(self.device_path(path))
+        device_os.rename = lambda a, b: os.rename(
+            self.device_path(a), self.device_path(b)
+        )
+        return device_os
+
+    def _script_builtins(self):
+        device_os = self._device_os()
+        real_import = builtins.__import__
+
+        def _import(name, *args, **kwargs):
+            if name == "os":
+                return device_os
+            return real_import(name, *args, **kwargs)
+
+        script_builtins = dict(vars(builtins))
+        script_builtins["__import__"] = _import
+        script_builtins["open"] = self.open
+        return script_builtins
+
+    # Installation.
+
+    @contextlib.contextmanager
+    def installed(self):
+        fakes = hardware.build_modules()
+        fakes["time"] = self.clock.time_module()
+        saved = {name: sys.modules.get(name) for name in fakes}
+        saved_policy = asyncio.get_event_loop_policy()
+        self._purge_library()
+        sys.modules.update(fakes)
+        asyncio.set_event_loop_policy(VirtualEventLoopPolicy(self.clock))
+        hardware.activate(self)
+        if FIRMWARE_DIR not in sys.path:
+            sys.path.insert(0, FIRMWARE_DIR)
+
+        try:
+            self._import_library()
+            yield self
+        finally:
+            hardware.activate(None)
+            asyncio.set_event_loop_policy(saved_policy)
+            self._purge_library()
+            for name, module in saved.items():
+                if module is None:
+                    sys.modules.pop(name, None)
+                else:
+                    sys.modules[name] = module
+
+    def _purge_library(self):
+        for name in [name for name in sys.modules if _is_library_module(name)]:
+            del sys.modules[name]
+
+    def _import_library(self):
+        try:
+            package = __import__(LIBRARY)
+        except ImportError as exc:
+            if exc.name == "winterbloom_voltageio":
+                raise RuntimeError(
+                    "The simulator needs winterbloom_voltageio.py on the Python "
+                    "path. Run factory/factory_setup.py publish to download it, "
+                    "or add its directory to PYTHONPATH."
+                ) from exc
+            raise
+
+        for info in pkgutil.iter_modules(package.__path__):
+            module = __import__("{}.{}".format(LIBRARY, info.name), fromlist=["_"])
+            module.open = self.open
+
+        calibration = self.adc_calibration
+        if calibration is None:
+            nominal = sys.modules[LIBRARY + ".calibration"].NOMINAL
+            calibration = nominal[5 if self.revision >= 5 else 4]
+        self._calibration = sorted((v, code) for code, v in calibration.items())
+
+    def _instrument(self, bhb_class):
+        original = bhb_class.update
+        update_costs = self.update_costs
+        update_times = self.update_times
+        clock = self.clock
+        now_ns = clock.now_ns
+        perf_counter_ns = _time.perf_counter_ns
+        fast_forward = self._fast_forward if self.fast_forward else None
+        # The clock's reads when the last update() returned, when it started,
+        # whether it left the CV alone and how many passes in a row have been
+        # idle like that.
+        last = [None, 0, False, 0]
+
+        def update(bhb):
+            # The program went round its loop without looking at anything
+            # since the last update(), so it didn't act on what that saw.
+            # Once a few passes have gone by like that the loop's period is
+            # an idle one and it's safe to skip ahead by it.
+            if last[2] and clock.reads == last[0]:
+                last[3] += 1
+            else:
+                last[3] = 0
+            if fast_forward is not None and last[3] >= 3:
+                fast_forward(bhb, last[1])
+            adc_reads = self.adc_reads
+            since = now_ns()
+            start = perf_counter_ns()
+            result = original(bhb)
+            update_costs.append(perf_counter_ns() - start)
+            update_times.append(now_ns())
+            last[:3] = clock.reads, since, adc_reads == self.adc_reads
+            return result
+
+        bhb_class.update = update
+
+    def _fast_forward(self, bhb, since):
+        # Called before an update() when the program didn't act on the last
+        # one, which started at `since`, see fast_forward in the class
+        # docstring.
+        if (
+            bhb.cv_reader is not None
+            or bhb.gc_budget is not None
+            or bhb._chunked is not None
+            or bhb._next is not None
+        ):
+            return
+        try:
+            asyncio.get_running_loop()
+            return
+        except RuntimeError:
+            pass
+        due = bhb._next_due_ns()
+        if due == 0:
+            return
+        now = self.clock.now_ns()
+        target = self.timeline.duration_ns
+        # An edge after the last update() started may have been missed by it.
+        index = bisect.bisect_left(self._edge_times, since)
+        if index < len(self._edge_times):
+            target = min(target, self._edge_times[index])
+        if due is not None:
+            target = min(target, due)
+        # Skip whole passes of the loop and stop a couple short, so that the
+        # program reads the edge or gets to the scheduled time when it
+        # would have without skipping.
+        # Wait for the loop to settle into taking the same time every pass.
+        times = self.update_times
+        if len(times) < 3:
+            return
+        period = times[-1] - times[-2]
+        if period <= 0 or times[-2] - times[-3] != period:
+            return
+        passes = (target - now) // period - 2
+        if passes > 0:
+            self.clock.skip(passes * period)
+
+    # Running programs.
+
+    def run(self, script):
+        """Runs a program until the timeline ends and returns a Report."""
+        with open(script, "r") as fh:
+            return self.run_source(fh.read(), script)
+
+    def run_source(self, source, filename="<program>"):
+        code = compile(source, filename, "exec")
+
+        with self.installed():
+            bhb_class = sys.modules[LIBRARY + ".bhb"].BigHonkingButton
+            self._instrument(bhb_class)
+            if self.profile:
+                bhb_class.profile_hook = self.profilers.append
+            random.seed(self.seed)
+            self.script_globals = {
+                "__name__": "__main__",
+                "__file__": filename,
+                "__builtins__": self._script_builtins(),
+            }
+            self.clock.end_ns = self.timeline.duration_ns
+            self.clock.reset()
+            try:
+                exec(code, self.script_globals)
+            except SimulationFinished:
+                pass
+            except RuntimeError:
+                # asyncio.run() complains when the loop is stopped early.
+                if not self.clock.finished:
+                    raise
+
+        return Report(filename, self)
+
+
+def example_scripts():
+    return sorted(
+        os.path.join(EXAMPLES_DIR, name)
+        for name in os.listdir(EXAMPLES_DIR)
+        if name.endswith(".py")
+    )
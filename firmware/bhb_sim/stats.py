@@ -0,0 +1,40 @@
+import math
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(math.ceil(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def summarize(values):
+    """Count, mean, spread and the usual percentiles of a list of numbers."""
+    if not values:
+        return {"count": 0}
+    count = len(values)
+    mean = sum(values) / count
+    stddev = math.sqrt(sum((v - mean) ** 2 for v in values) / count)
+    return {
+        "count": count,
+        "mean": mean,
+        "stddev": stddev,
+        "min": min(values),
+        "p50": percentile(values, 50),
+        "p90": percentile(values, 90),
+        "p99": percentile(values, 99),
+        "max": max(values),
+    }
+
+
+def format_ns(value):
+    if value is None:
+        return "-"
+    if value < 0:
+        return "-" + format_ns(-value)
+    if value >= 1_000_000:
+        return "{:.2f}ms".format(value / 1_000_000)
+    if value >= 1_000:
+        return "{:.1f}us".format(value / 1_000)
+    return "{:.0f}ns".format(value)
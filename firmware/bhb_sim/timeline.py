@@ -0,0 +1,180 @@
+import bisect
+import json
+import math
+
+INPUTS = ("button", "gate_in")
+
+_NS = 1_000_000_000
+
+
+def _ns(seconds):
+    return int(round(seconds * _NS))
+
+
+class Transitions:
+    """The scripted state of one digital input over time."""
+
+    def __init__(self, transitions=()):
+        transitions = sorted((_ns(t), bool(state)) for t, state in transitions)
+        self.times = [t for t, _ in transitions]
+        self.states = [state for _, state in transitions]
+
+    def state_at(self, t_ns):
+        index = bisect.bisect_right(self.times, t_ns) - 1
+        if index < 0:
+            return False
+        return self.states[index]
+
+    def edges(self):
+        """Yields (time_ns, state) for every change in state."""
+        last = False
+        for t, state in zip(self.times, self.states):
+            if state != last:
+                yield t, state
+                last = state
+
+    def edges_between(self, start_ns, end_ns):
+        """Edges in the half-open window (start_ns, end_ns]."""
+        return [(t, state) for t, state in self.edges() if start_ns < t <= end_ns]
+
+    @classmethod
+    def pulses(cls, start, period, width, count=None, until=None):
+        if count is None and until is None:
+            raise ValueError("pulses() needs either a count or an end time.")
+        transitions = []
+        index = 0
+        while count is None or index < count:
+            t = start + index * period
+            if until is not None and t >= until:
+                break
+            transitions.append((t, True))
+            transitions.append((t + width, False))
+            index += 1
+        return cls(transitions)
+
+
+class ConstantCV:
+    def __init__(self, voltage=0.0):
+        self.voltage = voltage
+
+    def __call__(self, t):
+        return self.voltage
+
+
+class SineCV:
+    def __init__(self, frequency=1.0, amplitude=1.0, offset=0.0):
+        self.frequency = frequency
+        self.amplitude = amplitude
+        self.offset = offset
+
+    def __call__(self, t):
+        return self.offset + self.amplitude * math.sin(2 * math.pi * self.frequency * t)
+
+
+class PointsCV:
+    """Piecewise-linear CV through a list of (time, voltage) points."""
+
+    def __init__(self, points):
+        points = sorted(points)
+        self.times = [t for t, _ in points]
+        self.voltages = [v for _, v in points]
+
+    def __call__(self, t):
+        index = bisect.bisect_right(self.times, t)
+        if index == 0:
+            return self.voltages[0]
+        if index == len(self.times):
+            return self.voltages[-1]
+        t0, t1 = self.times[index - 1], self.times[index]
+        v0, v1 = self.voltages[index - 1], self.voltages[index]
+        return v0 + (v1 - v0) * (t - t0) / (t1 - t0)
+
+
+_CV_SHAPES = {"constant": ConstantCV, "sine": SineCV}
+
+
+def _cv_from_spec(spec):
+    if callable(spec):
+        return spec
+    if isinstance(spec, (int, float)):
+        return ConstantCV(spec)
+    if isinstance(spec, list):
+        return PointsCV(spec)
+    ((shape, params),) = spec.items()
+    return _CV_SHAPES[shape](**params)
+
+
+def _transitions_from_spec(spec):
+    if isinstance(spec, Transitions):
+        return spec
+    if isinstance(spec, dict):
+        return Transitions.pulses(**spec["pulses"])
+    return Transitions(spec)
+
+
+class Timeline:
+    """A script of what happens at the module's inputs during a simulation.
+
+    Times are in seconds from power-on. Digital inputs are given as lists of
+    ``(time, state)`` transitions or as a ``{"pulses": {...}}`` spec, the CV
+    input as a constant voltage, a list of ``(time, voltage)`` points, a
+    ``{"sine": {...}}`` spec, or any callable taking time in seconds.
+    ``cv_noise`` adds Gaussian noise with that standard deviation in volts to
+    every reading of the CV input.
+    """
+
+    def __init__(self, duration, button=(), gate_in=(), cv=0.0, cv_noise=0.0):
+        self.duration = duration
+        self.inputs = {
+            "button": _transitions_from_spec(button),
+            "gate_in": _transitions_from_spec(gate_in),
+        }
+        self.cv = _cv_from_spec(cv)
+        self.cv_noise = cv_noise
+
+    @property
+    def duration_ns(self):
+        return _ns(self.duration)
+
+    def state_at(self, name, t_ns):
+        return self.inputs[name].state_at(t_ns)
+
+    def cv_at(self, t_ns):
+        return self.cv(t_ns / _NS)
+
+    def edges(self):
+        """All input edges as sorted (time_ns, input name, state) tuples."""
+        return sorted(
+            (t, name, state)
+            for name, transitions in self.inputs.items()
+            for t, state in transitions.edges()
+        )
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            duration=data["duration"],
+            button=data.get("button", ()),
+            gate_in=data.get("gate_in", ()),
+            cv=data.get("cv", 0.0),
+            cv_noise=data.get("cv_noise", 0.0),
+        )
+
+    @classmethod
+    def from_json(cls, path):
+        with open(path, "r") as fh:
+            return cls.from_dict(json.load(fh))
+
+    @classmethod
+    def default(cls, duration=2.0):
+        """Short gate triggers, slower button presses and a wandering CV."""
+        return cls(
+            duration=duration,
+            gate_in=Transitions.pulses(
+                start=0.05, period=0.125, width=0.01, until=duration
+            ),
+            button=Transitions.pulses(
+                start=0.2, period=0.4, width=0.08, until=duration
+            ),
+            cv=SineCV(frequency=0.5, amplitude=2.0),
+        )
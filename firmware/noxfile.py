@@ -1,18 +1,46 @@
 import nox
 
+LINT_FILES = ["noxfile.py", "winterbloom_bhb", "bhb_sim", "benchmarks", "tools"]
+
 
 @nox.session(python="3")
 def blacken(session):
     """Run black code formater."""
     session.install("black==19.3b0", "isort==4.3.21")
-    files = ["noxfile.py", "winterbloom_bhb"]
-    session.run("isort", "--recursive", *files)
-    session.run("black", *files)
+    session.run("isort", "--recursive", *LINT_FILES)
+    session.run("black", *LINT_FILES)
 
 
 @nox.session(python="3")
 def lint(session):
     session.install("flake8==3.7.8", "black==19.3b0")
-    files = ["noxfile.py", "winterbloom_bhb"]
-    session.run("black", "--check", *files)
-    session.run("flake8", *files)
+    session.run("black", "--check", *LINT_FILES)
+    session.run("flake8", *LINT_FILES)
+
+
+@nox.session(python="3")
+def benchmark(session):
+    """Run the examples against the host simulator and report timings."""
+    session.run("python", "benchmarks/examples_latency.py", *session.posargs)
+
+
+@nox.session(python="3")
+def wavetables(session):
+    """Regenerate the oscillator's wavetables and check their spectra."""
+    session.run("python", "tools/make_wavetables.py")
+    session.run("python", "tools/make_wavetables.py", "--check")
+
+
+@nox.session(python="3")
+def render(session):
+    """Render the examples and compare them with tools/golden."""
+    session.install("numpy")
+    session.run(
+        "python", "tools/render.py", "--golden", "tools/golden", *session.posargs
+    )
+
+
+@nox.session(python="3")
+def profile(session):
+    """Profile the examples in the simulator. Pass --compare FILE to diff."""
+    session.run("python", "benchmarks/profile.py", *session.posargs)
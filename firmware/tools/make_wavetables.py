@@ -0,0 +1,199 @@
+"""Generates the band-limited wavetables used by winterbloom_bhb.oscillator.
+
+Each shape gets one single-cycle table per octave. Tables for higher octaves
+are shorter, so that every octave plays back at a similar sample rate, and
+only contain the harmonics that stay below BAND_LIMIT at the top of their
+octave, so nothing aliases. The tables are written as signed 16-bit
+little-endian samples after a small header, see winterbloom_bhb/oscillator.py
+for the layout.
+
+With --check, the shipped file is compared against freshly generated tables
+and every table's spectrum is checked for energy above its band limit.
+
+    python tools/make_wavetables.py
+    python tools/make_wavetables.py --check
+"""
+
+import argparse
+import cmath
+import math
+import os
+import struct
+import sys
+
+FIRMWARE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+DEFAULT_OUTPUT = os.path.join(FIRMWARE_DIR, "winterbloom_bhb", "wavetables.bin")
+
+# Keep these in step with winterbloom_bhb/oscillator.py.
+MAGIC = b"BHWT"
+VERSION = 1
+SHAPES = ("sine", "triangle", "saw", "square")
+HEADER = struct.Struct("<4sBBBxI")
+ENTRY = struct.Struct("<IHxx")
+
+LOWEST_FREQUENCY = 32.703  # C1
+OCTAVES = 9
+BASE_LENGTH = 1024
+MIN_LENGTH = 8
+BAND_LIMIT = 20000
+PEAK = 0.9
+MAX_SAMPLE_RATE = 350000 - 1
+
+
+def table_length(octave):
+    return max(BASE_LENGTH >> octave, MIN_LENGTH)
+
+
+def harmonic_count(octave):
+    top = LOWEST_FREQUENCY * 2 ** (octave + 1)
+    return max(1, min(int(BAND_LIMIT // top), table_length(octave) // 2 - 1))
+
+
+def _partials(shape, harmonics):
+    # (harmonic, amplitude) pairs of each shape's Fourier series.
+    if shape == "sine":
+        return [(1, 1.0)]
+    if shape == "saw":
+        return [(n, (-1) ** (n + 1) / n) for n in range(1, harmonics + 1)]
+    if shape == "square":
+        return [(n, 1 / n) for n in range(1, harmonics + 1, 2)]
+    if shape == "triangle":
+        return [
+            (n, (-1) ** ((n - 1) // 2) / (n * n)) for n in range(1, harmonics + 1, 2)
+        ]
+    raise ValueError("Unknown shape {}".format(shape))
+
+
+def make_table(shape, octave):
+    length = table_length(octave)
+    harmonics = harmonic_count(octave)
+    partials = []
+    for n, amplitude in _partials(shape, harmonics):
+        # Lanczos sigma factors tame the ringing from cutting off the series.
+        x = math.pi * n / (harmonics + 1)
+        sigma = math.sin(x) / x if harmonics > 1 else 1.0
+        partials.append((n, amplitude * sigma))
+
+    values = [
+        sum(a * math.sin(2 * math.pi * n * i / length) for n, a in partials)
+        for i in range(length)
+    ]
+    scale = PEAK * 32767 / max(abs(v) for v in values)
+    return [int(round(v * scale)) for v in values]
+
+
+def generate():
+    """Returns the contents of the wavetable file."""
+    tables = [
+        make_table(shape, octave) for shape in SHAPES for octave in range(OCTAVES)
+    ]
+    header = HEADER.pack(
+        MAGIC, VERSION, len(SHAPES), OCTAVES, int(round(LOWEST_FREQUENCY * 1000))
+    )
+    offset = HEADER.size + ENTRY.size * len(tables)
+    directory = b""
+    for table in tables:
+        directory += ENTRY.pack(offset, len(table))
+        offset += len(table) * 2
+    data = b"".join(struct.pack("<{}h".format(len(table)), *table) for table in tables)
+    return header + directory + data
+
+
+def read(contents):
+    """Parses a wavetable file into {(shape, octave): [samples]}."""
+    magic, version, shape_count, octaves, _ = HEADER.unpack_from(contents, 0)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("Not a version {} wavetable file".format(VERSION))
+    tables = {}
+    for index in range(shape_count * octaves):
+        offset, length = ENTRY.unpack_from(contents, HEADER.size + ENTRY.size * index)
+        samples = struct.unpack_from("<{}h".format(length), contents, offset)
+        tables[(SHAPES[index // octaves], index % octaves)] = list(samples)
+    return tables
+
+
+def _fft(values):
+    count = len(values)
+    if count == 1:
+        return [complex(values[0])]
+    even = _fft(values[0::2])
+    odd = _fft(values[1::2])
+    result = [0j] * count
+    for k in range(count // 2):
+        twiddle = cmath.exp(-2j * math.pi * k / count) * odd[k]
+        result[k] = even[k] + twiddle
+        result[k + count // 2] = even[k] - twiddle
+    return result
+
+
+def check_spectrum(shape, octave, samples):
+    """Returns (worst out-of-band level in dB, highest frequency in Hz).
+
+    The level is relative to the strongest harmonic, and the frequency is
+    that of the highest harmonic that's meant to be present when the table
+    plays at the top of its octave.
+    """
+    length = len(samples)
+    magnitudes = [abs(value) for value in _fft(samples)[: length // 2]]
+    allowed = max(n for n, _ in _partials(shape, harmonic_count(octave)))
+    peak = max(magnitudes)
+    leak = max(magnitudes[allowed + 1 :] or [0.0])
+    level = 20 * math.log10(max(leak, 1e-9) / peak)
+    top = LOWEST_FREQUENCY * 2 ** (octave + 1)
+    return level, allowed * top
+
+
+def check(path, max_leak_db):
+    with open(path, "rb") as fh:
+        contents = fh.read()
+
+    problems = 0
+    if contents != generate():
+        print("{} is out of date, run this script without --check.".format(path))
+        problems += 1
+
+    print(
+        "{:<9} {:>6} {:>6} {:>9} {:>9} {:>12} {:>10}".format(
+            "shape", "octave", "length", "harmonics", "rate max", "top partial", "leak"
+        )
+    )
+    for (shape, octave), samples in sorted(read(contents).items()):
+        level, highest = check_spectrum(shape, octave, samples)
+        rate = int(LOWEST_FREQUENCY * 2 ** (octave + 1) * len(samples))
+        ok = level <= max_leak_db and highest <= BAND_LIMIT and rate <= MAX_SAMPLE_RATE
+        problems += not ok
+        print(
+            "{:<9} {:>6} {:>6} {:>9} {:>9} {:>10.0f}Hz {:>8.1f}dB{}".format(
+                shape,
+                octave,
+                len(samples),
+                harmonic_count(octave),
+                rate,
+                highest,
+                level,
+                "" if ok else "  <--",
+            )
+        )
+
+    print("{} bytes, {} problem(s)".format(len(contents), problems))
+    return problems == 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--output", default=DEFAULT_OUTPUT)
+    parser.add_argument("--check", action="store_true")
+    parser.add_argument("--max-leak-db", type=float, default=-60.0)
+    args = parser.parse_args()
+
+    if args.check:
+        sys.exit(0 if check(args.output, args.max_leak_db) else 1)
+
+    contents = generate()
+    with open(args.output, "wb") as fh:
+        fh.write(contents)
+    print("Wrote {} bytes to {}".format(len(contents), args.output))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""Renders a program's audio and gate output to a WAV file without a module.
+
+The program runs in the host simulator against a timeline of button, gate
+and CV input, see bhb_sim/timeline.py for the JSON format, and what it
+plays is rendered with bhb_sim.render. Samples are loaded from --root,
+which stands in for the CIRCUITPY drive. Simulated time moves on by
+--step-us on every call into the hardware, so the output is the same from
+run to run and isn't held up by the host's own pauses. Stretches where the
+program's loop only waits for the next input are skipped over, see
+Simulator's fast_forward, unless --no-fast-forward is given.
+
+The WAV file has HONK OUT on the left channel and GATE OUT on the right.
+With --golden, a compact fingerprint of the output (gate edges, plays and
+the level every 10ms) is compared against a saved one and the differences
+are listed, exiting with 1 if there are any. --update saves it instead.
+Given a directory, --golden checks every example that has a file there.
+
+This needs NumPy.
+
+    python tools/render.py ../examples/default.py --timeline t.json --out out.wav
+    python tools/render.py --golden tools/golden --update
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from bhb_sim import Simulator, Timeline, example_scripts  # noqa: E402
+from bhb_sim.render import (  # noqa: E402
+    compare_fingerprints,
+    load_fingerprint,
+    render,
+    save_fingerprint,
+)
+from bhb_sim.simulator import ROOT_DIR  # noqa: E402
+
+GOLDEN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "golden")
+
+
+def run(script, timeline, args):
+    simulator = Simulator(
+        timeline,
+        revision=args.revision,
+        clock_step_ns=int(args.step_us * 1000),
+        root=args.root,
+        seed=args.seed,
+        capture_audio=True,
+        fast_forward=args.fast_forward,
+    )
+    start = time.perf_counter()
+    simulator.run(script)
+    simulated = time.perf_counter() - start
+    start = time.perf_counter()
+    rendering = render(simulator, output_rate=args.rate, dac_bits=args.dac_bits)
+    mixed = time.perf_counter() - start
+    return rendering, simulated, mixed
+
+
+def check(script, golden, timeline, args):
+    name = os.path.splitext(os.path.basename(script))[0]
+    rendering, simulated, mixed = run(script, timeline, args)
+    fingerprint = rendering.fingerprint()
+    if args.update:
+        save_fingerprint(fingerprint, golden)
+        print("{:<14} saved {}".format(name, os.path.relpath(golden)))
+        return True
+    problems = compare_fingerprints(
+        load_fingerprint(golden),
+        fingerprint,
+        time_tolerance_ms=args.time_tolerance,
+        level_tolerance=args.level_tolerance,
+    )
+    print("{:<14} {}".format(name, "FAILED" if problems else "ok"))
+    for problem in problems:
+        print("    " + problem)
+    return not problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("script", nargs="?", help="Program to render.")
+    parser.add_argument("--timeline", help="Timeline JSON file to use.")
+    parser.add_argument(
+        "--duration",
+        type=float,
+        default=2.0,
+        help="Length of the default timeline when --timeline isn't given.",
+    )
+    parser.add_argument("--root", default=ROOT_DIR, help="Stands in for CIRCUITPY.")
+    parser.add_argument("--out", help="WAV file to write.")
+    parser.add_argument("--golden", help="Fingerprint file or directory.")
+    parser.add_argument("--update", action="store_true")
+    parser.add_argument("--rate", type=int, default=44100)
+    parser.add_argument("--dac-bits", type=int, default=10)
+    parser.add_argument("--step-us", type=float, default=50.0)
+    parser.add_argument("--revision", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--no-fast-forward",
+        dest="fast_forward",
+        action="store_false",
+        help="Run every pass of the program's loop.",
+    )
+    parser.add_argument("--time-tolerance", type=float, default=0.1, help="ms")
+    parser.add_argument(
+        "--level-tolerance", type=int, default=1, help="Thousandths of full scale."
+    )
+    args = parser.parse_args()
+
+    if args.timeline:
+        timeline = Timeline.from_json(args.timeline)
+    else:
+        timeline = Timeline.default(args.duration)
+
+    if args.golden and os.path.isdir(args.golden):
+        if args.script:
+            parser.error("Pass either a script or a directory of golden files.")
+        passed = True
+        for script in example_scripts():
+            name = os.path.splitext(os.path.basename(script))[0]
+            golden = os.path.join(args.golden, name + ".json")
+            if os.path.exists(golden):
+                passed = check(script, golden, timeline, args) and passed
+        sys.exit(0 if passed else 1)
+
+    if not args.script:
+        parser.error("A script is needed unless --golden is a directory.")
+    if args.golden:
+        sys.exit(0 if check(args.script, args.golden, timeline, args) else 1)
+
+    rendering, simulated, mixed = run(args.script, timeline, args)
+    print(
+        "Rendered {:.1f}s: simulation took {:.2f}s, mixing {:.3f}s".format(
+            rendering.duration, simulated, mixed
+        )
+    )
+    if args.out:
+        rendering.write_wav(args.out)
+
+
+if __name__ == "__main__":
+    main()
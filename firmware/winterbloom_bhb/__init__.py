@@ -21,5 +21,6 @@
 # THE SOFTWARE.
 
 from winterbloom_bhb.bhb import BigHonkingButton
+from winterbloom_bhb.samples import SampleBank
 
-__all__ = ["BigHonkingButton"]
+__all__ = ["BigHonkingButton", "SampleBank"]
@@ -0,0 +1,131 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2020 Alethea Flowers for Winterbloom
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+
+# asyncio support for BigHonkingButton.
+#
+# This is imported the first time one of the async methods on
+# BigHonkingButton is used, so programs that stick with the regular update()
+# loop don't pay for it. A single background task calls update() and wakes
+# up anything waiting on a trigger or release.
+#
+# Between calls the task sleeps until whatever update() next has to do at a
+# set time, such as a scheduled event or the end of a gate pulse, but never
+# longer than bhb.async_interval, since the inputs still have to be checked.
+# That lets the CPU idle between checks instead of spinning.
+
+import asyncio
+import time
+
+from winterbloom_bhb.samples import DeferredSample
+
+
+class _CVStream:
+    # An async iterator over the pitch CV input. MicroPython doesn't support
+    # async generators, hence the class.
+
+    def __init__(self, bhb, interval, threshold):
+        self._bhb = bhb
+        self._interval = interval
+        self._threshold = threshold
+        self._last = None
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        while True:
+            await asyncio.sleep(self._interval)
+            voltage = self._bhb.pitch_in
+            if self._last is None or abs(voltage - self._last) >= self._threshold:
+                self._last = voltage
+                return voltage
+
+
+class AsyncRunner:
+    def __init__(self, bhb):
+        self._bhb = bhb
+        self._triggered = asyncio.Event()
+        self._released = asyncio.Event()
+        self._task = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def run(self):
+        bhb = self._bhb
+        triggered = self._triggered
+        released = self._released
+
+        while bhb.update():
+            # Setting and immediately clearing wakes up everything that's
+            # currently waiting without leaving the event set for later.
+            if bhb.triggered:
+                triggered.set()
+                triggered.clear()
+            if bhb.released:
+                released.set()
+                released.clear()
+            await asyncio.sleep(self._delay())
+
+    def _delay(self):
+        # Seconds until update() is next needed.
+        bhb = self._bhb
+        interval = bhb.async_interval
+        due = bhb._next_due_ns()
+        if due is None:
+            return interval
+        wait = (due - time.monotonic_ns()) / 1000000000
+        if wait <= 0:
+            return 0
+        return wait if wait < interval else interval
+
+    async def wait_triggered(self):
+        self.start()
+        await self._triggered.wait()
+
+    async def wait_released(self):
+        self.start()
+        await self._released.wait()
+
+    async def play(self, sample, pitch_cv=None, loop=False):
+        self.start()
+        bhb = self._bhb
+        voice = bhb.play(sample, pitch_cv=pitch_cv, loop=loop)
+
+        # Finishes when the sample ends, is stopped or something else is
+        # played in its place.
+        if voice is not None:
+            # The voice holds the sample play() opened, not the
+            # DeferredSample it was given.
+            if isinstance(sample, DeferredSample):
+                sample = sample.sample
+            while voice.playing and voice.sample is sample:
+                await asyncio.sleep(bhb.async_interval)
+        else:
+            # _current is what play() was given, so it's compared as is.
+            while bhb.audio_out.playing and bhb._current is sample:
+                await asyncio.sleep(bhb.async_interval)
+
+    def cv_stream(self, interval, threshold):
+        return _CVStream(self._bhb, interval, threshold)
@@ -20,12 +20,20 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 # THE SOFTWARE.
 
-import audiocore
+import time
+
 import audioio
 import board
 import digitalio
 import winterbloom_voltageio
 
+from winterbloom_bhb.calibration import NOMINAL
+from winterbloom_bhb.calibration import load as _load_calibration
+from winterbloom_bhb.chunked import ChunkedSample
+from winterbloom_bhb.pitch import MAX_SAMPLE_RATE, PitchTable
+from winterbloom_bhb.samples import DeferredSample, open_wave
+from winterbloom_bhb.scheduler import Scheduler
+
 try:
     import _bhb
 except ImportError:
@@ -54,63 +62,286 @@ class _AnalogIn:
 
 
 class _InputState:
+    # Everything is worked out once in update() and stored in plain
+    # attributes, so checking `pressed` in the loop is an attribute lookup
+    # rather than a call. The aliases are kept in step by assigning them
+    # together.
+    __slots__ = (
+        "_in",
+        "state",
+        "last_state",
+        "value",
+        "held",
+        "rising_edge",
+        "pressed",
+        "triggered",
+        "falling_edge",
+        "released",
+    )
+
+    # Only set when edge capture is enabled, see edges.py.
+    edge_time = None
+    pending = 0
+
     def __init__(self, pin):
         self._in = digitalio.DigitalInOut(pin)
         self._in.switch_to_input(pull=digitalio.Pull.UP)
-        self.state = False
+        self.state = self.value = self.held = False
         self.last_state = False
+        self.rising_edge = self.pressed = self.triggered = False
+        self.falling_edge = self.released = False
 
     def update(self):
-        self.last_state = self.state
-        self.state = not self._in.value
-
-    @property
-    def rising_edge(self):
-        return self.state and not self.last_state
+        last_state = self.state
+        state = not self._in.value
+        self.last_state = last_state
+        self.state = self.value = self.held = state
+        self.rising_edge = self.pressed = self.triggered = state and not last_state
+        self.falling_edge = self.released = last_state and not state
+
+    def __bool__(self):
+        return self.state
 
-    @property
-    def falling_edge(self):
-        return not self.state and self.last_state
 
-    @property
-    def value(self):
-        return self.state
+class BigHonkingButton:
+    # Called with (phase name, duration in ns) as each part of setting up the
+    # module finishes, including parts that are put off with lazy=True. The
+    # same information is kept in boot_phases.
+    boot_hook = None
+
+    # Called with the Profiler of every BigHonkingButton made after it's set,
+    # which turns profiling on for all of them. This is how the simulator
+    # profiles programs without editing them.
+    profile_hook = None
+
+    # The longest the asyncio task that calls update() sleeps between calls,
+    # in seconds, see aio.py. Shorter answers triggers sooner, longer lets
+    # the CPU idle more.
+    async_interval = 0.001
+
+    def __init__(
+        self,
+        edge_capture=False,
+        voices=1,
+        voice_stealing="oldest",
+        declick=0,
+        cv_samples=0,
+        lazy=False,
+        profile=False,
+        gc_idle_ms=0,
+        tempo_taps=0,
+        calibration=True,
+    ):
+        self.boot_phases = []
+        start = time.monotonic_ns()
+
+        # The unit's own calibration from the factory, see calibration.py.
+        # It includes the board revision, so there's no need to check the
+        # revision pin when there is one.
+        stored = None
+        if calibration:
+            stored = _load_calibration()
+        if stored is not None:
+            self.board_revision = stored.revision
+            start = self._boot_phase("calibration", start)
+        else:
+            self.board_revision = _detect_board_revision()
+            start = self._boot_phase("revision", start)
 
-    pressed = rising_edge
-    triggered = rising_edge
-    released = falling_edge
-    held = value
-    __bool__ = value
+        if edge_capture:
+            from winterbloom_bhb.edges import EdgeCapture
 
+            self._edges = EdgeCapture((board.BUTTON, board.GATE_IN))
+            self._button, self._gate_in = self._edges.inputs
+        else:
+            self._edges = None
+            self._button = _InputState(board.BUTTON)
+            self._gate_in = _InputState(board.GATE_IN)
 
-class BigHonkingButton:
-    def __init__(self):
-        self.board_revision = _detect_board_revision()
-        self._button = _InputState(board.BUTTON)
-        self._gate_in = _InputState(board.GATE_IN)
         self._gate_out = digitalio.DigitalInOut(board.GATE_OUT)
         self._gate_out.switch_to_output()
-
-        self._pitch_in = winterbloom_voltageio.VoltageIn(_AnalogIn())
+        start = self._boot_phase("inputs", start)
 
         if self.board_revision >= 5:
-            self._pitch_in.direct_calibration(
-                {4068: -5.0, 3049: -2.5, 2025: 0, 1001: 2.5, 8: 5.0}
-            )
+            self._calibration = NOMINAL[5]
             self.min_cv = -5.0
             self.max_cv = 5.0
         else:
-            self._pitch_in.direct_calibration(
-                {4068: -2.0, 3049: -1.0, 2025: 0, 1001: 1.0, 8: 2.0}
-            )
+            self._calibration = NOMINAL[4]
             self.min_cv = -2.0
             self.max_cv = 2.0
+        if stored is not None:
+            self._calibration = stored.points
+        # "nvm" or "file" for the unit's own calibration, "default" for the
+        # nominal tables in calibration.py.
+        self.calibration_source = "default" if stored is None else stored.source
+
+        self._base_sample_rate = 44100
+        self._pitch_table = PitchTable(self._calibration, self._base_sample_rate)
+
+        # With lazy=True the ADC and the audio output are set up the first
+        # time they're used, so that the loop can start watching the inputs
+        # sooner. The first trigger pays for it instead.
+        self._analog_in = None
+        self._pitch_in = None
+        if not lazy or cv_samples:
+            start = self._init_adc()
+
+        if cv_samples:
+            from winterbloom_bhb.cv import CVReader
+
+            # Reads the CV input once per update() instead of on every access
+            # to pitch_in, see cv.py for its filter and hysteresis settings.
+            self.cv_reader = CVReader(self._analog_in, self._calibration, cv_samples)
+            start = self._boot_phase("cv", start)
+        else:
+            self.cv_reader = None
+
+        if tempo_taps:
+            from winterbloom_bhb.tempo import Tempo
+
+            # Follows the tempo of taps on the button or a clock on the gate
+            # input, see tempo.py. Check bhb.tempo.ticked in the loop.
+            self.tempo = Tempo(tempo_taps)
+        else:
+            self.tempo = None
 
-        self.audio_out = audioio.AudioOut(board.HONK_OUT)
+        self._audio_out = None
+        if not lazy or voices > 1 or declick:
+            start = self._init_audio()
+
+        if voices > 1:
+            from winterbloom_bhb.voices import VoiceAllocator
+
+            self._voices = VoiceAllocator(
+                self._audio_out,
+                voices,
+                stealing=voice_stealing,
+                sample_rate=self._base_sample_rate,
+            )
+            start = self._boot_phase("voices", start)
+        else:
+            self._voices = None
+
+        if declick:
+            if self._voices is not None:
+                raise ValueError("declick isn't available when using voices")
+            from winterbloom_bhb.declick import Declicker
+
+            # Pass this to SampleBank(declicker=...) so that its samples get
+            # crossfaded when retriggered.
+            self.declicker = Declicker(self._audio_out, declick)
+            start = self._boot_phase("declick", start)
+        else:
+            self.declicker = None
+
+        # The buffer in bytes for samples from load_sample(), None for
+        # CircuitPython's default. See samples.py.
+        self.stream_buffer_size = None
+
+        if gc_idle_ms:
+            from winterbloom_bhb.gcbudget import GCBudget
+
+            # Collects garbage only once the module has been quiet for this
+            # long, see gcbudget.py.
+            self.gc_budget = GCBudget(gc_idle_ms)
+        else:
+            self.gc_budget = None
+
+        # Worked out once per update() so that checking them in the loop is
+        # cheap.
+        self.triggered = False
+        self.released = False
+
+        self.scheduler = Scheduler()
+        self._next = None
+        self._current = None
+        self._chunked = None
+        self._async = None
+        self._gate_pulses = None
+        self._deferred = []
+        self._background = []
+
+        if profile or BigHonkingButton.profile_hook is not None:
+            from winterbloom_bhb.profiler import Profiler
+
+            # Times update(), play(), stop(), pitch_in and the loop, see
+            # profiler.py. Use bhb.profiler.print_report() to see the results.
+            self.profiler = Profiler()
+            self.profiler.attach(self)
+            if BigHonkingButton.profile_hook is not None:
+                BigHonkingButton.profile_hook(self.profiler)
+        else:
+            self.profiler = None
+
+    def _boot_phase(self, name, start):
+        now = time.monotonic_ns()
+        self.boot_phases.append((name, now - start))
+        if BigHonkingButton.boot_hook is not None:
+            BigHonkingButton.boot_hook(name, now - start)
+        return now
+
+    def _init_adc(self):
+        start = time.monotonic_ns()
+        self._analog_in = _AnalogIn()
+        self._pitch_in = winterbloom_voltageio.VoltageIn(self._analog_in)
+        self._pitch_in.direct_calibration(self._calibration)
+        return self._boot_phase("adc", start)
+
+    def _init_audio(self):
+        start = time.monotonic_ns()
+        self._audio_out = audioio.AudioOut(board.HONK_OUT)
+        return self._boot_phase("audio", start)
+
+    def print_boot_report(self):
+        total = 0
+        for name, duration in self.boot_phases:
+            total += duration
+            print("{:<32} {:>8.2f}ms".format(name, duration / 1000000))
+        print("{:<32} {:>8.2f}ms".format("total", total / 1000000))
 
     def update(self):
-        self._gate_in.update()
-        self._button.update()
+        if self._edges is not None:
+            self._edges.update()
+        else:
+            self._gate_in.update()
+            self._button.update()
+        button = self._button
+        gate_in = self._gate_in
+        self.triggered = button.triggered or gate_in.triggered
+        self.released = button.released or gate_in.released
+
+        if self.tempo is not None:
+            self.tempo.update(button, gate_in)
+
+        if self.cv_reader is not None:
+            self.cv_reader.update()
+
+        if self.scheduler._times:
+            self.scheduler.run()
+
+        if self._gate_pulses is not None and self._gate_pulses._times:
+            self._gate_pulses.update()
+
+        if self.declicker is not None and self.declicker._restore is not None:
+            self.declicker.update()
+
+        if self._chunked is not None and not self._chunked.update():
+            self._chunked = None
+
+        if self._next is not None and not self.playing:
+            sample, pitch_cv, loop = self._next
+            self.play(sample, pitch_cv=pitch_cv, loop=loop)
+
+        if self._deferred:
+            self._load_deferred()
+
+        if self._background:
+            self._run_background()
+
+        if self.gc_budget is not None:
+            self.gc_budget.update(self.triggered or self.released or self.playing)
+
         return True
 
     @property
@@ -123,8 +354,62 @@ class BigHonkingButton:
 
     @property
     def pitch_in(self):
+        # Volts, as a float, which existing programs rely on. The integer
+        # path for triggers is pitch_in_raw with play(pitch_raw=...), which
+        # looks the sample rate up in the precomputed pitch table.
+        if self.cv_reader is not None:
+            return self.cv_reader.voltage
+        if self._pitch_in is None:
+            self._init_adc()
         return self._pitch_in.voltage
 
+    @property
+    def pitch_in_raw(self):
+        # The uncalibrated 12-bit ADC code, for use with play(pitch_raw=...).
+        if self.cv_reader is not None:
+            return self.cv_reader.code
+        if self._analog_in is None:
+            self._init_adc()
+        return self._analog_in.value
+
+    @property
+    def cv_changed(self):
+        # Whether pitch_in moved during the last update(), only available
+        # with cv_samples since without them the CV isn't read in update().
+        if self.cv_reader is None:
+            raise RuntimeError(
+                "cv_changed needs BigHonkingButton(cv_samples=...) to be set"
+            )
+        return self.cv_reader.changed
+
+    @property
+    def pitch_table(self):
+        # Built the first time it's used, access it before your loop starts
+        # to avoid the delay on the first trigger.
+        table = self._pitch_table
+        if not table.built:
+            table.build()
+        return table
+
+    @property
+    def base_sample_rate(self):
+        return self._base_sample_rate
+
+    @base_sample_rate.setter
+    def base_sample_rate(self, value):
+        self._base_sample_rate = value
+        self._pitch_table.base_sample_rate = value
+        self._pitch_table.invalidate()
+
+    def set_pitch_calibration(self, calibration):
+        self._calibration = calibration
+        if self._pitch_in is not None:
+            self._pitch_in.direct_calibration(calibration)
+        if self.cv_reader is not None:
+            self.cv_reader.calibrate(calibration)
+        self._pitch_table.calibration = calibration
+        self._pitch_table.invalidate()
+
     @property
     def gate_out(self):
         return self._gate_out.value
@@ -134,25 +419,238 @@ class BigHonkingButton:
         self._gate_out.value = value
 
     @property
-    def triggered(self):
-        return self._button.triggered or self._gate_in.triggered
+    def trigger_time(self):
+        # The supervisor.ticks_ms() timestamp of the edge behind `triggered`,
+        # only available with edge_capture=True.
+        if self._gate_in.triggered:
+            return self._gate_in.edge_time
+        if self._button.triggered:
+            return self._button.edge_time
+        return None
+
+    def load_sample(self, path, deferred=False, buffer_size=None):
+        # Deferred samples are opened in the background, one per update(),
+        # or when they're first played if that comes sooner. buffer_size
+        # defaults to stream_buffer_size.
+        if buffer_size is None:
+            buffer_size = self.stream_buffer_size
+        if deferred:
+            sample = DeferredSample(path, buffer_size)
+            self._deferred.append(sample)
+            return sample
+        return open_wave(path, buffer_size)
+
+    def load_sliced(self, path):
+        # Reads the whole sample into RAM and cuts it into regions that
+        # share its memory, see slices.py.
+        from winterbloom_bhb.slices import SlicedSample
+
+        return SlicedSample(path)
+
+    def run_in_background(self, callback):
+        # Calls callback from every update() until it returns False. Handing
+        # over the same callback again while it's still running does nothing.
+        if callback not in self._background:
+            self._background.append(callback)
+
+    def _run_background(self):
+        background = self._background
+        index = 0
+        while index < len(background):
+            if background[index]():
+                index += 1
+            else:
+                background.pop(index)
+
+    def _load_deferred(self):
+        sample = self._deferred.pop(0)
+        if sample.loaded:
+            return
+        start = time.monotonic_ns()
+        sample.load()
+        self._boot_phase("load " + sample.path, start)
 
     @property
-    def released(self):
-        return self._button.released or self._gate_in.released
-
-    def load_sample(self, path):
-        return audiocore.WaveFile(open(path, "rb"))
+    def audio_out(self):
+        if self._audio_out is None:
+            self._init_audio()
+        return self._audio_out
 
-    def play(self, sample, pitch_cv=None, loop=False):
-        if pitch_cv is not None:
-            sample_rate = min(int(44100 * pow(2, pitch_cv)), (350000 - 1))
+    @property
+    def playing(self):
+        if self._voices is not None:
+            return self._voices.playing
+        if self._audio_out is None:
+            return False
+        return self._audio_out.playing
+
+    def play(self, sample, pitch_cv=None, loop=False, pitch_raw=None, level=None):
+        self._next = None
+        self._current = sample
+        self._stop_chunked()
+        if isinstance(sample, DeferredSample):
+            sample = sample.load()
+        chunked = None
+        if isinstance(sample, ChunkedSample):
+            chunked = sample
+            sample = chunked.sample
+
+        if self._voices is not None:
+            if chunked is not None:
+                raise ValueError("Chunked samples can't be played with voices")
+            if pitch_cv is not None or pitch_raw is not None:
+                raise ValueError("Samples can't be re-pitched when using voices")
+            # Returns the Voice that's playing the sample.
+            return self._voices.play(sample, loop=loop, level=level)
+        if level is not None:
+            raise ValueError("level is only available when using voices")
+
+        if pitch_raw is not None:
+            sample.sample_rate = self._pitch_table.sample_rate(pitch_raw)
+        elif pitch_cv is not None:
+            sample_rate = min(
+                int(self._base_sample_rate * pow(2, pitch_cv)), MAX_SAMPLE_RATE
+            )
             sample.sample_rate = sample_rate
+        if chunked is not None:
+            if self.declicker is not None:
+                self.declicker.stop()
+            chunked.start(self.audio_out, loop=loop)
+            self._chunked = chunked
+            return
+        if self.declicker is not None:
+            self.declicker.play(sample, loop=loop)
+            return
         self.audio_out.stop()
         self.audio_out.play(sample, loop=loop)
 
+    def _stop_chunked(self):
+        # Lets a ChunkedSample know it's no longer playing, so that its
+        # playing property is right and it lets go of the audio output.
+        if self._chunked is not None:
+            self._chunked.stop()
+            self._chunked = None
+
     def stop(self):
-        self.audio_out.stop()
+        self._next = None
+        self._current = None
+        self._stop_chunked()
+        if self._voices is not None:
+            self._voices.stop()
+        elif self.declicker is not None:
+            self.declicker.stop()
+        elif self._audio_out is not None:
+            self._audio_out.stop()
+
+    def play_next(self, sample, pitch_cv=None, loop=False):
+        # Plays the sample once the current one finishes. Calling play() or
+        # stop() before then cancels it.
+        self._next = (sample, pitch_cv, loop)
+
+    def play_later(self, delay, sample, pitch_cv=None, loop=False):
+        self.scheduler.call_later(delay, self.play, sample, pitch_cv, loop)
+
+    def stop_later(self, delay):
+        self.scheduler.call_later(delay, self.stop)
+
+    def gate_out_later(self, delay, value):
+        self.scheduler.call_later(delay, self._set_gate_out, value)
+
+    def call_later(self, delay, callback, *args):
+        self.scheduler.call_later(delay, callback, *args)
+
+    def cancel_scheduled(self):
+        self.scheduler.clear()
+        self._next = None
+
+    def _set_gate_out(self, value):
+        self._gate_out.value = value
+
+    @property
+    def gate_pulses(self):
+        # Made the first time it's used, see pulses.py.
+        if self._gate_pulses is None:
+            from winterbloom_bhb.pulses import GatePulses
+
+            self._gate_pulses = GatePulses(self._gate_out)
+        return self._gate_pulses
+
+    def pulse(self, width_ms=10, delay_ms=0):
+        # A pulse on the gate output exactly `width_ms` long, starting after
+        # `delay_ms`. Doesn't wait for it to finish.
+        self.gate_pulses.pulse(width_ms, delay_ms)
+
+    def ratchet(self, count, interval_ms, width_ms=None, delay_ms=0):
+        self.gate_pulses.ratchet(count, interval_ms, width_ms, delay_ms)
+
+    def burst(self, pattern, step_ms, width_ms=None, delay_ms=0):
+        self.gate_pulses.burst(pattern, step_ms, width_ms, delay_ms)
+
+    def _next_due_ns(self):
+        # When update() next has something to do at a set time, in
+        # time.monotonic_ns(). 0 if it has work waiting now, None if nothing
+        # is scheduled.
+        if self._deferred or self._background:
+            return 0
+        due = None
+        if self.scheduler._times:
+            due = self.scheduler._times[0]
+        if self._gate_pulses is not None and self._gate_pulses._times:
+            when = self._gate_pulses._times[0]
+            if due is None or when < due:
+                due = when
+        if self.declicker is not None and self.declicker._restore is not None:
+            when = time.monotonic_ns() + self.declicker.restore_in_ms() * 1000000
+            if due is None or when < due:
+                due = when
+        if self.tempo is not None:
+            when = self.tempo.next_tick_ns
+            if due is None or when < due:
+                due = when
+        return due
+
+    def _async_runner(self):
+        if self._async is None:
+            from winterbloom_bhb.aio import AsyncRunner
+
+            self._async = AsyncRunner(self)
+        return self._async
+
+    def wait_triggered(self):
+        # These return coroutines, use them with `await` from asyncio tasks.
+        # The first one used starts a background task that calls update().
+        return self._async_runner().wait_triggered()
+
+    def wait_released(self):
+        return self._async_runner().wait_released()
+
+    def play_async(self, sample, pitch_cv=None, loop=False):
+        return self._async_runner().play(sample, pitch_cv=pitch_cv, loop=loop)
+
+    def cv_stream(self, interval=0.01, threshold=0.01):
+        return self._async_runner().cv_stream(interval, threshold)
+
+    def cv_selector(
+        self, items, low=None, high=None, weights=None, scale=None, hysteresis=0.0
+    ):
+        # Makes a CVSelector for this module's CV range and calibration, use
+        # it with selector.select(bhb.pitch_in_raw). Make it again after
+        # changing the calibration.
+        from winterbloom_bhb.selector import CVSelector
+
+        if low is None:
+            low = self.min_cv
+        if high is None:
+            high = self.max_cv
+        return CVSelector(
+            items,
+            self._pitch_table.calibration,
+            low=low,
+            high=high,
+            weights=weights,
+            scale=scale,
+            hysteresis=hysteresis,
+        )
 
     def select_from_list_using_cv(self, list, cv, low=None, high=None):
         if low is None:
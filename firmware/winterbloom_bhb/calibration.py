@@ -0,0 +1,181 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2020 Alethea Flowers for Winterbloom
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+# Per-unit calibration of the pitch CV input.
+#
+# Every module's ADC reads a little differently, so the factory measures
+# each one against reference voltages and stores the result on the module,
+# see factory/calibrate.py. BigHonkingButton loads it at boot and uses it
+# instead of the nominal tables below, which remain the fallback for modules
+# that were never calibrated. factory/calibrate.py loads this file too, so
+# that the factory writes records in exactly this format.
+#
+# The record is kept in microcontroller.nvm, which survives the drive being
+# erased, or failing that in /calibration.bin on the drive. It's small and
+# already in the form VoltageIn wants, so loading it is a couple of short
+# reads with no searching or sorting, and because it includes the board
+# revision the revision pin doesn't have to be checked either. The layout,
+# all little-endian, is:
+#
+#   magic "BHCA", version, board revision, point count, one padding byte
+#   the chip's 16-byte unique ID, all zeros if it's meant for any chip
+#   (ADC code, millivolts) as (uint16, int16) for each point, codes sorted
+#   a uint16 sum of all the bytes before it
+#
+# A file record whose unique ID doesn't match this chip belongs to another
+# module whose drive was copied, so it's ignored.
+
+import struct
+
+CALIBRATION_PATH = "/calibration.bin"
+NVM_OFFSET = 0
+MAX_POINTS = 8
+
+_MAGIC = b"BHCA"
+_VERSION = 1
+_HEADER = "<4sBBBx16s"
+_HEADER_SIZE = 24
+_POINT_SIZE = 4
+_NO_UID = bytes(16)
+
+# ADC code -> voltage calibration points for each hardware revision.
+NOMINAL = {
+    5: {4068: -5.0, 3049: -2.5, 2025: 0, 1001: 2.5, 8: 5.0},
+    4: {4068: -2.0, 3049: -1.0, 2025: 0, 1001: 1.0, 8: 2.0},
+}
+
+
+class Calibration:
+    def __init__(self, revision, points, uid=None, source=None):
+        # points maps ADC codes to voltages, like bhb.py's tables.
+        self.revision = revision
+        self.points = points
+        self.uid = uid
+        # "nvm" or "file" for a record that was loaded.
+        self.source = source
+
+    def pack(self):
+        codes = sorted(self.points)
+        if not 2 <= len(codes) <= MAX_POINTS:
+            raise ValueError("Between 2 and {} points are needed".format(MAX_POINTS))
+        data = bytearray(
+            struct.pack(
+                _HEADER,
+                _MAGIC,
+                _VERSION,
+                self.revision,
+                len(codes),
+                self.uid or _NO_UID,
+            )
+        )
+        for code in codes:
+            data.extend(struct.pack("<Hh", code, round(self.points[code] * 1000)))
+        data.extend(struct.pack("<H", sum(data) & 0xFFFF))
+        return bytes(data)
+
+
+def record_size(count):
+    return _HEADER_SIZE + count * _POINT_SIZE + 2
+
+
+def _point_count(header):
+    # Returns the number of points in a valid header, otherwise 0.
+    if len(header) < _HEADER_SIZE:
+        return 0
+    magic, version, _, count, _ = struct.unpack_from(_HEADER, header)
+    if magic != _MAGIC or version != _VERSION or not 2 <= count <= MAX_POINTS:
+        return 0
+    return count
+
+
+def unpack(data, source=None):
+    # Returns a Calibration, or None if data isn't a valid record.
+    count = _point_count(data)
+    if not count or len(data) < record_size(count):
+        return None
+    end = record_size(count) - 2
+    if sum(data[:end]) & 0xFFFF != struct.unpack_from("<H", data, end)[0]:
+        return None
+    _, _, revision, _, uid = struct.unpack_from(_HEADER, data)
+    points = {}
+    for offset in range(_HEADER_SIZE, end, _POINT_SIZE):
+        code, millivolts = struct.unpack_from("<Hh", data, offset)
+        points[code] = millivolts / 1000
+    return Calibration(revision, points, None if uid == _NO_UID else uid, source)
+
+
+def _cpu_uid():
+    try:
+        import microcontroller
+
+        return bytes(microcontroller.cpu.uid)
+    except (ImportError, AttributeError):
+        return None
+
+
+def _nvm():
+    try:
+        import microcontroller
+
+        return microcontroller.nvm
+    except (ImportError, AttributeError):
+        return None
+
+
+def load_nvm(offset=NVM_OFFSET):
+    nvm = _nvm()
+    if not nvm:
+        return None
+    count = _point_count(nvm[offset : offset + _HEADER_SIZE])
+    if not count:
+        return None
+    return unpack(nvm[offset : offset + record_size(count)], "nvm")
+
+
+def load_file(path=CALIBRATION_PATH):
+    try:
+        with open(path, "rb") as file:
+            calibration = unpack(file.read(record_size(MAX_POINTS)), "file")
+    except OSError:
+        return None
+    if calibration is not None and calibration.uid is not None:
+        if calibration.uid != _cpu_uid():
+            return None
+    return calibration
+
+
+def load(path=CALIBRATION_PATH):
+    # The unit's calibration from nvm, then the drive, or None.
+    calibration = load_nvm()
+    if calibration is None:
+        calibration = load_file(path)
+    return calibration
+
+
+def save_nvm(calibration, offset=NVM_OFFSET):
+    # Returns False if this board has no nvm to save to.
+    nvm = _nvm()
+    if not nvm:
+        return False
+    data = calibration.pack()
+    nvm[offset : offset + len(data)] = data
+    return True
@@ -0,0 +1,204 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2020 Alethea Flowers for Winterbloom
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+
+# Plays a WAV file from the drive a chunk at a time, from any position and
+# in either direction.
+#
+# audiocore.WaveFile can only play a file from its start, forwards. This
+# keeps two chunks of the file in a RawSample that loops over them: while
+# the DAC plays one chunk, update() reads the next part of the file into the
+# other. Reading backwards and flipping each chunk plays the file in
+# reverse without a reversed copy on the drive, and `offset` starts
+# playback anywhere in it. Only two chunks are ever in RAM, so this works
+# for samples far bigger than the heap.
+#
+# Where the DAC has got to is worked out from how long the sample has been
+# playing. If update() isn't called again before the DAC finishes the chunk
+# it's on, it plays stale data and `underruns` goes up. Bigger chunks give
+# the loop more time between updates but take longer to read.
+#
+#     reverse = ChunkedSample("samples/snare.wav")
+#     reverse.reverse = True
+#     bhb.play(reverse)
+
+import time
+
+import audiocore
+
+from winterbloom_bhb import wav
+
+
+class ChunkedSample:
+    def __init__(self, path, chunk_frames=1024):
+        self._file = open(path, "rb")
+        info = wav.read_info(self._file)
+        self._data_offset = info.data_offset
+        self._frame_size = info.frame_size
+        self._channels = info.channel_count
+        self._silence = 128 if info.bits_per_sample == 8 else 0
+        self.frame_count = info.frame_count
+        self.chunk_frames = chunk_frames
+
+        self._buffer = wav.empty_buffer(info, chunk_frames * 2)
+        self._view = memoryview(self._buffer)
+        self.sample = audiocore.RawSample(
+            self._buffer, channel_count=info.channel_count, sample_rate=info.sample_rate
+        )
+
+        # The frame to start from. When playing in reverse, None starts from
+        # the end.
+        self.offset = None
+        self.reverse = False
+        self.underruns = 0
+
+        self._audio_out = None
+        self._loop = False
+        self._position = 0
+        self._filled = 0
+        self._end_chunk = None
+        self._started_ns = 0
+
+    @property
+    def playing(self):
+        return self._audio_out is not None
+
+    def start(self, audio_out, loop=False):
+        # Called by BigHonkingButton.play(), which also sets the sample rate.
+        offset = self.offset
+        if offset is None:
+            offset = self.frame_count if self.reverse else 0
+        self._position = min(max(0, offset), self.frame_count)
+        self._loop = loop
+        self._filled = 0
+        self._end_chunk = None
+
+        self._fill()
+        audio_out.stop()
+        audio_out.play(self.sample, loop=True)
+        self._started_ns = time.monotonic_ns()
+        self._audio_out = audio_out
+        if self._end_chunk is None:
+            self._fill()
+
+    def stop(self):
+        if self._audio_out is not None:
+            self._audio_out.stop()
+            self._audio_out = None
+
+    def update(self):
+        # Returns False once the sample has finished.
+        if self._audio_out is None:
+            return False
+
+        elapsed = time.monotonic_ns() - self._started_ns
+        chunk = elapsed * self.sample.sample_rate // 1000000000 // self.chunk_frames
+
+        end = self._end_chunk
+        if end is not None:
+            if chunk >= end:
+                self.stop()
+                return False
+            if chunk == end - 1 and self._filled == end:
+                # The last chunk is playing. Silence the other one in case
+                # the DAC gets there before the next update() stops it.
+                self._silence_chunk(end % 2, 0)
+                self._filled += 1
+            return True
+
+        if self._filled <= chunk:
+            # The DAC has already started on a chunk that wasn't refilled.
+            self.underruns += 1
+            self._filled = chunk
+        while self._filled < chunk + 2 and self._end_chunk is None:
+            self._fill()
+        return True
+
+    def _fill(self):
+        # Reads the next chunk of the file into whichever half of the buffer
+        # the DAC will play next.
+        frames = self.chunk_frames
+        start = (self._filled % 2) * frames
+        done = 0
+        # An empty file never moves the position on, so stop when a pass
+        # reads nothing rather than wrapping around forever.
+        while done < frames:
+            if self.reverse:
+                if self._position <= 0:
+                    if not self._loop:
+                        break
+                    self._position = self.frame_count
+                count = min(frames - done, self._position)
+                if not count:
+                    break
+                self._position -= count
+                self._read(start + done, self._position, count)
+                self._flip(start + done, count)
+            else:
+                if self._position >= self.frame_count:
+                    if not self._loop:
+                        break
+                    self._position = 0
+                count = min(frames - done, self.frame_count - self._position)
+                if not count:
+                    break
+                self._read(start + done, self._position, count)
+                self._position += count
+            done += count
+
+        if done < frames:
+            self._silence_chunk(self._filled % 2, done)
+            self._end_chunk = self._filled + 1
+        self._filled += 1
+
+    def _read(self, index, position, count):
+        channels = self._channels
+        self._file.seek(self._data_offset + position * self._frame_size)
+        self._file.readinto(self._view[index * channels : (index + count) * channels])
+
+    def _flip(self, index, count):
+        # Reverses the order of `count` frames starting at `index`.
+        buffer = self._buffer
+        channels = self._channels
+        low = index * channels
+        high = (index + count - 1) * channels
+        while low < high:
+            for channel in range(channels):
+                buffer[low + channel], buffer[high + channel] = (
+                    buffer[high + channel],
+                    buffer[low + channel],
+                )
+            low += channels
+            high -= channels
+
+    def _silence_chunk(self, half, frames):
+        # Silences one half of the buffer, from `frames` frames in.
+        buffer = self._buffer
+        silence = self._silence
+        channels = self._channels
+        start = (half * self.chunk_frames + frames) * channels
+        for index in range(start, (half + 1) * self.chunk_frames * channels):
+            buffer[index] = silence
+
+    def deinit(self):
+        self.stop()
+        self._file.close()
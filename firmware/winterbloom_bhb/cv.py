@@ -0,0 +1,129 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2020 Alethea Flowers for Winterbloom
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+
+# A buffered reader for the pitch CV input.
+#
+# Reading pitch_in normally takes a single ADC reading every time it's
+# accessed, which is noisy enough that select_from_list_using_cv() can
+# flicker between two items when the CV sits near the edge between them, and
+# it costs a conversion every time. CVReader instead takes a batch of
+# readings once per update() (or once every `interval` seconds), filters
+# them with a mean or a median, and only moves its voltage when it's changed
+# by more than `hysteresis` volts. Everything else reads the cached value,
+# and `changed` says whether there's anything new since the last update.
+#
+# There's no DMA access to the ADC from Python so the batch is just a tight
+# loop of reads into a buffer allocated up front.
+
+import array
+import time
+
+import winterbloom_voltageio
+
+
+class CVReader:
+    def __init__(
+        self,
+        analog_in,
+        calibration,
+        samples=4,
+        filter="mean",
+        hysteresis=0.01,
+        interval=0,
+    ):
+        if filter not in ("mean", "median"):
+            raise ValueError("filter must be 'mean' or 'median'")
+        self._analog_in = analog_in
+        self._buffer = array.array("H", [0] * samples)
+        self.samples = samples
+        self.filter = filter
+        self.hysteresis = hysteresis
+        self.interval = interval
+        self._next_ns = 0
+        self.code = 0
+        self.voltage = 0.0
+        self.changed = False
+        self.reads = 0
+        # VoltageIn reads the filtered code back through `value`.
+        self._voltage_in = winterbloom_voltageio.VoltageIn(self)
+        self.calibrate(calibration)
+        self.update()
+        self.voltage = self._voltage_in.voltage
+
+    @property
+    def value(self):
+        return self.code
+
+    def calibrate(self, calibration):
+        self._voltage_in.direct_calibration(calibration)
+        self._last_code = -1
+        # The ends of the range are always let through, otherwise hysteresis
+        # could keep the voltage from ever quite reaching them.
+        self._low_code = min(calibration)
+        self._high_code = max(calibration)
+
+    def update(self):
+        self.changed = False
+        if self.interval:
+            now = time.monotonic_ns()
+            if now < self._next_ns:
+                return
+            self._next_ns = now + int(self.interval * 1000000000)
+
+        buffer = self._buffer
+        analog_in = self._analog_in
+        count = self.samples
+        for i in range(count):
+            buffer[i] = analog_in.value
+        self.reads += count
+
+        if self.filter == "median":
+            # Insertion sort, it's quick for a handful of readings and works
+            # in place.
+            for i in range(1, count):
+                code = buffer[i]
+                j = i - 1
+                while j >= 0 and buffer[j] > code:
+                    buffer[j + 1] = buffer[j]
+                    j -= 1
+                buffer[j + 1] = code
+            code = buffer[count // 2]
+        else:
+            total = 0
+            for i in range(count):
+                total += buffer[i]
+            code = total // count
+
+        if code == self._last_code:
+            return
+        self._last_code = code
+        self.code = code
+
+        voltage = self._voltage_in.voltage
+        if (
+            abs(voltage - self.voltage) > self.hysteresis
+            or code <= self._low_code
+            or code >= self._high_code
+        ) and voltage != self.voltage:
+            self.voltage = voltage
+            self.changed = True
@@ -0,0 +1,219 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2020 Alethea Flowers for Winterbloom
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+
+# Click-free retriggering for samples kept in RAM.
+#
+# Stopping a sample part way through drops the DAC straight to its resting
+# value, and starting a new one jumps straight to its first value, both of
+# which are heard as clicks. For samples whose data lives in a RawSample
+# buffer, the first `length` frames of the new sample are overwritten with a
+# crossfade from wherever the old sample would have got to, so the output
+# glides from one to the other. The original frames are kept in a copy made
+# by prepare() and put back once the DAC has moved past them.
+#
+# Where the old sample is estimated from how long it's been playing, so the
+# crossfade is only as good as that estimate. The old sample carries on
+# while the crossfade is worked out, so the estimate looks ahead by however
+# long the last one took. `delay` is how many frames the DAC runs behind
+# play() on top of that. Samples that are streamed from the drive can't be
+# looked into, so those are simply cut off and the new sample fades in.
+#
+# The crossfade works in buffers made ahead of time and the gains are in
+# Q15, with each product shifted down before adding so that the samples stay
+# within MicroPython's small ints. Finding the old sample's position does
+# allocate a little on each trigger though: it needs time.monotonic_ns(),
+# whose values, and the arithmetic on them, are too big for small ints.
+# supervisor.ticks_ms() wouldn't allocate, but a millisecond is 44 frames,
+# too coarse to line the crossfade up. Putting the original frames back only
+# has to happen some time after the crossfade has played, so update() waits
+# for that with ticks_ms() and doesn't allocate.
+
+import array
+import math
+import time
+
+import audiocore
+import supervisor
+
+_ONE = 32767
+_TICKS_MASK = (1 << 29) - 1
+
+
+class _Prepared:
+    def __init__(self, buffer, length):
+        self.buffer = buffer
+        self.head = array.array("h", buffer[0:length])
+        self.frames = len(buffer)
+
+
+class Declicker:
+    def __init__(self, audio_out, length=64, delay=0, margin=0.005):
+        self.audio_out = audio_out
+        self.length = length
+        self.delay = delay
+        self._margin_ms = int(margin * 1000)
+        # Raised cosine from _ONE down to 0, fading in uses _ONE - fade[i].
+        self._fade = array.array(
+            "h",
+            [
+                int(_ONE * (1 + math.cos(math.pi * (i + 1) / (length + 1))) / 2)
+                for i in range(length)
+            ],
+        )
+        self._tail = array.array("h", [0] * length)
+        self._tail_sample = audiocore.RawSample(self._tail)
+        self._prepared = {}
+        self._playing = None
+        self._loop = False
+        self._started_ns = 0
+        self._sample_rate = 44100
+        self._lead_ns = 0
+        self._restore = None
+        self._restore_ms = 0
+        self._restore_after_ms = 0
+
+    def prepare(self, sample, buffer):
+        # Only 16-bit mono samples that are at least two ramps long can be
+        # declicked, anything else plays as usual.
+        if (
+            getattr(buffer, "typecode", None) != "h"
+            or sample.channel_count != 1
+            or len(buffer) < 2 * self.length
+        ):
+            return False
+        self._prepared[sample] = _Prepared(buffer, self.length)
+        return True
+
+    def forget(self, sample):
+        prepared = self._prepared.pop(sample, None)
+        if prepared is None:
+            return
+        if self._restore is prepared:
+            self._put_back(prepared)
+        if self._playing is prepared:
+            self._playing = None
+
+    def _position(self, now_ns):
+        # The index of the old sample's frame that's at the DAC right now,
+        # or -1 if it has finished or can't be looked into.
+        old = self._playing
+        if old is None or not self.audio_out.playing:
+            return -1
+        elapsed = now_ns + self._lead_ns - self._started_ns
+        position = elapsed * self._sample_rate // 1000000000 - self.delay
+        if position < 0:
+            position = 0
+        if self._loop:
+            return position % old.frames
+        if position >= old.frames:
+            return -1
+        return position
+
+    def play(self, sample, loop=False):
+        now = time.monotonic_ns()
+        new = self._prepared.get(sample)
+        restore = self._restore
+        if restore is not None and restore is not new:
+            self._put_back(restore)
+
+        if new is not None:
+            old = self._playing
+            position = self._position(now)
+            buffer = new.buffer
+            head = new.head
+            fade = self._fade
+            for i in range(self.length):
+                value = head[i] * (_ONE - fade[i]) >> 15
+                if position >= 0:
+                    value += self._frame(old, position + i) * fade[i] >> 15
+                if value > _ONE:
+                    value = _ONE
+                elif value < -_ONE:
+                    value = -_ONE
+                buffer[i] = value
+            self._restore = new
+            self._lead_ns = time.monotonic_ns() - now
+            # One more than it takes, since ticks_ms() may be about to tick.
+            self._restore_ms = supervisor.ticks_ms()
+            self._restore_after_ms = (
+                self.length * 1000 // sample.sample_rate + self._margin_ms + 1
+            )
+
+        self.audio_out.stop()
+        self.audio_out.play(sample, loop=loop)
+        self._playing = new
+        self._loop = loop
+        self._started_ns = time.monotonic_ns()
+        self._sample_rate = sample.sample_rate
+
+    def _frame(self, old, index):
+        if index >= old.frames:
+            if not self._loop:
+                return 0
+            index -= old.frames
+        # The start of the old sample's buffer may have been overwritten by
+        # a crossfade, but the copy in head never is.
+        if index < self.length:
+            return old.head[index]
+        return old.buffer[index]
+
+    def stop(self):
+        # Fades out from where the current sample is instead of cutting it
+        # off, if it's one that can be looked into.
+        position = self._position(time.monotonic_ns())
+        old = self._playing
+        self._playing = None
+        if position < 0:
+            self.audio_out.stop()
+            return
+
+        tail = self._tail
+        fade = self._fade
+        for i in range(self.length):
+            tail[i] = self._frame(old, position + i) * fade[i] >> 15
+
+        self._tail_sample.sample_rate = self._sample_rate
+        self.audio_out.stop()
+        self.audio_out.play(self._tail_sample)
+
+    def restore_in_ms(self):
+        # How long until update() puts the original frames back, or None if
+        # there's nothing to put back.
+        if self._restore is None:
+            return None
+        elapsed = (supervisor.ticks_ms() - self._restore_ms) & _TICKS_MASK
+        return max(0, self._restore_after_ms - elapsed)
+
+    def update(self):
+        if self._restore is not None and (
+            (supervisor.ticks_ms() - self._restore_ms) & _TICKS_MASK
+            >= self._restore_after_ms
+        ):
+            self._put_back(self._restore)
+
+    def _put_back(self, prepared):
+        buffer = prepared.buffer
+        head = prepared.head
+        for i in range(self.length):
+            buffer[i] = head[i]
+        self._restore = None
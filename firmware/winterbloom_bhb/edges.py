@@ -0,0 +1,144 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2020 Alethea Flowers for Winterbloom
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+# Edge capture for the button and gate inputs.
+#
+# Polling only sees whatever state the inputs happen to be in when update()
+# is called, so a trigger that starts and ends between two updates is lost.
+# This uses keypad's background scanner to queue every edge along with its
+# timestamp and then hands them out in order, so every trigger shows up as
+# exactly one `triggered` and one `released`.
+#
+# Requires CircuitPython 7.1 or later.
+
+import keypad
+
+
+class _CapturedInputState:
+    # Same interface as bhb._InputState. Each update() consumes at most one
+    # rising edge and the falling edge that follows it, so even a trigger
+    # that's entirely over by the time update() is called shows up as both
+    # `triggered` and `released`.
+
+    def __init__(self, size):
+        self.state = False
+        self.rising_edge = False
+        self.falling_edge = False
+        self.edge_time = None
+        self.dropped = 0
+        self._states = bytearray(size)
+        self._times = [0] * size
+        self._head = 0
+        self._count = 0
+
+    def _push(self, state, timestamp):
+        size = len(self._times)
+        if self._count == size:
+            self.dropped += 1
+            return
+        index = (self._head + self._count) % size
+        self._states[index] = state
+        self._times[index] = timestamp
+        self._count += 1
+
+    def _pop(self):
+        head = self._head
+        self.state = bool(self._states[head])
+        self.edge_time = self._times[head]
+        self._head = (head + 1) % len(self._times)
+        self._count -= 1
+
+    def update(self):
+        self.rising_edge = False
+        self.falling_edge = False
+        if not self._count:
+            return
+
+        self._pop()
+        if self.state:
+            self.rising_edge = True
+            if self._count and not self._states[self._head]:
+                trigger_time = self.edge_time
+                self._pop()
+                self.falling_edge = True
+                self.edge_time = trigger_time
+        else:
+            self.falling_edge = True
+
+    @property
+    def pending(self):
+        return self._count
+
+    @property
+    def value(self):
+        return self.state
+
+    @property
+    def pressed(self):
+        return self.rising_edge
+
+    @property
+    def triggered(self):
+        return self.rising_edge
+
+    @property
+    def released(self):
+        return self.falling_edge
+
+    @property
+    def held(self):
+        return self.state
+
+    def __bool__(self):
+        return self.state
+
+
+class EdgeCapture:
+    def __init__(self, pins, interval=0.001, max_events=64):
+        self._keys = keypad.Keys(
+            pins,
+            value_when_pressed=False,
+            pull=True,
+            interval=interval,
+            max_events=max_events,
+        )
+        self._event = keypad.Event()
+        self.inputs = tuple(_CapturedInputState(max_events) for _ in pins)
+        self.overflows = 0
+
+    def update(self):
+        events = self._keys.events
+        event = self._event
+        inputs = self.inputs
+
+        while events.get_into(event):
+            inputs[event.key_number]._push(event.pressed, event.timestamp)
+
+        if events.overflowed:
+            self.overflows += 1
+            events.clear()
+
+        for input in inputs:
+            input.update()
+
+    def deinit(self):
+        self._keys.deinit()
@@ -0,0 +1,102 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2020 Alethea Flowers for Winterbloom
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+
+# Garbage collection at quiet moments, turned on with
+# BigHonkingButton(gc_idle_ms=...).
+#
+# CircuitPython collects garbage whenever an allocation doesn't fit, which
+# can be right as a trigger arrives. A collection stops everything else for
+# a few milliseconds, including refilling the buffers of samples played
+# from the drive, so a badly timed one delays the trigger and can crackle.
+#
+# This turns automatic collection off and instead collects from update()
+# once nothing has happened for `idle_ms`: no trigger or release and no
+# sample playing. It only bothers once `threshold` bytes have been
+# allocated since the last collection, by default half of what was free at
+# the start, so that quiet moments aren't spent collecting over and over. If
+# free memory drops below `reserve`, by default an eighth of what was free,
+# it collects straight away, quiet or not, rather than run out.
+#
+# `collections` counts every collection, `forced` the ones that couldn't
+# wait, and `on_trigger` the ones that a trigger arrived during, which the
+# following update() gets to see late.
+
+import gc
+
+import supervisor
+
+_TICKS_MASK = (1 << 29) - 1
+
+
+class GCBudget:
+    def __init__(self, idle_ms=50, threshold=None, reserve=None):
+        gc.disable()
+        gc.collect()
+        free = gc.mem_free()
+        self.idle_ms = idle_ms
+        self.threshold = free // 2 if threshold is None else threshold
+        self.reserve = free // 8 if reserve is None else reserve
+        self.collections = 0
+        self.forced = 0
+        self.on_trigger = 0
+        self._last_active = supervisor.ticks_ms()
+        self._collected = False
+        self._allocated = gc.mem_alloc()
+
+    def update(self, active):
+        if self._collected:
+            self._collected = False
+            if active:
+                self.on_trigger += 1
+
+        if gc.mem_free() < self.reserve:
+            self.forced += 1
+            self._collect()
+            return
+
+        now = supervisor.ticks_ms()
+        if active:
+            self._last_active = now
+            return
+
+        if ((now - self._last_active) & _TICKS_MASK) < self.idle_ms:
+            return
+        if gc.mem_alloc() - self._allocated >= self.threshold:
+            self._collect()
+
+    def _collect(self):
+        gc.collect()
+        self.collections += 1
+        self._collected = True
+        self._allocated = gc.mem_alloc()
+
+    def stop(self):
+        # Hands collection back to CircuitPython.
+        gc.enable()
+
+    def print_report(self):
+        print(
+            "{} collections, {} forced, {} during a trigger".format(
+                self.collections, self.forced, self.on_trigger
+            )
+        )
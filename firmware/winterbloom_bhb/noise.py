@@ -0,0 +1,345 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2020 Alethea Flowers for Winterbloom
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+
+# Noise generators that fill buffers for RawSample.
+#
+# Working noise out one sample at a time is slow in Python whichever way
+# it's done: the random.random() loop examples/noise.py used to have, or
+# integer filters fed by random.getrandbits(). So each generator works out a
+# table of `table_size` samples once, and fills buffers by copying runs of
+# 32 to 95 samples out of it. The copies are slice assignments, which
+# CircuitPython does in native code, so a fill only does a few steps of
+# Python per run rather than per sample. benchmarks/noise.py times this
+# against the old loop and checks the spectrum of what comes out.
+#
+# The table is made with integer maths from random.getrandbits(16):
+#
+# - white noise is the random numbers as they are,
+# - pink noise (-3dB per octave) uses the Voss-McCartney method, summing
+#   sixteen white sources that are updated at halving rates plus one that
+#   changes on every sample,
+# - brown noise (-6dB per octave) is white noise run through a leaky
+#   integrator.
+#
+# White noise doesn't depend on what came before it, so each run starts at
+# a random place in the table. Pink and brown noise do, and jumping to a
+# random place would be a step in the output that's heard as a click, so
+# each run instead starts just after a sample, picked at random from the
+# handful closest in value, that matches the last one written. `_order` is
+# the table's positions sorted by value, which makes that a binary search.
+#
+# Pink and brown tables are centred and scaled to peak at `level`, since a
+# short stretch of them doesn't reach as far as they do over time.
+#
+# The table is rebuilt by the next fill after the colour, level or bits
+# change, which takes a few times as long as filling a buffer of the
+# table's size used to, see the benchmark's "table" column. It costs
+# `table_size` samples of memory, plus two bytes a sample for `_order` for
+# pink and brown noise. Each run allocates a couple of small memoryview
+# objects.
+#
+# Noise keeps two buffers: the one playing and a spare that's refilled a
+# `chunk` of samples at a time from bhb.update(), see run_in_background(),
+# so that the next trigger plays fresh noise rather than the same buffer
+# again. When the spare isn't finished by then the current buffer is played
+# again.
+
+import array
+import random
+
+import audiocore
+
+from winterbloom_bhb import wav
+
+COLORS = ("white", "pink", "brown")
+
+# How much each colour is turned up so that it peaks at about the same
+# level as white noise, as a multiple of 4096.
+_SCALES = {"white": 4096, "pink": 7168, "brown": 5120}
+
+# Limits for a sample before it's scaled back down by 4096.
+_HIGH = 32767 << 12
+_LOW = -32768 << 12
+
+# Runs copied from the table are _MIN_RUN to _MIN_RUN + 63 samples long.
+_MIN_RUN = 32
+_MAX_RUN = _MIN_RUN + 63
+
+
+def _trailing_zeros():
+    # Trailing zero bits of every byte, which picks the pink noise source to
+    # update: source 0 every other sample, source 1 every fourth and so on.
+    table = bytearray(256)
+    for n in range(256):
+        count = 0
+        while count < 7 and not (n >> count) & 1:
+            count += 1
+        table[n] = count
+    return table
+
+
+_TRAILING_ZEROS = _trailing_zeros()
+
+
+class NoiseGenerator:
+    # Fills buffers with noise, carrying on where the last fill stopped.
+
+    def __init__(self, color="white", level=0.8, bits=16, table_size=1024):
+        if table_size < 2 * _MAX_RUN:
+            raise ValueError("table_size must be at least {}".format(2 * _MAX_RUN))
+        self.color = color
+        self.level = level
+        self.bits = bits
+        self.table_size = table_size
+        self._rows = [0] * 16
+        self._total = 0
+        self._counter = 0
+        self._brown = 0
+        self._table = None
+        self._order = None
+        self._made_for = None
+        # Where the run being copied is up to in the table, and how much of
+        # it is left.
+        self._position = 0
+        self._left = 0
+
+    @property
+    def color(self):
+        return self._color
+
+    @color.setter
+    def color(self, color):
+        if color not in COLORS:
+            raise ValueError("color must be one of {}".format(COLORS))
+        self._color = color
+
+    def fill(self, buffer, start=0, end=None):
+        if end is None:
+            end = len(buffer)
+        if self._made_for != (self._color, self.level, self.bits):
+            self._make_table()
+
+        getrandbits = random.getrandbits
+        table = self._table
+        source = memoryview(table)
+        target = memoryview(buffer)
+        position = self._position
+        left = self._left
+        while start < end:
+            if not left:
+                position = self._next_run(table, position)
+                left = _MIN_RUN + getrandbits(6)
+            count = min(left, end - start)
+            target[start : start + count] = source[position : position + count]
+            start += count
+            position += count
+            left -= count
+        self._position = position
+        self._left = left
+
+    def _next_run(self, table, position):
+        # Where the next run starts in the table.
+        order = self._order
+        if order is None:
+            return random.getrandbits(16) % (len(table) - _MAX_RUN)
+        # The first of the samples sorted by value that isn't below the last
+        # one written, then one of its neighbours so that the same value
+        # doesn't always carry on the same way.
+        value = table[position - 1]
+        low, high = 0, len(order)
+        while low < high:
+            middle = (low + high) >> 1
+            if table[order[middle]] < value:
+                low = middle + 1
+            else:
+                high = middle
+        index = low + random.getrandbits(3) - 4
+        if index < 0:
+            index = 0
+        elif index >= len(order):
+            index = len(order) - 1
+        return order[index] + 1
+
+    def _make_table(self):
+        info = wav.WavInfo()
+        info.bits_per_sample = self.bits
+        self._table = None
+        self._order = None
+        table = wav.empty_buffer(info, frame_count=self.table_size)
+        # Samples are worked out as 16-bit values and scaled by `gain`, a
+        # multiple of 4096. 8-bit buffers are unsigned.
+        gain = int(_SCALES[self._color] * self.level)
+        if self.bits == 8:
+            shift, offset = 20, 128
+        else:
+            shift, offset = 12, 0
+        if self._color == "white":
+            self._white(table, gain, shift, offset)
+        else:
+            fill = self._pink if self._color == "pink" else self._brown_fill
+            # Once to settle the filter, then for real.
+            fill(table, gain, shift, offset)
+            fill(table, gain, shift, offset)
+            # A table this short is usually off to one side, which would be
+            # a DC offset in everything made from it, and doesn't reach as
+            # far as the noise does over a longer time, so it's centred and
+            # turned up to peak at `level` like white noise does.
+            mean = sum(table) // len(table) - offset
+            peak = max(max(table) - offset - mean, offset + mean - min(table), 1)
+            target = int(self.level * ((1 << (self.bits - 1)) - 1))
+            for i in range(len(table)):
+                table[i] = (table[i] - offset - mean) * target // peak + offset
+            # Positions that leave room for a whole run after them.
+            self._order = array.array(
+                "H",
+                sorted(range(len(table) - _MAX_RUN - 1), key=lambda i: table[i]),
+            )
+        self._table = table
+        self._made_for = (self._color, self.level, self.bits)
+        # The first run starts anywhere.
+        self._position = random.getrandbits(16) % (len(table) - _MAX_RUN) + 1
+        self._left = 0
+
+    def _white(self, buffer, gain, shift, offset):
+        getrandbits = random.getrandbits
+        for i in range(len(buffer)):
+            buffer[i] = (((getrandbits(16) - 32768) * gain) >> shift) + offset
+
+    def _pink(self, buffer, gain, shift, offset):
+        getrandbits = random.getrandbits
+        rows = self._rows
+        total = self._total
+        counter = self._counter
+        zeros = _TRAILING_ZEROS
+        for i in range(len(buffer)):
+            value = getrandbits(16)
+            counter = (counter + 1) & 0xFFFF
+            row = counter & 0xFF
+            if row:
+                row = zeros[row]
+            else:
+                row = zeros[counter >> 8] + 8
+            # The top 12 bits replace one of the slower sources, the bottom
+            # 12 bits are the source that changes every sample.
+            new = (value >> 4) - 2048
+            total += new - rows[row]
+            rows[row] = new
+            value = (total + (value & 0xFFF) - 2048) * gain
+            if value > _HIGH:
+                value = _HIGH
+            elif value < _LOW:
+                value = _LOW
+            buffer[i] = (value >> shift) + offset
+        self._total = total
+        self._counter = counter
+
+    def _brown_fill(self, buffer, gain, shift, offset):
+        getrandbits = random.getrandbits
+        brown = self._brown
+        for i in range(len(buffer)):
+            brown += (getrandbits(16) - 32768) >> 5
+            # Leaks back towards zero so that it doesn't wander off.
+            brown -= brown >> 8
+            value = brown * gain
+            if value > _HIGH:
+                value = _HIGH
+            elif value < _LOW:
+                value = _LOW
+            buffer[i] = (value >> shift) + offset
+        self._brown = brown
+
+
+class Noise:
+    def __init__(self, bhb, color="white", length=2048, level=0.8, bits=16, chunk=128):
+        self._bhb = bhb
+        self.generator = NoiseGenerator(color, level, bits)
+        self.chunk = chunk
+        # The number of times a trigger got fresh noise.
+        self.refreshes = 0
+
+        info = wav.WavInfo()
+        info.bits_per_sample = bits
+        self._buffers = (
+            wav.empty_buffer(info, frame_count=length),
+            wav.empty_buffer(info, frame_count=length),
+        )
+        self._samples = tuple(
+            audiocore.RawSample(buffer, sample_rate=bhb.base_sample_rate)
+            for buffer in self._buffers
+        )
+        self._front = 0
+        self.generator.fill(self._buffers[0])
+        self._filled = 0
+        # Kept so that the same object is handed to run_in_background() each
+        # time, which is how it knows it's already running.
+        self._refill_task = self._refill
+        bhb.run_in_background(self._refill_task)
+
+    @property
+    def color(self):
+        return self.generator.color
+
+    @color.setter
+    def color(self, color):
+        # Takes effect as buffers are refilled, so it can take a couple of
+        # triggers to be heard.
+        self.generator.color = color
+
+    @property
+    def sample(self):
+        return self._samples[self._front]
+
+    @property
+    def sample_rate(self):
+        return self._samples[0].sample_rate
+
+    @sample_rate.setter
+    def sample_rate(self, value):
+        for sample in self._samples:
+            sample.sample_rate = value
+
+    @property
+    def ready(self):
+        # Whether the spare buffer has been refilled.
+        return self._filled >= len(self._buffers[0])
+
+    def play(self, pitch_cv=None, loop=True):
+        if self.ready:
+            self._front ^= 1
+            self.refreshes += 1
+            self._filled = 0
+            self._bhb.run_in_background(self._refill_task)
+        self._bhb.play(self.sample, pitch_cv=pitch_cv, loop=loop)
+
+    def stop(self):
+        self._bhb.stop()
+
+    def _refill(self):
+        # Fills the next chunk of the spare buffer, returns False once it's
+        # full.
+        buffer = self._buffers[self._front ^ 1]
+        start = self._filled
+        end = min(start + self.chunk, len(buffer))
+        self.generator.fill(buffer, start, end)
+        self._filled = end
+        return end < len(buffer)
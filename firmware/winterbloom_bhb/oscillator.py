@@ -0,0 +1,170 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2020 Alethea Flowers for Winterbloom
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+
+# A wavetable oscillator.
+#
+# Building a waveform in Python at startup takes a while, and a single
+# cycle that's re-pitched by changing its sample rate either aliases at high
+# notes or runs into the 350kHz limit. Instead, wavetables.bin holds
+# precomputed, band-limited tables for each shape with one table per
+# octave: the higher the octave, the shorter the table and the fewer
+# harmonics it has. Playing a note picks the table for its octave, so every
+# note plays back at a modest sample rate without any harmonics that could
+# alias. Loading a shape is a single read from the drive into a buffer
+# that's reused when switching shapes.
+#
+# wavetables.bin is made by tools/make_wavetables.py. It starts with a
+# header (magic, version, shape count, octave count and the frequency of the
+# lowest octave in mHz) followed by an (offset, length) entry for each table
+# and then the tables themselves as signed 16-bit samples, shape by shape.
+
+import struct
+
+import audiocore
+
+from winterbloom_bhb import wav
+from winterbloom_bhb.pitch import MAX_SAMPLE_RATE
+
+SHAPES = ("sine", "triangle", "saw", "square")
+WAVETABLES_PATH = "/lib/winterbloom_bhb/wavetables.bin"
+
+_MAGIC = b"BHWT"
+_VERSION = 1
+_HEADER_SIZE = 12
+_ENTRY_SIZE = 8
+
+
+class Oscillator:
+    def __init__(self, bhb, shape="sine", base_frequency=261.63, path=WAVETABLES_PATH):
+        # base_frequency is the note played for 0v, middle C by default.
+        self._bhb = bhb
+        self.base_frequency = base_frequency
+        self.path = path
+        self.frequency = 0
+        self._playing = None
+        self._sample_rate = 0
+
+        with open(path, "rb") as file:
+            header = file.read(_HEADER_SIZE)
+            magic, version, shape_count, octaves, lowest = struct.unpack(
+                "<4sBBBxI", header
+            )
+            if magic != _MAGIC or version != _VERSION:
+                raise ValueError("Not a version 1 wavetable file")
+            directory = file.read(_ENTRY_SIZE * shape_count * octaves)
+
+        self._octaves = octaves
+        self._lowest_frequency = lowest / 1000
+        self._offsets = []
+        lengths = []
+        for index in range(shape_count * octaves):
+            offset, length = struct.unpack_from("<IH", directory, index * _ENTRY_SIZE)
+            self._offsets.append(offset)
+            if index < octaves:
+                lengths.append(length)
+
+        # Every shape has the same table lengths, so one buffer and one
+        # RawSample per octave serve all of them.
+        self._buffer = wav.empty_buffer(wav.WavInfo(), frame_count=sum(lengths))
+        view = memoryview(self._buffer)
+        self._lengths = lengths
+        self._tables = []
+        start = 0
+        for length in lengths:
+            self._tables.append(audiocore.RawSample(view[start : start + length]))
+            start += length
+
+        self._shape = None
+        self.shape = shape
+
+    @property
+    def shape(self):
+        return self._shape
+
+    @shape.setter
+    def shape(self, shape):
+        # Switching shapes while a note is playing changes it straight away.
+        if shape not in SHAPES:
+            raise ValueError("shape must be one of {}".format(SHAPES))
+        if shape == self._shape:
+            return
+        with open(self.path, "rb") as file:
+            file.seek(self._offsets[SHAPES.index(shape) * self._octaves])
+            file.readinto(self._buffer)
+        self._shape = shape
+
+    def _table_for(self, frequency):
+        # The table for the frequency's octave and the rate that plays it at
+        # that frequency.
+        octave = 0
+        top = self._lowest_frequency * 2
+        last = self._octaves - 1
+        while octave < last and frequency >= top:
+            octave += 1
+            top *= 2
+        sample_rate = min(int(frequency * self._lengths[octave]), MAX_SAMPLE_RATE)
+        return self._tables[octave], sample_rate
+
+    def sample_for(self, frequency):
+        # The table for the frequency's octave, set to play at that frequency.
+        sample, sample_rate = self._table_for(frequency)
+        sample.sample_rate = sample_rate
+        return sample
+
+    def play(self, pitch_cv=0.0, frequency=None):
+        # Plays the note for the given CV (1v/octave from base_frequency), or
+        # the given frequency in Hz, from the start of the waveform.
+        if frequency is None:
+            frequency = self.base_frequency * pow(2, pitch_cv)
+        self.frequency = frequency
+        sample = self.sample_for(frequency)
+        self._playing = sample
+        self._sample_rate = sample.sample_rate
+        self._bhb.play(sample, loop=True)
+
+    def retune(self, pitch_cv=0.0, frequency=None):
+        # Moves a playing note to a new pitch, use it to follow the CV. The
+        # new rate is set on the table in place, but CircuitPython only picks
+        # a sample's rate up in play(), so the note is restarted, which can
+        # click, only when the table or its rate actually changed. Does
+        # nothing to the output while the oscillator is stopped.
+        if frequency is None:
+            frequency = self.base_frequency * pow(2, pitch_cv)
+        self.frequency = frequency
+        if self._playing is None:
+            return
+        sample, sample_rate = self._table_for(frequency)
+        if sample is self._playing and sample_rate == self._sample_rate:
+            return
+        sample.sample_rate = sample_rate
+        self._playing = sample
+        self._sample_rate = sample_rate
+        self._bhb.play(sample, loop=True)
+
+    def stop(self):
+        self._playing = None
+        self._bhb.stop()
+
+    @property
+    def size_bytes(self):
+        return len(self._buffer) * 2
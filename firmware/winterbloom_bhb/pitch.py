@@ -0,0 +1,87 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2020 Alethea Flowers for Winterbloom
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+
+# A precomputed table from raw ADC codes to playback sample rates.
+#
+# Going from the pitch CV input to a sample rate normally takes a trip
+# through VoltageIn's calibration and a pow() call, both of which are slow
+# floating point operations on the SAMD21 and sit right between a trigger
+# and the sound. This does all of that up front for every fourth ADC code and
+# linearly interpolates between them with integer math. That keeps the table
+# at 4kB and within a fraction of a cent of the float path, apart from a
+# couple of cents right where the 350kHz limit kicks in.
+
+import array
+
+import winterbloom_voltageio
+
+MAX_SAMPLE_RATE = 350000 - 1
+
+
+class _FixedAnalogIn:
+    value = 0
+
+
+class PitchTable:
+    def __init__(self, calibration, base_sample_rate=44100, shift=2):
+        self.calibration = calibration
+        self.base_sample_rate = base_sample_rate
+        self.shift = shift
+        self._mask = (1 << shift) - 1
+        self._table = None
+
+    def build(self):
+        # Run the calibration through VoltageIn itself so the table matches
+        # BigHonkingButton.pitch_in exactly.
+        analog_in = _FixedAnalogIn()
+        voltage_in = winterbloom_voltageio.VoltageIn(analog_in)
+        voltage_in.direct_calibration(self.calibration)
+
+        size = (4096 >> self.shift) + 1
+        table = array.array("L", [0] * size)
+        for index in range(size):
+            analog_in.value = index << self.shift
+            sample_rate = int(self.base_sample_rate * pow(2, voltage_in.voltage))
+            table[index] = min(sample_rate, MAX_SAMPLE_RATE)
+
+        self._table = table
+
+    def invalidate(self):
+        self._table = None
+
+    @property
+    def built(self):
+        return self._table is not None
+
+    def sample_rate(self, code):
+        table = self._table
+        if table is None:
+            self.build()
+            table = self._table
+        index = code >> self.shift
+        low = table[index]
+        return low + (((table[index + 1] - low) * (code & self._mask)) >> self.shift)
+
+    @property
+    def size_bytes(self):
+        return 0 if self._table is None else len(self._table) * 4
@@ -0,0 +1,224 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2020 Alethea Flowers for Winterbloom
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+
+# Counts and timings for the main loop, turned on with
+# BigHonkingButton(profile=True).
+#
+# Each measurement goes into a histogram with a fixed set of power-of-two
+# buckets, so profiling doesn't grow the heap however long it runs. Bucket 0
+# is anything under 1.024us, bucket n is 2^(n+9) up to 2^(n+10) ns and the
+# last bucket takes everything longer. Percentiles are the top of the
+# bucket they land in, so they're only good to within a factor of two.
+#
+# "pitch_in" is the time spent reading the ADC for bhb.pitch_in. With
+# cv_samples the CV is read in update() instead and counts towards that.
+# "loop" is the time from the start of one update() to the start of the
+# next and "user" is the part of that spent outside of update(), in your
+# code. monotonic_ns() returns a long integer on CircuitPython, so taking a
+# measurement still makes a small allocation, but nothing is kept.
+#
+# print_report() prints the stats to the serial console and save() writes
+# them as JSON, which needs the drive to be writable from code (see
+# storage.remount() in boot.py).
+
+import array
+import json
+import time
+
+BUCKETS = 24
+NAMES = ("update", "play", "stop", "pitch_in", "loop", "user")
+
+_monotonic_ns = time.monotonic_ns
+
+
+def bucket_limit(index):
+    # The upper edge of a bucket in ns.
+    return 1 << (index + 10)
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = array.array("L", [0] * BUCKETS)
+        self.count = 0
+        self.total_us = 0
+        self.max_ns = 0
+
+    def add(self, ns):
+        self.count += 1
+        self.total_us += ns // 1000
+        if ns > self.max_ns:
+            self.max_ns = ns
+        value = ns >> 10
+        index = 0
+        while value and index < BUCKETS - 1:
+            value >>= 1
+            index += 1
+        self.counts[index] += 1
+
+    def percentile(self, fraction):
+        if not self.count:
+            return 0
+        wanted = self.count * fraction
+        seen = 0
+        for index in range(BUCKETS):
+            seen += self.counts[index]
+            if seen >= wanted:
+                return min(bucket_limit(index), self.max_ns)
+        return self.max_ns
+
+    def reset(self):
+        for index in range(BUCKETS):
+            self.counts[index] = 0
+        self.count = 0
+        self.total_us = 0
+        self.max_ns = 0
+
+    def as_dict(self):
+        return {
+            "count": self.count,
+            "total_us": self.total_us,
+            "max_ns": self.max_ns,
+            "p50_ns": self.percentile(0.5),
+            "p99_ns": self.percentile(0.99),
+            "buckets": list(self.counts),
+        }
+
+
+class _TimedVoltageIn:
+    # Stands in for the VoltageIn behind bhb.pitch_in. pitch_in is a property,
+    # which can't be shadowed on the instance, so its reads are timed here.
+    def __init__(self, voltage_in, histogram):
+        self._voltage_in = voltage_in
+        self._histogram = histogram
+
+    @property
+    def voltage(self):
+        start = _monotonic_ns()
+        voltage = self._voltage_in.voltage
+        self._histogram.add(_monotonic_ns() - start)
+        return voltage
+
+    def direct_calibration(self, calibration):
+        self._voltage_in.direct_calibration(calibration)
+
+
+class Profiler:
+    def __init__(self):
+        self.update = Histogram()
+        self.play = Histogram()
+        self.stop = Histogram()
+        self.pitch_in = Histogram()
+        self.loop = Histogram()
+        self.user = Histogram()
+        self._update_start = 0
+        self._update_end = 0
+
+    def attach(self, bhb):
+        # Times calls to bhb.update(), play() and stop() by shadowing them
+        # on the instance, so that the methods themselves don't have to
+        # check whether profiling is on. pitch_in is timed by swapping out
+        # the VoltageIn it reads, now or once the ADC is set up.
+        cls = type(bhb)
+        update = cls.update
+        play = cls.play
+        stop = cls.stop
+        init_adc = cls._init_adc
+        pitch_in_histogram = self.pitch_in
+        update_histogram = self.update
+        play_histogram = self.play
+        stop_histogram = self.stop
+        loop_histogram = self.loop
+        user_histogram = self.user
+        profiler = self
+
+        def profiled_update():
+            start = _monotonic_ns()
+            if profiler._update_end:
+                loop_histogram.add(start - profiler._update_start)
+                user_histogram.add(start - profiler._update_end)
+            result = update(bhb)
+            end = _monotonic_ns()
+            update_histogram.add(end - start)
+            profiler._update_start = start
+            profiler._update_end = end
+            return result
+
+        def profiled_play(
+            sample, pitch_cv=None, loop=False, pitch_raw=None, level=None
+        ):
+            start = _monotonic_ns()
+            result = play(bhb, sample, pitch_cv, loop, pitch_raw, level)
+            play_histogram.add(_monotonic_ns() - start)
+            return result
+
+        def profiled_stop():
+            start = _monotonic_ns()
+            stop(bhb)
+            stop_histogram.add(_monotonic_ns() - start)
+
+        def profiled_init_adc():
+            result = init_adc(bhb)
+            bhb._pitch_in = _TimedVoltageIn(bhb._pitch_in, pitch_in_histogram)
+            return result
+
+        bhb.update = profiled_update
+        bhb.play = profiled_play
+        bhb.stop = profiled_stop
+        bhb._init_adc = profiled_init_adc
+        if bhb._pitch_in is not None:
+            bhb._pitch_in = _TimedVoltageIn(bhb._pitch_in, pitch_in_histogram)
+
+    def histograms(self):
+        return [(name, getattr(self, name)) for name in NAMES]
+
+    def reset(self):
+        for _, histogram in self.histograms():
+            histogram.reset()
+        self._update_end = 0
+
+    def as_dict(self):
+        return dict(
+            (name, histogram.as_dict()) for name, histogram in self.histograms()
+        )
+
+    def print_report(self):
+        print(
+            "{:<10} {:>8} {:>10} {:>10} {:>10} {:>10}".format(
+                "", "calls", "total ms", "p50 us", "p99 us", "max us"
+            )
+        )
+        for name, histogram in self.histograms():
+            print(
+                "{:<10} {:>8} {:>10} {:>10} {:>10} {:>10}".format(
+                    name,
+                    histogram.count,
+                    histogram.total_us // 1000,
+                    histogram.percentile(0.5) // 1000,
+                    histogram.percentile(0.99) // 1000,
+                    histogram.max_ns // 1000,
+                )
+            )
+
+    def save(self, path):
+        with open(path, "w") as file:
+            json.dump(self.as_dict(), file)
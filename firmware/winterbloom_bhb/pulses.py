@@ -0,0 +1,139 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2020 Alethea Flowers for Winterbloom
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+
+# Timed pulses on the gate output, used through bhb.pulse(), bhb.ratchet()
+# and bhb.burst().
+#
+# Setting gate_out from the loop makes a pulse last however long the loop
+# takes to come around again, and sleeping between the two holds up
+# everything else. This keeps a queue of edges, each with the
+# time.monotonic_ns() it's due at, and update() writes the ones that are
+# due. CircuitPython doesn't have a one-shot timer that can drive a digital
+# pin without blocking, so how close an edge lands to its time depends on
+# how often update() is called. To make up for that, an edge due within
+# `spin_us` of an update() is waited for right there, so short triggers come
+# out at their exact width.
+#
+# Starting new pulses replaces any that haven't finished. `edges` counts the
+# edges written, `late_ns` is how late the last one was and `max_late_ns`
+# the latest any has been.
+
+import time
+
+
+class GatePulses:
+    def __init__(self, gate_out, spin_us=1000, max_edges=64):
+        self._gate_out = gate_out
+        self.spin_ns = spin_us * 1000
+        self.max_edges = max_edges
+        self._times = []
+        self._values = []
+        self.edges = 0
+        self.late_ns = 0
+        self.max_late_ns = 0
+
+    def __len__(self):
+        return len(self._times)
+
+    @property
+    def busy(self):
+        return bool(self._times)
+
+    def cancel(self):
+        # Drops any edges still to come and leaves the output low.
+        self._times.clear()
+        self._values.clear()
+        self._gate_out.value = False
+
+    def _add(self, when_ns, value):
+        times = self._times
+        if len(times) >= self.max_edges:
+            raise RuntimeError("Too many gate pulses")
+        index = len(times)
+        while index and times[index - 1] > when_ns:
+            index -= 1
+        times.insert(index, when_ns)
+        self._values.insert(index, value)
+
+    def _add_pulse(self, start_ns, width_ns):
+        self._add(start_ns, True)
+        self._add(start_ns + width_ns, False)
+
+    def pulse(self, width_ms=10, delay_ms=0):
+        self.cancel()
+        now = time.monotonic_ns()
+        self._add_pulse(now + int(delay_ms * 1000000), int(width_ms * 1000000))
+        self.update(now)
+
+    def ratchet(self, count, interval_ms, width_ms=None, delay_ms=0):
+        # `count` pulses, one every `interval_ms`. They're half as long as
+        # the interval unless `width_ms` is given.
+        if width_ms is None:
+            width_ms = interval_ms / 2
+        if width_ms >= interval_ms:
+            raise ValueError("width_ms must be shorter than interval_ms")
+        self.cancel()
+        now = time.monotonic_ns()
+        start = now + int(delay_ms * 1000000)
+        interval = int(interval_ms * 1000000)
+        width = int(width_ms * 1000000)
+        for step in range(count):
+            self._add_pulse(start + step * interval, width)
+        self.update(now)
+
+    def burst(self, pattern, step_ms, width_ms=None, delay_ms=0):
+        # A pulse for every step of `pattern` that's true, or "x" in a
+        # string such as "x.xx", each step `step_ms` long.
+        if width_ms is None:
+            width_ms = step_ms / 2
+        if width_ms >= step_ms:
+            raise ValueError("width_ms must be shorter than step_ms")
+        self.cancel()
+        now = time.monotonic_ns()
+        start = now + int(delay_ms * 1000000)
+        step_ns = int(step_ms * 1000000)
+        width = int(width_ms * 1000000)
+        for step, value in enumerate(pattern):
+            if value and value != ".":
+                self._add_pulse(start + step * step_ns, width)
+        self.update(now)
+
+    def update(self, now=None):
+        times = self._times
+        if not times:
+            return
+        if now is None:
+            now = time.monotonic_ns()
+
+        values = self._values
+        spin_ns = self.spin_ns
+        while times and times[0] - now <= spin_ns:
+            due = times.pop(0)
+            while now < due:
+                now = time.monotonic_ns()
+            self._gate_out.value = values.pop(0)
+            self.edges += 1
+            late = now - due
+            self.late_ns = late
+            if late > self.max_late_ns:
+                self.max_late_ns = late
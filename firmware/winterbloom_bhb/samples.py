@@ -0,0 +1,178 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2020 Alethea Flowers for Winterbloom
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+
+# A bank of samples that keeps small ones decoded in RAM.
+#
+# audiocore.WaveFile streams from the CIRCUITPY filesystem, which means
+# every trigger has to seek and refill its buffers from flash. Small samples
+# can instead be read once into a RawSample so that playing them is just a
+# matter of pointing the DAC at memory. Anything that doesn't fit in the
+# bank's byte budget falls back to streaming, and when the budget runs out
+# the least recently used samples go back to streaming to make room.
+#
+# Give the bank BigHonkingButton(declick=...)'s declicker and the samples it
+# keeps in RAM will be crossfaded when they're retriggered, see declick.py.
+#
+# Streamed samples read ahead into a buffer that CircuitPython splits in two
+# halves: one plays while the other is refilled. The default buffer is small
+# and runs dry if refilling is held up for longer than half of it takes to
+# play, for example by a long garbage collection, which sounds like a
+# crackle. A bigger buffer_size costs RAM but rides out longer holdups.
+
+import audiocore
+
+from winterbloom_bhb import wav
+
+
+def open_wave(path, buffer_size=None):
+    # buffer_size is in bytes, None uses CircuitPython's default.
+    if buffer_size:
+        return audiocore.WaveFile(open(path, "rb"), bytearray(buffer_size))
+    return audiocore.WaveFile(open(path, "rb"))
+
+
+class _Entry:
+    def __init__(self, path):
+        self.path = path
+        self.sample = None
+        self.size = 0
+        self.sample_rate = 44100
+
+    @property
+    def in_ram(self):
+        return self.size > 0
+
+
+class DeferredSample:
+    # A sample that isn't opened until it's needed, see
+    # BigHonkingButton.load_sample(deferred=True).
+    def __init__(self, path, buffer_size=None):
+        self.path = path
+        self.buffer_size = buffer_size
+        self.sample = None
+
+    @property
+    def loaded(self):
+        return self.sample is not None
+
+    def load(self):
+        if self.sample is None:
+            self.sample = open_wave(self.path, self.buffer_size)
+        return self.sample
+
+
+class SampleBank:
+    def __init__(self, budget=8192, declicker=None, buffer_size=None):
+        self.budget = budget
+        self.declicker = declicker
+        self.buffer_size = buffer_size
+        self.used = 0
+        self._entries = {}
+        # Most recently used last.
+        self._order = []
+
+    def load(self, path):
+        entry = self._entries.get(path)
+        if entry is None:
+            entry = _Entry(path)
+            self._entries[path] = entry
+            self._order.append(path)
+            self._decode_or_stream(entry)
+        return self.get(path)
+
+    def get(self, path):
+        entry = self._entries[path]
+        order = self._order
+        if order[-1] != path:
+            order.remove(path)
+            order.append(path)
+        return entry.sample
+
+    __getitem__ = get
+
+    def __contains__(self, path):
+        return path in self._entries
+
+    def _decode_or_stream(self, entry):
+        with open(entry.path, "rb") as file:
+            info = wav.read_info(file)
+            entry.sample_rate = info.sample_rate
+
+            if info.data_size <= self.budget:
+                self._make_room(info.data_size, keep=entry.path)
+                if self.used + info.data_size <= self.budget:
+                    buffer = wav.empty_buffer(info)
+                    file.seek(info.data_offset)
+                    file.readinto(buffer)
+                    entry.sample = audiocore.RawSample(
+                        buffer,
+                        channel_count=info.channel_count,
+                        sample_rate=info.sample_rate,
+                    )
+                    entry.size = info.data_size
+                    self.used += info.data_size
+                    if self.declicker is not None:
+                        self.declicker.prepare(entry.sample, buffer)
+                    return
+
+        self._stream(entry)
+
+    def _stream(self, entry):
+        entry.sample = open_wave(entry.path, self.buffer_size)
+        entry.size = 0
+
+    def _make_room(self, size, keep):
+        for path in list(self._order):
+            if self.used + size <= self.budget:
+                return
+            entry = self._entries[path]
+            if path != keep and entry.in_ram:
+                self.evict(path)
+
+    def evict(self, path):
+        # Switches the sample over to streaming. Its memory is only freed
+        # once nothing else holds on to the old RawSample, so look samples
+        # up with get() when playing them rather than keeping them around.
+        entry = self._entries[path]
+        if entry.in_ram:
+            self.used -= entry.size
+            if self.declicker is not None:
+                self.declicker.forget(entry.sample)
+            self._stream(entry)
+
+    def report(self):
+        # (path, bytes of RAM used, "ram" or "stream") for each sample, most
+        # recently used last.
+        return [
+            (
+                path,
+                self._entries[path].size,
+                "ram" if self._entries[path].in_ram else "stream",
+            )
+            for path in self._order
+        ]
+
+    def print_report(self):
+        for path, size, kind in self.report():
+            print("{:<28} {:>6} {}".format(path, size, kind))
+        print("{} of {} bytes used".format(self.used, self.budget))
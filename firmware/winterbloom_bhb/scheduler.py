@@ -0,0 +1,73 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2020 Alethea Flowers for Winterbloom
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+
+# A small cooperative scheduler driven by BigHonkingButton.update().
+#
+# Events are kept sorted by their due time (time.monotonic_ns()) so that
+# run() only ever has to look at the front of the list. There's no heapq on
+# most CircuitPython boards and there's rarely more than a handful of events
+# waiting, so a sorted list is plenty.
+
+import time
+
+
+class Scheduler:
+    def __init__(self, max_events=32):
+        self.max_events = max_events
+        self._times = []
+        self._events = []
+
+    def __len__(self):
+        return len(self._times)
+
+    def call_at(self, when_ns, callback, *args):
+        times = self._times
+        if len(times) >= self.max_events:
+            raise RuntimeError("Too many scheduled events")
+
+        # Insert after any events due at the same time so that events run
+        # in the order they were scheduled.
+        index = len(times)
+        while index and times[index - 1] > when_ns:
+            index -= 1
+        times.insert(index, when_ns)
+        self._events.insert(index, (callback, args))
+
+    def call_later(self, delay, callback, *args):
+        self.call_at(time.monotonic_ns() + int(delay * 1000000000), callback, *args)
+
+    def clear(self):
+        self._times.clear()
+        self._events.clear()
+
+    def run(self, now_ns=None):
+        times = self._times
+        if not times:
+            return
+        if now_ns is None:
+            now_ns = time.monotonic_ns()
+
+        while times and times[0] <= now_ns:
+            times.pop(0)
+            callback, args = self._events.pop(0)
+            callback(*args)
@@ -0,0 +1,161 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2020 Alethea Flowers for Winterbloom
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+
+# Picks an item from a list using the pitch CV input.
+#
+# select_from_list_using_cv() works out which item a voltage falls on every
+# time it's called. CVSelector works out the answer for every raw ADC code
+# up front, so selecting is a table lookup. Like PitchTable the table holds
+# every fourth code, which is about 10mV apart, to keep it to 1kB.
+#
+# Items evenly share the range between `low` and `high` unless `weights` is
+# given, in which case each item gets a share in proportion to its weight.
+# With `scale`, items are instead placed one per note, starting at `low`,
+# using 1V/octave and the scale's semitones (for example (0, 2, 4, 5, 7, 9,
+# 11) for a major scale), with each note's bucket reaching halfway to its
+# neighbours. The highest note still has to be within `high`, so a scale
+# that's empty or that runs past the top of the range with this many items
+# raises ValueError rather than placing items the CV can't reach.
+#
+# The selection only moves to a new item once the CV is more than
+# `hysteresis` volts past the edge of the current item's bucket, which keeps
+# it from chattering when the CV sits right on an edge.
+
+import array
+
+import winterbloom_voltageio
+
+
+class _FixedAnalogIn:
+    value = 0
+
+
+def _even_edges(count, low, high, weights):
+    if weights is None:
+        weights = [1] * count
+    elif len(weights) != count:
+        raise ValueError("There must be one weight for each item")
+    total = sum(weights)
+    edges = []
+    position = 0
+    for weight in weights[:-1]:
+        position += weight
+        edges.append(low + (high - low) * position / total)
+    return edges
+
+
+def _scale_edges(count, low, high, scale):
+    if not scale:
+        raise ValueError("The scale needs at least one note")
+    notes = []
+    octave = 0
+    while len(notes) < count:
+        for semitone in scale:
+            notes.append(low + octave + semitone / 12)
+        octave += 1
+    notes = notes[:count]
+    if notes[-1] > high:
+        raise ValueError(
+            "{} notes of the scale from {}V run past {}V".format(count, low, high)
+        )
+    return [(a + b) / 2 for a, b in zip(notes, notes[1:])]
+
+
+class CVSelector:
+    def __init__(
+        self,
+        items,
+        calibration,
+        low=-5.0,
+        high=5.0,
+        weights=None,
+        scale=None,
+        hysteresis=0.0,
+        shift=2,
+    ):
+        if not items:
+            raise ValueError("CVSelector needs at least one item")
+        self.items = items
+        self.shift = shift
+        self.index = -1
+
+        if scale is not None:
+            edges = _scale_edges(len(items), low, high, scale)
+        else:
+            edges = _even_edges(len(items), low, high, weights)
+
+        analog_in = _FixedAnalogIn()
+        voltage_in = winterbloom_voltageio.VoltageIn(analog_in)
+        voltage_in.direct_calibration(calibration)
+
+        size = (4096 >> shift) + 1
+        self._item_size = 1 if len(items) <= 256 else 2
+        self._table = array.array("B" if self._item_size == 1 else "H", [0] * size)
+        # The lowest and highest ADC code that lands on each item, used for
+        # hysteresis.
+        self._low_codes = array.array("H", [0xFFFF] * len(items))
+        self._high_codes = array.array("H", [0] * len(items))
+
+        index = 0
+        last = len(edges)
+        for entry in range(size):
+            code = entry << shift
+            analog_in.value = code
+            voltage = voltage_in.voltage
+            # Codes and voltages run in opposite directions, so the index can
+            # move either way as this walks the table.
+            while index < last and voltage >= edges[index]:
+                index += 1
+            while index > 0 and voltage < edges[index - 1]:
+                index -= 1
+            self._table[entry] = index
+            self._low_codes[index] = min(self._low_codes[index], code)
+            self._high_codes[index] = max(self._high_codes[index], code)
+
+        codes = sorted(calibration)
+        volts_span = abs(calibration[codes[-1]] - calibration[codes[0]])
+        codes_per_volt = (codes[-1] - codes[0]) / volts_span
+        self._window = int(hysteresis * codes_per_volt)
+
+    def index_for(self, code):
+        # The index of the item for a raw ADC code, such as
+        # BigHonkingButton.pitch_in_raw.
+        index = self._table[code >> self.shift]
+        current = self.index
+        if index != current and current >= 0:
+            window = self._window
+            if (
+                self._low_codes[current] - window
+                <= code
+                <= self._high_codes[current] + window
+            ):
+                index = current
+        self.index = index
+        return index
+
+    def select(self, code):
+        return self.items[self.index_for(code)]
+
+    @property
+    def size_bytes(self):
+        return len(self._table) * self._item_size + len(self.items) * 4
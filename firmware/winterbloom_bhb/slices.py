@@ -0,0 +1,129 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2020 Alethea Flowers for Winterbloom
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+# A sample read into RAM once and cut into regions that share its memory.
+#
+# Each region is a RawSample over a memoryview of the one buffer, so
+# slicing a sample up, even into dozens of overlapping grains, doesn't copy
+# any of it. Where the regions go comes from the markers a sample editor
+# saves in the WAV file, see wav.py:
+#
+# - attack, loop and release: the first loop in the "smpl" chunk, or else
+#   the first two cue points, split the sample into what plays when it's
+#   triggered, what repeats while it's held and what plays once it's let go.
+#   Without any markers the whole sample is the loop. Regions that would be
+#   empty are None.
+# - slices: the sample cut at every cue point. named() finds the one
+#   starting at a cue point with that label.
+# - grains(): short windows spread evenly across the sample, for picking
+#   one with the CV input.
+#
+# The whole sample has to fit in RAM, so keep these short or 8-bit. Regions
+# are RawSamples, so they can be re-pitched and played like any other
+# sample, and each has its own sample_rate.
+
+import audiocore
+
+from winterbloom_bhb import wav
+
+
+class SlicedSample:
+    def __init__(self, path):
+        with open(path, "rb") as file:
+            info = wav.read_info(file, markers=True)
+            buffer = wav.empty_buffer(info)
+            file.seek(info.data_offset)
+            file.readinto(buffer)
+
+        self.path = path
+        self.buffer = buffer
+        self.channel_count = info.channel_count
+        self.sample_rate = info.sample_rate
+        self.frame_count = frame_count = info.frame_count
+        self._view = memoryview(buffer)
+
+        # Cue points past the end of the data are left out.
+        self.cues = [(frame, name) for frame, name in info.cues if frame < frame_count]
+        if info.loops:
+            start, end = info.loops[0]
+        elif len(self.cues) >= 2:
+            start, end = self.cues[0][0], self.cues[1][0]
+        else:
+            start, end = 0, frame_count
+        end = min(end, frame_count)
+        start = min(start, end)
+        self.loop_start = start
+        self.loop_end = end
+
+        self.whole = self.slice(0, frame_count)
+        self.attack = self.slice(0, start)
+        self.loop = self.slice(start, end)
+        self.release = self.slice(end, frame_count)
+
+        bounds = [0]
+        for frame, _ in self.cues:
+            if frame > bounds[-1]:
+                bounds.append(frame)
+        bounds.append(frame_count)
+        self.slices = [
+            self.slice(bounds[index], bounds[index + 1])
+            for index in range(len(bounds) - 1)
+        ]
+        self._bounds = bounds
+
+    def slice(self, start, end):
+        # A RawSample of frames start to end, sharing this sample's memory.
+        # Returns None if it would be empty.
+        if end <= start:
+            return None
+        channels = self.channel_count
+        return audiocore.RawSample(
+            self._view[start * channels : end * channels],
+            channel_count=channels,
+            sample_rate=self.sample_rate,
+        )
+
+    def named(self, name):
+        # The slice that starts at the cue point labelled name.
+        for frame, label in self.cues:
+            if label == name:
+                return self.slices[self._bounds.index(frame)]
+        raise KeyError(name)
+
+    def grains(self, count=16, length_ms=50, start=0, end=None):
+        # count windows of length_ms spread evenly from frame start to end,
+        # overlapping if they need to. Make them once up front and pick one
+        # with bhb.select_from_list_using_cv() to play.
+        if end is None:
+            end = self.frame_count
+        length = min(end - start, self.sample_rate * length_ms // 1000)
+        if length <= 0:
+            raise ValueError("There's no room for grains between start and end")
+        spread = end - start - length
+        steps = max(1, count - 1)
+        return [
+            self.slice(
+                start + spread * index // steps,
+                start + spread * index // steps + length,
+            )
+            for index in range(count)
+        ]
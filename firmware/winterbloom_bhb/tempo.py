@@ -0,0 +1,192 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2020 Alethea Flowers for Winterbloom
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+
+# Tempo from taps on the button or a clock on the gate input, turned on with
+# BigHonkingButton(tempo_taps=...).
+#
+# Each trigger is timestamped, using edge capture's timestamp when it's
+# turned on, and the period is the median of the last `taps` intervals
+# between triggers so that one sloppy tap doesn't move the tempo. Two
+# intervals in a row that disagree with the period by more than `tolerance`
+# mean the tempo really has changed, so the history starts over from them.
+# A gap longer than `max_period` seconds starts a new run of taps.
+#
+# Ticks don't fire when a trigger is seen but when they're due: the next one
+# is predicted from the last trigger and the period, and update() fires it
+# as soon as that time has passed. So ticks land on the beat instead of
+# trailing it, keep going if the clock stops, and are pulled back into phase
+# by every trigger. `multiply` gives that many ticks per beat and `divide`
+# one tick every that many beats.
+#
+# After update(), `ticked` says whether a tick fell due and `tick_ns` is the
+# time.monotonic_ns() it was due at. `next_tick_ns` is when the next one is
+# due, for lining things up ahead of it with bhb.scheduler.call_at().
+
+import time
+
+import supervisor
+
+_TICKS_MASK = (1 << 29) - 1
+_NS_PER_MINUTE = 60000000000
+_SOURCES = ("both", "button", "gate")
+
+
+class Tempo:
+    def __init__(self, taps=4, bpm=120, source="both", tolerance=0.25, max_period=2.0):
+        if source not in _SOURCES:
+            raise ValueError("source must be one of {}".format(_SOURCES))
+        self.source = source
+        self.tolerance = tolerance
+        self.max_period_ns = int(max_period * 1000000000)
+        self.multiply = 1
+        self.divide = 1
+        self.period_ns = int(_NS_PER_MINUTE // bpm)
+
+        self.ticked = False
+        self.tick_ns = None
+        self.ticks = 0
+        self.beats = 0
+        # How far the last beat's tick was from its trigger, negative if it
+        # fired early.
+        self.phase_error_ns = 0
+
+        self._intervals = [0] * taps
+        self._count = 0
+        self._index = 0
+        self._rejected = None
+        self._last_edge_ns = None
+        self.next_tick_ns = time.monotonic_ns() + self.period_ns
+
+    @property
+    def bpm(self):
+        return _NS_PER_MINUTE / self.period_ns
+
+    @bpm.setter
+    def bpm(self, value):
+        self.period_ns = int(_NS_PER_MINUTE // value)
+        self._clear()
+
+    @property
+    def tick_period_ns(self):
+        return self.period_ns * self.divide // self.multiply
+
+    def update(self, button, gate_in):
+        now = time.monotonic_ns()
+        self.ticked = False
+
+        edge = None
+        if self.source != "gate" and button.rising_edge:
+            edge = button
+        if self.source != "button" and gate_in.rising_edge:
+            edge = gate_in
+        if edge is not None:
+            self._beat(self._edge_ns(edge, now), now)
+
+        if now >= self.next_tick_ns:
+            self._tick(now)
+
+    def _edge_ns(self, input, now):
+        # Without edge capture all that's known is that the trigger happened
+        # since the last update().
+        if input.edge_time is None:
+            return now
+        age_ms = (supervisor.ticks_ms() - input.edge_time) & _TICKS_MASK
+        return now - age_ms * 1000000
+
+    def _beat(self, edge_ns, now):
+        last = self._last_edge_ns
+        self._last_edge_ns = edge_ns
+        if last is None or edge_ns - last > self.max_period_ns:
+            self._clear()
+        else:
+            self._add_interval(edge_ns - last)
+            self.beats += 1
+
+        if self.beats % self.divide:
+            return
+
+        tick_period = self.tick_period_ns
+        tick_ns = self.tick_ns
+        if tick_ns is not None and abs(edge_ns - tick_ns) < tick_period // 2:
+            # The tick for this beat was predicted and has already fired.
+            self.phase_error_ns = tick_ns - edge_ns
+            self.next_tick_ns = edge_ns + tick_period
+        else:
+            # The trigger came before its tick was due, fire it now.
+            self.phase_error_ns = now - edge_ns
+            self.next_tick_ns = edge_ns
+
+    def _add_interval(self, interval):
+        period = self.period_ns
+        if self._count and abs(interval - period) > period * self.tolerance:
+            if self._rejected is None:
+                # Could be a single sloppy tap or a missed clock pulse, see if
+                # the next one agrees with it.
+                self._rejected = interval
+                return
+            rejected = self._rejected
+            self._clear()
+            self._push(rejected)
+        self._rejected = None
+        self._push(interval)
+        self.period_ns = self._median()
+
+    def _push(self, interval):
+        intervals = self._intervals
+        intervals[self._index] = interval
+        self._index = (self._index + 1) % len(intervals)
+        if self._count < len(intervals):
+            self._count += 1
+
+    def _median(self):
+        count = self._count
+        values = sorted(self._intervals[:count])
+        middle = count // 2
+        if count % 2:
+            return values[middle]
+        return (values[middle - 1] + values[middle]) // 2
+
+    def _clear(self):
+        self._count = 0
+        self._index = 0
+        self._rejected = None
+        self.beats = 0
+
+    def _tick(self, now):
+        tick_period = self.tick_period_ns
+        self.ticked = True
+        self.tick_ns = self.next_tick_ns
+        self.ticks += 1
+        next_tick = self.tick_ns + tick_period
+        if next_tick <= now:
+            # The loop was held up for more than a tick, skip the ones that
+            # were missed rather than firing them all at once.
+            next_tick += ((now - next_tick) // tick_period + 1) * tick_period
+        self.next_tick_ns = next_tick
+
+    def reset(self):
+        # Forgets the taps so far and starts the ticks again from now, at
+        # the current tempo.
+        self._clear()
+        self._last_edge_ns = None
+        self.next_tick_ns = time.monotonic_ns()
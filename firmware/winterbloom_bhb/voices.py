@@ -0,0 +1,120 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2020 Alethea Flowers for Winterbloom
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+
+# Polyphonic playback through audiomixer.
+#
+# Instead of stopping whatever is playing, each play() gets its own mixer
+# voice so samples can ring over each other. When every voice is busy one
+# gets stolen, either the one that started playing longest ago ("oldest")
+# or simply the next one in turn ("round_robin", which is cheaper but can
+# cut off a sample that just started).
+#
+# Every playing voice is mixed for every output sample, so the audio
+# interrupt's work grows with the number of voices that are playing at
+# once. Idle voices are skipped. audiomixer can't resample, so every sample
+# has to match the mixer's sample rate and can't be re-pitched.
+
+import audiomixer
+
+
+class Voice:
+    def __init__(self, mixer_voice, index):
+        self._voice = mixer_voice
+        self.index = index
+        self.sample = None
+        self.started = 0
+
+    @property
+    def playing(self):
+        return self._voice.playing
+
+    @property
+    def level(self):
+        return self._voice.level
+
+    @level.setter
+    def level(self, value):
+        self._voice.level = value
+
+    def stop(self):
+        self._voice.stop()
+        self.sample = None
+
+
+class VoiceAllocator:
+    def __init__(
+        self, audio_out, count, stealing="oldest", sample_rate=44100, buffer_size=1024
+    ):
+        if stealing not in ("oldest", "round_robin"):
+            raise ValueError("voice_stealing must be 'oldest' or 'round_robin'")
+
+        self.mixer = audiomixer.Mixer(
+            voice_count=count,
+            buffer_size=buffer_size,
+            channel_count=1,
+            bits_per_sample=16,
+            samples_signed=True,
+            sample_rate=sample_rate,
+        )
+        self.voices = tuple(Voice(self.mixer.voice[i], i) for i in range(count))
+        self._round_robin = stealing == "round_robin"
+        self._next = 0
+        self._counter = 0
+        audio_out.play(self.mixer)
+
+    def allocate(self):
+        voices = self.voices
+
+        if self._round_robin:
+            voice = voices[self._next]
+            self._next = (self._next + 1) % len(voices)
+            return voice
+
+        oldest = voices[0]
+        for voice in voices:
+            if not voice.playing:
+                return voice
+            if voice.started < oldest.started:
+                oldest = voice
+        return oldest
+
+    def play(self, sample, loop=False, level=None):
+        voice = self.allocate()
+        self._counter += 1
+        voice.started = self._counter
+        voice.sample = sample
+        # A stolen or reused voice would otherwise keep its last level.
+        voice.level = 1.0 if level is None else level
+        voice._voice.play(sample, loop=loop)
+        return voice
+
+    @property
+    def playing(self):
+        for voice in self.voices:
+            if voice.playing:
+                return True
+        return False
+
+    def stop(self):
+        for voice in self.voices:
+            voice.stop()
@@ -0,0 +1,168 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2020 Alethea Flowers for Winterbloom
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+
+# Just enough of a RIFF/WAVE parser to find the sample format and where the
+# sample data lives, since CircuitPython doesn't have the wave module.
+#
+# With markers=True it also reads the cue points and loops that sample
+# editors store in "cue " and "smpl" chunks, and the names given to cue
+# points in a LIST/adtl chunk, see slices.py. Those chunks usually come
+# after the data, so this reads to the end of the file.
+
+import array
+import struct
+
+
+class WavInfo:
+    def __init__(self):
+        self.channel_count = 1
+        self.sample_rate = 44100
+        self.bits_per_sample = 16
+        self.data_offset = 0
+        self.data_size = 0
+        # With markers=True: (frame, name) for each cue point in order, the
+        # name is None if it has none, and (start, end) frames for each loop
+        # with the end exclusive.
+        self.cues = []
+        self.loops = []
+
+    @property
+    def frame_size(self):
+        return self.channel_count * self.bits_per_sample // 8
+
+    @property
+    def frame_count(self):
+        return self.data_size // self.frame_size
+
+
+def read_info(file, markers=False):
+    file.seek(0)
+    header = file.read(12)
+    if len(header) < 12 or header[0:4] != b"RIFF" or header[8:12] != b"WAVE":
+        raise ValueError("Not a WAVE file")
+
+    info = WavInfo()
+    found_format = False
+    found_data = False
+    cues = {}
+    names = {}
+    chunk_header = bytearray(8)
+
+    while file.readinto(chunk_header) == 8:
+        chunk_id = bytes(chunk_header[0:4])
+        chunk_size = struct.unpack("<I", chunk_header[4:8])[0]
+        chunk_start = file.tell()
+
+        if chunk_id == b"fmt ":
+            fmt = file.read(16)
+            audio_format, info.channel_count, info.sample_rate = struct.unpack(
+                "<HHI", fmt[0:8]
+            )
+            info.bits_per_sample = struct.unpack("<H", fmt[14:16])[0]
+            # 0xFFFE is WAVE_FORMAT_EXTENSIBLE, which is fine as long as it's
+            # still integer PCM.
+            if audio_format not in (1, 0xFFFE) or info.bits_per_sample not in (8, 16):
+                raise ValueError("Only 8 and 16 bit PCM WAVE files are supported")
+            found_format = True
+
+        elif chunk_id == b"data":
+            info.data_offset = chunk_start
+            info.data_size = chunk_size
+            if not found_format:
+                raise ValueError("WAVE file has no format chunk before its data")
+            if not markers:
+                return info
+            found_data = True
+
+        elif markers and chunk_id == b"cue ":
+            _read_cues(file.read(chunk_size), cues)
+
+        elif markers and chunk_id == b"smpl":
+            _read_loops(file.read(chunk_size), info.loops)
+
+        elif markers and chunk_id == b"LIST":
+            _read_labels(file.read(chunk_size), names)
+
+        # Chunks are padded to an even number of bytes.
+        file.seek(chunk_start + chunk_size + (chunk_size & 1))
+
+    if not found_data:
+        raise ValueError("WAVE file has no data chunk")
+    info.cues = sorted(
+        [(frame, names.get(cue_id)) for cue_id, frame in cues.items()],
+        key=lambda cue: cue[0],
+    )
+    return info
+
+
+def _read_cues(data, cues):
+    # A count, then 24 bytes per cue point: its id, its position in the
+    # playlist, the chunk it's in, two offsets that only matter for
+    # compressed data, and its frame.
+    (count,) = struct.unpack_from("<I", data)
+    for index in range(min(count, (len(data) - 4) // 24)):
+        offset = 4 + index * 24
+        cue_id = struct.unpack_from("<I", data, offset)[0]
+        cues[cue_id] = struct.unpack_from("<I", data, offset + 20)[0]
+
+
+def _read_loops(data, loops):
+    # 36 bytes about the sampler with the loop count at 28, then 24 bytes
+    # per loop: its cue id, type, first frame, last frame, fraction and
+    # play count.
+    if len(data) < 36:
+        return
+    count = struct.unpack_from("<I", data, 28)[0]
+    for index in range(min(count, (len(data) - 36) // 24)):
+        start, end = struct.unpack_from("<II", data, 36 + index * 24 + 8)
+        loops.append((start, end + 1))
+
+
+def _read_labels(data, names):
+    # An "adtl" list holds "labl" chunks of a cue id and a name ending in a
+    # zero byte.
+    if data[0:4] != b"adtl":
+        return
+    offset = 4
+    while offset + 8 <= len(data):
+        sub_id = data[offset : offset + 4]
+        size = struct.unpack_from("<I", data, offset + 4)[0]
+        if sub_id == b"labl" and size > 4:
+            cue_id = struct.unpack_from("<I", data, offset + 8)[0]
+            text = bytes(data[offset + 12 : offset + 8 + size])
+            names[cue_id] = text.split(b"\0")[0].decode()
+        offset += 8 + size + (size & 1)
+
+
+def empty_buffer(info, frame_count=None):
+    # A zeroed buffer in the array type RawSample expects for this format.
+    if frame_count is None:
+        frame_count = info.frame_count
+    count = frame_count * info.channel_count
+
+    if info.bits_per_sample == 8:
+        return bytearray(count)
+
+    # An array made from bytes takes them as the items' raw memory, so this
+    # is `count` zeroed items.
+    return array.array("h", bytes(count * 2))